@@ -0,0 +1,218 @@
+"""
+Отложенная (write-behind) запись ответов квиза в user_answers.
+
+Ответы копятся в памяти и записываются пачками многострочных INSERT:
+когда набралось batch_size ответов или прошло interval секунд с прошлой записи.
+При остановке процесса оставшиеся ответы записываются (atexit).
+
+prepare(session, rows) — подготовка перед записью (partitions.ensure_for_rows создаёт
+партицию месяца), aggregate(session, rows) — обновление производных счётчиков (stats.record_answers)
+в той же транзакции, что и запись ответов.
+
+Если слово, перевод или пользователь удалены, пока ответ ждал записи, пачка
+не проходит по внешнему ключу: тогда висячие word_id/translation_id обнуляются,
+ответы удалённых пользователей отбрасываются, и пачка пишется ещё раз.
+Пачка, которая не записалась max_retries раз подряд не из-за связи с БД,
+отбрасывается, чтобы одна плохая строка не останавливала запись остальных.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError, OperationalError, InterfaceError, TimeoutError
+
+from models import UserAnswer, User, Word, Translation
+
+# ошибки связи с БД: пачка не виновата, повторяем без ограничения (буфер ограничен max_backlog)
+_TRANSIENT = (OperationalError, InterfaceError, TimeoutError)
+
+
+class AnswerRecorder:
+    def __init__(self, session_factory, batch_size=500, interval=2.0, max_backlog=100000, prepare=None, aggregate=None,
+                 max_retries=3):
+        self.session_factory = session_factory
+        self.prepare = prepare
+        self.aggregate = aggregate
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backlog = max_backlog
+        self.max_retries = max_retries
+        self._retries = 0  # неудачных попыток подряд не из-за связи с БД
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # счётчики
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def record(self, user_id, word_id, translation_id, is_correct, answered_at=None):
+        """Ставит ответ в очередь на запись. Не обращается к БД."""
+        row = {
+            "user_id": user_id,
+            "word_id": word_id,
+            "translation_id": translation_id,
+            "is_correct": is_correct,
+            "answered_at": answered_at or datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._buffer) >= self.max_backlog:
+                # БД недоступна слишком долго — не даём памяти расти бесконечно
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            self.recorded += 1
+            full = len(self._buffer) >= self.batch_size
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Записывает накопленные ответы многострочными INSERT (по batch_size строк)
+        в одной транзакции.
+        :return: число записанных строк
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                rows = self._commit(rows)
+            except IntegrityError as e:
+                # ответ ссылается на удалённое слово, перевод или пользователя
+                print(f"[WARN] Ответы ссылаются на удалённые записи, убираем ссылки: {e.orig}")
+                try:
+                    rows = self._commit(rows, repair=True)
+                except SQLAlchemyError as e:
+                    return self._failed(rows, e)
+            except SQLAlchemyError as e:
+                return self._failed(rows, e)
+
+            self._retries = 0
+            elapsed = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.written += len(rows)
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self.total_flush_ms += elapsed
+            return len(rows)
+
+    def _commit(self, rows, repair=False):
+        with self.session_factory() as session:
+            if repair:
+                rows = self._repair(session, rows)
+            self._write(session, rows)
+            session.commit()
+        return rows
+
+    def _failed(self, rows, error):
+        """Пачка не записана: возвращает её в начало буфера или отбрасывает после max_retries попыток."""
+        print(f"[ERROR] Не удалось записать ответы ({len(rows)} шт.): {error}")
+        self.failures += 1
+        if not isinstance(error, _TRANSIENT):
+            self._retries += 1
+            if self._retries >= self.max_retries:
+                print(f"[ERROR] Ответы отброшены после {self._retries} попыток ({len(rows)} шт.)")
+                self._retries = 0
+                self.dropped += len(rows)
+                return 0
+        # следующая попытка — по таймеру
+        with self._lock:
+            keep = max(self.max_backlog - len(self._buffer), 0)
+            self.dropped += max(len(rows) - keep, 0)
+            self._buffer[:0] = rows[:keep]
+        return 0
+
+    def _repair(self, session, rows):
+        """
+        Убирает ссылки на удалённые записи: word_id/translation_id — в NULL
+        (как ON DELETE SET NULL), ответы удалённых пользователей отбрасывает.
+        """
+        def existing(model, key):
+            ids = {row[key] for row in rows if row[key] is not None}
+            if not ids:
+                return set()
+            return set(session.scalars(select(model.id).where(model.id.in_(ids))))
+
+        users = existing(User, "user_id")
+        words = existing(Word, "word_id")
+        translations = existing(Translation, "translation_id")
+        repaired = []
+        for row in rows:
+            if row["user_id"] not in users:
+                self.dropped += 1
+                continue
+            if row["word_id"] not in words:
+                row = {**row, "word_id": None}
+            if row["translation_id"] not in translations:
+                row = {**row, "translation_id": None}
+            repaired.append(row)
+        return repaired
+
+    def _write(self, session, rows):
+        if self.prepare is not None:
+            self.prepare(session, rows)
+        if not rows:
+            return
+        for i in range(0, len(rows), self.batch_size):
+            session.execute(insert(UserAnswer).values(rows[i:i + self.batch_size]))
+        if self.aggregate is not None:
+            self.aggregate(session, rows)
+
+    def backlog(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def stats(self):
+        """:return: словарь со счётчиками очереди и времени записи"""
+        return {
+            "backlog": self.backlog(),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="answer-recorder", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        """Останавливает фоновую запись и сбрасывает оставшиеся ответы в БД."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
@@ -0,0 +1,161 @@
+"""
+Асинхронные версии функций database.py для бота на AsyncTeleBot (async_main.py).
+
+Работают через асинхронный движок SQLAlchemy (драйвер asyncpg) и разделяют
+с database.py запросы и индекс словаря. record_answer общая с database.py:
+она только ставит ответ в очередь и не блокирует цикл событий.
+"""
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from config import DB_CONFIG, VOCAB_INDEX, engine_options
+from db_pool import register_pool_metrics
+from models import Category
+import database
+from database import (
+    record_answer,
+    vocab,
+    user_ids,
+    _upsert_user_statement,
+    _ADD_WORD_SQL,
+    _question_statement,
+    _question_from_row,
+    _sample_question,
+    _word_added,
+    _delete_word_statement,
+    _words_deleted,
+)
+
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_CONFIG['user']}:{DB_CONFIG['password']}@" \
+                     f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
+
+_async_engine = None
+
+
+def get_async_engine():
+    """Асинхронный движок создаётся при первой сессии (как config.get_engine)."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(is_async=True))
+        register_pool_metrics(_async_engine.sync_engine, "async")
+    return _async_engine
+
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = _LazyAsyncSessionmaker(autoflush=False, expire_on_commit=False)
+
+
+async def new_user(user_data):
+    """
+    Регистрирует пользователя, если его ещё нет в базе (см. database.new_user).
+    Возвращает ID пользователя.
+    """
+    user_id = user_ids.get(user_data.id)
+    if user_id is not None:
+        return user_id
+
+    async with AsyncSessionLocal() as session:
+        user_id = (await session.execute(_upsert_user_statement(user_data))).scalar_one()
+        await session.commit()
+
+    user_ids.put(user_data.id, user_id)
+    return user_id
+
+
+async def get_categories():
+    """
+    Возвращает список всех доступных категорий.
+    :return: список кортежей (id, name)
+    """
+    async with AsyncSessionLocal() as session:
+        categories = (await session.execute(select(Category))).scalars().all()
+        return [(c.id, c.name) for c in categories]
+
+
+async def get_words_by_category(category_id, user_id):
+    """
+    Возвращает случайное слово из указанной категории.
+    :return: (word_id, original_word, translation)
+    """
+    await vocab.prepare(user_id, AsyncSessionLocal)
+    return database.get_words_by_category(category_id, user_id)
+
+
+async def get_word_and_vars(user_id):
+    """
+    Возвращает случайное слово и варианты перевода (1 правильный + 3 неправильных).
+    :return: (original_word, options, correct_translation)
+    """
+    await vocab.prepare(user_id, AsyncSessionLocal)
+    return database.get_word_and_vars(user_id)
+
+
+async def get_wrong_translations(word_id, user_id):
+    """
+    Возвращает до 3 случайных переводов других слов, видимых пользователю.
+    """
+    await vocab.prepare(user_id, AsyncSessionLocal)
+    return database.get_wrong_translations(word_id, user_id)
+
+
+async def get_question(user_id, category_id=None):
+    """
+    Собирает вопрос квиза (см. database.get_question).
+    :return: Question или None
+    """
+    if not VOCAB_INDEX:
+        return await _select_question(user_id, category_id)
+    await vocab.prepare(user_id, AsyncSessionLocal)
+    return _sample_question(user_id, category_id)
+
+
+async def _select_question(user_id, category_id=None):
+    async with AsyncSessionLocal() as session:
+        row = (await session.execute(_question_statement(user_id, category_id))).first()
+    return _question_from_row(row, category_id)
+
+
+async def add_word(user_id, original, translation, example):
+    """
+    Добавляет новое слово и его перевод в БД для конкретного пользователя.
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            row = (await session.execute(_ADD_WORD_SQL, {
+                "user_id": user_id,
+                "original": original,
+                "translation": translation,
+                "example": example,
+            })).first()
+            await session.commit()
+
+        return _word_added(row, user_id, original, translation)
+
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при добавлении слова: {e}")
+        return False
+
+
+async def delete_word(user_id, original_word):
+    """
+    Удаляет пользовательское слово по оригинальному слову.
+    :return: True если удалено, иначе False
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(_delete_word_statement(user_id, original_word))
+            word_ids = result.scalars().all()
+            await session.commit()
+
+        return _words_deleted(word_ids, user_id)
+
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при удалении слова: {e}")
+        return False
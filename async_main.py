@@ -0,0 +1,205 @@
+# Асинхронная версия бота: AsyncTeleBot + асинхронный движок SQLAlchemy.
+# Один процесс обслуживает множество чатов одновременно без потока на каждое обновление.
+#
+# Запуск:  python async_main.py
+import asyncio
+
+from telebot.async_telebot import AsyncTeleBot
+
+from config import init_bd
+
+# Асинхронные функции работы с БД
+from async_database import (
+    new_user,
+    get_categories,
+    get_question,
+    add_word,
+    delete_word,
+    record_answer,
+)
+
+import os
+from dotenv import load_dotenv
+
+from state_store import make_state_store
+import keyboards
+
+# Загружаем переменные из .env файла
+load_dotenv()
+
+bot = AsyncTeleBot(os.getenv("TOKEN"))
+
+# Хранилище состояний пользователя (что он делает), ключ — chat_id
+user_states = make_state_store()
+
+
+# Обработчик команды /start
+@bot.message_handler(commands=['start'])
+async def welcome(message):
+    user = message.from_user
+
+    try:
+        user_id_db = await new_user(user)
+        print(f"[INFO] Пользователь {user.id} зарегистрирован с ID в БД: {user_id_db}")
+    except Exception as e:
+        print(f"[ERROR] Не удалось зарегистрировать пользователя: {e}")
+        await bot.send_message(message.chat.id, "❌ Произошла ошибка при регистрации. Попробуйте позже.")
+        return
+
+    first_name = user.first_name
+    last_name = user.last_name if user.last_name else ""
+    await bot.reply_to(message, f"Привет, {first_name} {last_name}! Начнём учить английский!")
+
+    await menu(message.chat.id)
+
+
+# Повторения в асинхронной версии нет — меню без этой кнопки
+ASYNC_MENU = keyboards.reply_keyboard(keyboards.MENU_BUTTONS[:4])
+
+
+async def menu(chat):
+    await bot.send_message(chat, "Выбери действие:", reply_markup=ASYNC_MENU)
+
+
+# Обработчик выбора категории
+@bot.message_handler(func=lambda m: m.text == '📑 Выбрать категорию')
+async def choose_category(message):
+    cached = keyboards.categories.cached()
+    categories, inline_keyb = cached or keyboards.categories.store(await get_categories())
+    if not categories:
+        await bot.send_message(message.chat.id, "Категории пока не добавлены.")
+        return
+
+    await bot.send_message(message.chat.id, "Выберите категорию:", reply_markup=inline_keyb)
+
+
+# Обработка нажатия на inline-кнопку с категорией
+@bot.callback_query_handler(func=lambda call: call.data.startswith("category_"))
+async def category(call):
+    category_id = int(call.data.split("_")[1])
+    user_states.set(call.message.chat.id, {'category_id': category_id, 'attempts': 0})
+    await send_next_word(call.message.chat.id, await new_user(call.from_user), category_id)
+
+
+# Отправка следующего слова
+async def send_next_word(chat_id, user_id, category_id=None):
+    question = await get_question(user_id, category_id)
+    if not question:
+        # иначе следующий ответ засчитался бы к прошлому вопросу
+        user_states.delete(chat_id)
+        if category_id:
+            await bot.send_message(chat_id, "Нет больше слов в этой категории.")
+        else:
+            await bot.send_message(chat_id, "Нет доступных слов.")
+        await menu(chat_id)
+        return
+
+    user_states.set(chat_id, {
+        'correct': question.correct,
+        'word_id': question.word_id,
+        'translation_id': question.translation_id,
+        'category_id': category_id,
+        'attempts': 0
+    })
+
+    markup = keyboards.quiz_keyboard(question.options)
+
+    await bot.send_message(
+        chat_id,
+        f"Переведи слово: *{question.original}*",
+        parse_mode="Markdown",
+        reply_markup=markup
+    )
+
+
+# Обработка кнопки "Учить слова"
+@bot.message_handler(func=lambda m: m.text == '🧠 Учить слова')
+async def learn_words(message):
+    await send_next_word(message.chat.id, await new_user(message.from_user))
+
+
+# Обработка добавления слова
+@bot.message_handler(func=lambda m: m.text == '📝 Добавить слово')
+async def handle_add_word(message):
+    await bot.send_message(message.chat.id, 'Введите слово, которое хотите добавить (на английском):')
+    user_states.set(message.chat.id, {'stage': 'original'})
+
+
+# Обработка удаления слова
+@bot.message_handler(func=lambda m: m.text == '🗑 Удалить слово')
+async def handle_delete_word(message):
+    await bot.send_message(message.chat.id, 'Введите слово, которое хотите удалить:')
+    user_states.set(message.chat.id, {'stage': 'delete'})
+
+
+# Обработка всех остальных сообщений
+@bot.message_handler(func=lambda message: True)
+async def handle_input(message):
+    chat_id = message.chat.id
+    text = message.text.strip()
+    state = user_states.get(chat_id)
+
+    if text == keyboards.BACK_BUTTON:
+        user_states.delete(chat_id)
+        await menu(chat_id)
+        return
+
+    # Проверка ответа
+    if state.get('correct') is not None:
+        is_correct = text == state['correct']
+        record_answer(await new_user(message.from_user), state.get('word_id'), state.get('translation_id'), is_correct)
+        if is_correct:
+            await bot.send_message(chat_id, "✅ Правильно!")
+            await send_next_word(chat_id, await new_user(message.from_user), state.get('category_id'))
+        else:
+            attempts = state.get('attempts', 0) + 1
+            if attempts < 2:
+                await bot.send_message(chat_id, f"❌ Неправильно. Попробуйте снова ({attempts}/2):")
+                user_states.update(chat_id, attempts=attempts)
+            else:
+                await bot.send_message(chat_id, f"❌ Правильный ответ: *{state['correct']}*", parse_mode="Markdown")
+                user_states.delete(chat_id)
+                await menu(chat_id)
+        return
+
+    # Этап 1: Добавление слова — оригинал(на англ)
+    if state.get('stage') == 'original':
+        user_states.update(chat_id, original=text, stage='translation')
+        await bot.send_message(chat_id, "Введите перевод на русский:")
+
+    # Этап 2: перевод
+    elif state.get('stage') == 'translation':
+        user_states.update(chat_id, translation=text, stage='example')
+        await bot.send_message(chat_id, "Введите пример использования:")
+
+    # Этап 3: пример
+    elif state.get('stage') == 'example':
+        success = await add_word(
+            user_id=await new_user(message.from_user),
+            original=state['original'],
+            translation=state['translation'],
+            example=text
+        )
+        if success:
+            await bot.send_message(chat_id, "✅ Слово успешно добавлено!")
+        else:
+            await bot.send_message(chat_id, "❌ Ошибка при добавлении слова.")
+        user_states.delete(chat_id)
+        await menu(chat_id)
+
+    # Удаление слова
+    elif state.get('stage') == 'delete':
+        deleted = await delete_word(await new_user(message.from_user), text)
+        if deleted:
+            await bot.send_message(chat_id, "✅ Слово удалено.")
+        else:
+            await bot.send_message(chat_id, "❌ Такого слова нет в вашем списке.")
+        user_states.delete(chat_id)
+        await menu(chat_id)
+
+
+if __name__ == '__main__':
+    init_bd()
+    print('База данных инициализирована')
+    print('Асинхронный бот запущен, кусь')
+    asyncio.run(bot.polling(non_stop=True))
@@ -1,9 +1,10 @@
 import os
+from uuid import uuid4
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Base
-from init import words 
+from metrics import instrument_engine
+from db_pool import TimedQueuePool, TimedAsyncQueuePool, register_pool_metrics
 
 load_dotenv() # загружаем переменные из .env файла
 
@@ -12,18 +13,163 @@ DB_CONFIG = {
     'user': os.getenv("DB_USER"),         # Пользователь БД 
     'password': os.getenv("DB_PASSWORD"), # Пароль пользователя
     'host': os.getenv("DB_HOST"),         # Хост 
-    'port': int(os.getenv("DB_PORT")),    # Порт 
+    'port': int(os.getenv("DB_PORT") or 5432),  # Порт 
     'token': os.getenv("TOKEN"),          # токен бота
 }
 
-DATABASE_URL = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@" \
+DATABASE_URL = f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@" \
                f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
 
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Реплика для чтения (пусто — все запросы к основной БД): хост и порт,
+# база и пользователь те же, что у основной
+REPLICA_DB_HOST = os.getenv("REPLICA_DB_HOST") or None
+REPLICA_DB_PORT = int(os.getenv("REPLICA_DB_PORT") or DB_CONFIG['port'])
+REPLICA_DATABASE_URL = f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@" \
+                       f"{REPLICA_DB_HOST}:{REPLICA_DB_PORT}/{DB_CONFIG['dbname']}" if REPLICA_DB_HOST else None
+# Сколько секунд после изменения своих слов пользователь читает с основной БД
+# (реплика может отставать)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+# Применять миграции и заполнять общий словарь при запуске бота
+# (по умолчанию — только проверка версии схемы, см. init_bd)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") != "0"
+
+# Индекс словаря в памяти для выбора слов квиза (0 — собирать вопрос запросом к БД)
+VOCAB_INDEX = os.getenv("VOCAB_INDEX", "1") != "0"
+# Через сколько секунд перечитывать слова из БД (изменения импорта и других процессов бота)
+# и сколько пользователей держать в индексе
+VOCAB_TTL = float(os.getenv("VOCAB_TTL", "300"))
+VOCAB_USER_POOLS = int(os.getenv("VOCAB_USER_POOLS", "10000"))
+# Снимок общего словаря для mmap (snapshot.py; пусто — общие слова из БД) и период проверки новой версии, с
+VOCAB_SNAPSHOT = os.getenv("VOCAB_SNAPSHOT") or None
+VOCAB_SNAPSHOT_CHECK = float(os.getenv("VOCAB_SNAPSHOT_CHECK", "30"))
+
+# Пул соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))            # постоянных соединений
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))     # временных сверх DB_POOL_SIZE
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))   # ожидание свободного соединения, с
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))   # пересоздавать соединения старше, с (-1 — никогда)
+DB_PRE_PING = os.getenv("DB_PRE_PING", "1") != "0"            # проверять соединение перед выдачей
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))  # statement_timeout, мс (0 — без лимита)
+# База за PgBouncer в режиме transaction pooling: без серверных prepared statements
+# и без параметров сессии в строке подключения
+PGBOUNCER = os.getenv("PGBOUNCER", "0") != "0"
+# Размер кэша prepared statements asyncpg на соединение
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+
+def engine_options(is_async=False, name=None):
+    """
+    Параметры create_engine / create_async_engine из переменных окружения.
+    :param name: имя пула в логах и метриках (по умолчанию async или primary)
+    """
+    options = {
+        "echo": False,
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_PRE_PING,
+        "pool_logging_name": name or ("async" if is_async else "primary"),
+    }
+    connect_args = {}
+    if is_async:
+        if PGBOUNCER:
+            # PgBouncer отдаёт каждой транзакции любое серверное соединение,
+            # поэтому подготовленные на другом соединении запросы недоступны.
+            # asyncpg всё равно готовит безымянные запросы; уникальные имена
+            # не дают им столкнуться с чужими на общем серверном соединении.
+            # Сам PgBouncer должен сбрасывать соединения (server_reset_query = DISCARD ALL,
+            # server_reset_query_always = 1), иначе нужен NullPool вместо пула SQLAlchemy.
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        else:
+            connect_args["prepared_statement_cache_size"] = DB_STATEMENT_CACHE_SIZE
+        if DB_STATEMENT_TIMEOUT and not PGBOUNCER:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}
+    elif DB_STATEMENT_TIMEOUT and not PGBOUNCER:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+_engine = None
+
+
+def get_engine():
+    """
+    Движок БД создаётся при первом обращении: импорт модулей не требует
+    ни драйвера, ни доступной базы.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL, **engine_options())
+        instrument_engine(_engine)  # счётчики SQL-запросов для /metrics
+        register_pool_metrics(_engine, "primary")
+    return _engine
+
+
+_replica_engine = None
+
+
+def get_replica_engine():
+    """Движок реплики (лениво, как get_engine); без REPLICA_DB_HOST — основной движок."""
+    global _replica_engine
+    if REPLICA_DATABASE_URL is None:
+        return get_engine()
+    if _replica_engine is None:
+        _replica_engine = create_engine(REPLICA_DATABASE_URL, **engine_options(name="replica"))
+        instrument_engine(_replica_engine)
+        register_pool_metrics(_replica_engine, "replica")
+    return _replica_engine
+
+
+def __getattr__(name):
+    # config.engine / from config import engine — тот же ленивый движок
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker, который привязывается к движку при создании первой сессии."""
+
+    def __init__(self, engine=get_engine, **kw):
+        super().__init__(**kw)
+        self._get_engine = engine
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._get_engine())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionmaker(autoflush=False, autocommit=False)
+# Сессии только для чтения — с реплики (см. replica.read_session)
+ReadSessionLocal = _LazySessionmaker(get_replica_engine, autoflush=False, autocommit=False) \
+    if REPLICA_DATABASE_URL else SessionLocal
+
 
 def init_bd():
-    Base.metadata.create_all(bind=engine)
+    """
+    Проверка БД при запуске: одна лёгкая выборка версий схемы и общего словаря.
+    Миграции и заполнение словаря — отдельными командами (python migrations.py,
+    python init.py) или здесь же при AUTO_MIGRATE=1.
+    """
+    from migrations import LATEST_VERSION, stored_versions, migrate
+    from init import SEED_VERSION, seed
 
-    with SessionLocal() as db:
-        words(db)
+    schema, seeded = stored_versions(get_engine())
+    if schema < LATEST_VERSION:
+        if not AUTO_MIGRATE:
+            raise RuntimeError(f"Схема БД устарела (версия {schema}, нужна {LATEST_VERSION}): "
+                               f"выполните python migrations.py или запустите с AUTO_MIGRATE=1")
+        migrate(get_engine())
+    if seeded < SEED_VERSION:
+        if AUTO_MIGRATE:
+            seed()
+        else:
+            print("[WARN] Общий словарь не заполнен: выполните python init.py")
@@ -1,160 +1,462 @@
+import os
+from collections import namedtuple
 from sqlalchemy.exc import SQLAlchemyError
-from models import User, Category, Word, Translation, UserAnswer, word_categories  
-from config import SessionLocal
-from sqlalchemy import func
+from models import User, Category, Word, Translation, word_categories
+from config import SessionLocal, VOCAB_INDEX, VOCAB_SNAPSHOT, VOCAB_SNAPSHOT_CHECK, VOCAB_TTL, VOCAB_USER_POOLS
+from sqlalchemy import func, select, exists, true, text
+from sqlalchemy.dialects.postgresql import insert
 import random
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql import label
-
-
+from vocab_index import VocabularyIndex, WordEntry
+from identity import UserIdCache
+from answers import AnswerRecorder
+from prefetch import make_prefetcher
+import exporter
+import partitions
+import replica
+import srs
+import stats
+import metrics
+from metrics import timed
+
+
+# Вопрос квиза: слово, правильный перевод и перемешанные варианты ответа
+Question = namedtuple("Question", "word_id translation_id original options correct")
+
+
+# Сколько карточек (и новых слов) запрашивать за раз: те, которых нет в индексе словаря, пропускаются
+REVIEW_CANDIDATES = 10
+
+# Индекс словаря в памяти: выбор слов для квиза не обращается к БД (слова загружаются с реплики)
+vocab = VocabularyIndex(
+    replica.read_session,
+    snapshot=VOCAB_SNAPSHOT,
+    check_interval=VOCAB_SNAPSHOT_CHECK,
+    ttl=VOCAB_TTL,
+    max_users=VOCAB_USER_POOLS,
+)
+
+# Кэш telegram_id -> users.id
+user_ids = UserIdCache(int(os.getenv("USER_CACHE_SIZE", "100000")))
+
+# Отложенная пакетная запись ответов квиза
+answer_recorder = AnswerRecorder(
+    SessionLocal,
+    prepare=partitions.ensure_for_rows,  # партиция месяца создаётся до записи
+    aggregate=stats.record_answers,  # счётчики /stats — в той же транзакции
+    batch_size=int(os.getenv("ANSWERS_BATCH_SIZE", "500")),
+    interval=float(os.getenv("ANSWERS_FLUSH_INTERVAL", "2")),
+)
+
+# Заранее собранные вопросы квиза для активных чатов
+questions = make_prefetcher(lambda user_id, category_id: get_question(user_id, category_id))
+
+metrics.gauge("user_id_cache_size", "Записей в кэше telegram_id -> users.id", lambda: len(user_ids))
+metrics.counter("user_id_cache_hits_total", "Попадания в кэш пользователей", lambda: user_ids.hits)
+metrics.counter("user_id_cache_misses_total", "Промахи кэша пользователей", lambda: user_ids.misses)
+metrics.gauge("answers_backlog", "Ответов ждут записи в БД", answer_recorder.backlog)
+metrics.counter("answers_written_total", "Ответов записано в БД", lambda: answer_recorder.written)
+metrics.gauge("answers_last_flush_ms", "Длительность последней записи ответов, мс", lambda: answer_recorder.last_flush_ms)
+metrics.gauge("vocab_snapshot_version", "Версия снимка общего словаря (0 — из БД)", vocab.snapshot_version)
+metrics.gauge("prefetch_chats", "Чатов с очередью заранее собранных вопросов", lambda: len(questions))
+metrics.counter("prefetch_hits_total", "Вопросов выдано из очереди", lambda: questions.hits)
+metrics.counter("prefetch_misses_total", "Вопросов собрано в момент запроса", lambda: questions.misses)
+metrics.gauge("prefetch_hit_ratio", "Доля вопросов из очереди", questions.hit_ratio)
+metrics.counter("prefetch_discarded_total", "Заранее собранных вопросов отброшено", lambda: questions.discarded)
+
+
+def _upsert_user_statement(user_data):
+    stmt = insert(User).values(
+        telegram_id=user_data.id,
+        username=user_data.username,
+        first_name=user_data.first_name,
+        last_name=user_data.last_name,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "username": stmt.excluded.username,
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+        },
+    ).returning(User.id)
+
+
+@timed()
 def new_user(user_data):
     """
     Регистрирует пользователя, если его ещё нет в базе.
     Возвращает ID пользователя.
+
+    Известные пользователи берутся из кэша без запроса к БД, иначе выполняется
+    один атомарный INSERT ... ON CONFLICT (без гонки при одновременных /start).
     """
+    user_id = user_ids.get(user_data.id)
+    if user_id is not None:
+        return user_id
+
     with SessionLocal() as session:
-        user = session.query(User).filter_by(telegram_id=user_data.id).first()
-        if user:
-            return user.id
-
-        new_user = User(
-            telegram_id=user_data.id,
-            username=user_data.username,
-            first_name=user_data.first_name,
-            last_name=user_data.last_name
-        )
-        session.add(new_user)
+        user_id = session.execute(_upsert_user_statement(user_data)).scalar_one()
         session.commit()
-        user_id = new_user.id
-        return user_id
+
+    user_ids.put(user_data.id, user_id)
+    return user_id
 
 
+@timed()
 def get_categories():
     """
     Возвращает список всех доступных категорий.
     :return: список кортежей (id, name)
     """
-    with SessionLocal() as session:
+    with replica.read_session() as session:
         categories = session.query(Category).all()
         return [(c.id, c.name) for c in categories]
 
 
 
+@timed()
 def get_words_by_category(category_id, user_id):
     """
     Возвращает случайное слово из указанной категории.
     :param category_id: id категории
     :return: (word_id, original_word, translation)
     """
-    with SessionLocal() as session:
-        word = (
-            session.query(Word)
-            .join(word_categories, word_categories.c.word_id == Word.id)
-            .filter(word_categories.c.category_id == category_id)
-            .filter((Word.user_id == None) | (Word.user_id == user_id))
-            .order_by(func.random())
-            .first()
-        )
+    entry = vocab.random_word(user_id, category_id)
+    if entry is None:
+        return None
 
-        if not word or not word.translations:
-            return None
-
-        translation = random.choice(word.translations)
-        return word.id, word.original_word, translation.translation
+    _, translation = random.choice(entry.translations)
+    return entry.word_id, entry.original, translation
 
 
+@timed()
 def get_word_and_vars(user_id):
     """
     Возвращает случайное слово и варианты перевода (1 правильный + 3 неправильных).
     :return: (original_word, options, correct_translation)
     """
-    with SessionLocal() as session:
-        subquery = (
-            session.query(
-                Word.id.label("word_id"),
-                Word.original_word.label("original_word"),
-                Translation.translation.label("translation"),
-            )
-            .join(Translation, Translation.word_id == Word.id)
-            .filter((Word.user_id == None) | (Word.user_id == user_id))
-            .order_by(func.random())
-            .limit(4)
-            .subquery()
-        )
+    entry = vocab.random_word(user_id)
+    if entry is None:
+        return None
+
+    _, correct_translation = random.choice(entry.translations)
+
+    # Остальные 3 — как неправильные переводы
+    wrong_translations = [
+        text for _, _, text in vocab.random_pairs(
+            user_id, 3, exclude_word_id=entry.word_id, exclude_texts=(correct_translation,))
+    ]
+    if len(wrong_translations) < 3:
+        return None
+
+    options = [correct_translation] + wrong_translations
+    random.shuffle(options)
+
+    return entry.original, options, correct_translation
+
+
+@timed()
+def get_question(user_id, category_id=None):
+    """
+    Собирает вопрос квиза: слово (из категории, если указана), правильный перевод
+    и 3 неправильных перевода из слов, видимых пользователю.
+    При включённом индексе словаря не обращается к БД, иначе — один запрос.
+    :return: Question или None
+    """
+    if not VOCAB_INDEX:
+        return _select_question(user_id, category_id)
+    return _sample_question(user_id, category_id)
+
+
+@timed()
+def next_question(chat_id, user_id, category_id=None):
+    """
+    Следующий вопрос квиза для чата: из очереди заранее собранных вопросов
+    (см. prefetch.py), а если она пуста — как get_question.
+    :return: Question или None
+    """
+    return questions.get(chat_id, user_id, category_id)
+
+
+def end_quiz(chat_id):
+    """Чат вышел из квиза: очередь его вопросов больше не нужна."""
+    questions.discard(chat_id)
+
+
+@timed()
+def check_answer(user_id, word_id, text, typos=True):
+    """
+    Сравнивает ответ со всеми переводами слова по нормализованным переводам
+    в индексе словаря (регистр, ё/е, знаки препинания; опечатки — если typos).
+    :return: (translation_id, перевод, точно ли) или None
+    """
+    try:
+        return vocab.match_answer(word_id, user_id, text, typos)
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при загрузке словаря: {e}")
+        return None
+
+
+def _sample_question(user_id, category_id=None):
+    """Вопрос квиза из индекса словаря (без обращения к БД)."""
+    entry = vocab.random_word(user_id, category_id)
+    if entry is None:
+        return None
+    # без категории нужен полный набор вариантов, как в get_word_and_vars
+    return _question_for(entry, user_id, full=category_id is None)
+
+
+def _question_for(entry, user_id, full=True):
+    """Вопрос по слову из индекса: случайный перевод и 3 перевода других слов."""
+    translation_id, correct = random.choice(entry.translations)
+    wrong = [
+        t for _, _, t in vocab.random_pairs(
+            user_id, 3, exclude_word_id=entry.word_id,
+            exclude_texts=[t for _, t in entry.translations])
+    ]
+    if full and len(wrong) < 3:
+        return None
 
-        results = session.query(subquery).all()
+    options = [correct] + wrong
+    random.shuffle(options)
+    return Question(entry.word_id, translation_id, entry.original, options, correct)
 
-        if len(results) < 4:
+
+@timed()
+def get_review_question(user_id):
+    """
+    Вопрос в режиме интервального повторения: сначала карточки, которым пора
+    повториться, иначе — новое слово, которого ещё нет в повторении.
+    :return: Question или None, если повторять пока нечего
+    """
+    entry = _first_indexed(srs.next_due_words(user_id, REVIEW_CANDIDATES), user_id)
+
+    if entry is None:
+        # новые слова — по порядку id со случайного слова словаря, чтобы не начинать всегда с одних и тех же
+        start = vocab.random_word(user_id)
+        if start is None:
+            return None
+        entry = _first_indexed(srs.new_words(user_id, start.word_id, REVIEW_CANDIDATES), user_id)
+        if entry is None:
             return None
 
-        # 1ую пару берём как основную
-        main = results[0]
-        correct_translation = main.translation
-        original_word = main.original_word
+    return _question_for(entry, user_id)
 
-        # Остальные 3 — как неправильные переводы
-        wrong_translations = [r.translation for r in results[1:]]
 
-        options = [correct_translation] + wrong_translations
-        random.shuffle(options)
+def _first_indexed(word_ids, user_id):
+    """Первое из слов, которое есть в индексе словаря (остальные — удалены или без переводов)."""
+    for word_id in word_ids:
+        entry = vocab.get(word_id, user_id)
+        if entry is not None:
+            return entry
+    return None
 
-        return original_word, options, correct_translation
 
+@timed()
+def record_review(user_id, word_id, is_correct):
+    """Переносит карточку повторения в следующую коробку или возвращает в первую."""
+    try:
+        return srs.record_review(user_id, word_id, is_correct)
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при обновлении повторения: {e}")
+        return None
+
+
+@timed()
+def get_stats(user_id):
+    """
+    Статистика пользователя для /stats из счётчиков (см. stats.py).
+    :return: stats.Stats или None при ошибке БД
+    """
+    try:
+        return stats.user_stats(user_id)
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при получении статистики: {e}")
+        return None
+
+
+@timed()
+def export_words(user_id, fmt="csv"):
+    """
+    Выгружает слова пользователя во временный файл (см. exporter.py).
+    :return: (бинарный файл, число слов) или None при ошибке БД; файл закрывает вызывающий
+    """
+    try:
+        with replica.read_session(user_id) as session:
+            return exporter.export_to_tempfile(session, user_id, fmt)
+    except SQLAlchemyError as e:
+        print(f"[ERROR] Ошибка при выгрузке слов: {e}")
+        return None
+
+
+def _select_question(user_id, category_id=None):
+    """
+    Вопрос квиза одним запросом к БД (CTE: слово, его перевод и 3 чужих перевода).
+    """
+    with replica.read_session(user_id) as session:
+        row = session.execute(_question_statement(user_id, category_id)).first()
+    return _question_from_row(row, category_id)
+
+
+def _question_statement(user_id, category_id=None):
+    visible = (Word.user_id == None) | (Word.user_id == user_id)
+
+    w = (
+        select(Word.id, Word.original_word)
+        .where(visible)
+        .where(exists().where(Translation.word_id == Word.id))
+    )
+    if category_id is not None:
+        w = (
+            w.join(word_categories, word_categories.c.word_id == Word.id)
+            .where(word_categories.c.category_id == category_id)
+        )
+    w = w.order_by(func.random()).limit(1).cte("w")
+
+    c = (
+        select(Translation.id, Translation.translation)
+        .where(Translation.word_id == w.c.id)
+        .order_by(func.random())
+        .limit(1)
+        .cte("c")
+    )
+
+    own_tr = aliased(Translation)
+    own = select(own_tr.translation).where(own_tr.word_id == w.c.id).correlate(w)
+    candidates = (
+        select(Translation.translation)
+        .join(Word, Translation.word_id == Word.id)
+        .where(visible)
+        .where(Translation.word_id != w.c.id)
+        .where(Translation.translation.not_in(own))
+        .distinct()
+        .subquery()
+    )
+    d = select(candidates.c.translation).order_by(func.random()).limit(3).cte("d")
+
+    return (
+        select(
+            w.c.id, w.c.original_word, c.c.id, c.c.translation,
+            select(func.array_agg(d.c.translation)).scalar_subquery(),
+        )
+        .select_from(w)
+        .join(c, true())
+    )
+
+
+def _question_from_row(row, category_id):
+    if row is None:
+        return None
+
+    word_id, original, translation_id, correct, wrong = row
+    wrong = wrong or []
+    if category_id is None and len(wrong) < 3:
+        return None
+
+    options = [correct] + list(wrong)
+    random.shuffle(options)
+    return Question(word_id, translation_id, original, options, correct)
+
+
+# Добавление слова одним запросом: ищем слово пользователя или общее (без учёта регистра),
+# иначе вставляем новое; затем добавляем перевод, если его ещё нет
+_ADD_WORD_SQL = text("""
+WITH existing AS (
+    SELECT id, user_id FROM words
+    WHERE lower(original_word) = lower(:original)
+      AND (user_id IS NULL OR user_id = :user_id)
+    ORDER BY user_id NULLS LAST
+    LIMIT 1
+),
+inserted AS (
+    INSERT INTO words (original_word, example, user_id, created_at)
+    SELECT :original, :example, :user_id, now()
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+    ON CONFLICT ON CONSTRAINT uq_user_word DO UPDATE SET original_word = EXCLUDED.original_word
+    RETURNING id, user_id
+),
+word AS (
+    SELECT id, user_id, false AS created FROM existing
+    UNION ALL
+    SELECT id, user_id, true FROM inserted
+),
+tr AS (
+    INSERT INTO translations (word_id, translation, created_at)
+    SELECT id, :translation, now() FROM word
+    WHERE NOT EXISTS (
+        SELECT 1 FROM translations t WHERE t.word_id = word.id AND t.translation = :translation
+    )
+    RETURNING id
+)
+SELECT word.id, word.user_id, word.created, (SELECT id FROM tr) FROM word
+""")
+
+
+def _word_added(row, user_id, original, translation):
+    """Обновляет индекс словаря по результату _ADD_WORD_SQL."""
+    if row is None:
+        return False
+
+    word_id, owner_id, created, translation_id = row
+    replica.wrote(user_id)  # пока реплика не догнала, слова пользователя читаются с основной БД
+    if created:
+        vocab.put_user_word(user_id, WordEntry(word_id, original, [(translation_id, translation)], ()))
+    elif translation_id is not None:
+        vocab.add_translation(word_id, owner_id, translation_id, translation)
+    questions.invalidate_user(user_id)
+    return True
 
+
+@timed()
 def add_word(user_id, original, translation, example):
     """
     Добавляет новое слово и его перевод в БД для конкретного пользователя.
+    Выполняется одним запросом (upsert).
     """
     try:
         with SessionLocal() as session:
-            word = (
-                session.query(Word)
-                .filter(func.lower(Word.original_word) == original.lower())
-                .filter((Word.user_id == None) | (Word.user_id == user_id))
-                .first())
-
-            if word:
-                # если это не общее слово и не пользователя, то запрещаем
-                if word.user_id is not None and word.user_id != user_id:
-                    return False
-            else:
-                # создаём новое слово для пользователя
-                word = Word(original_word=original, example=example, user_id=user_id)
-                session.add(word)
-                session.flush() 
-
-            # проверяем, есть ли уже такой перевод у этого слова
-            existing_translation = (
-                session.query(Translation)
-                .filter_by(word_id=word.id, translation=translation)
-                .first()
-            )
-            if not existing_translation:
-                # добавляем перевод
-                t = Translation(word=word, translation=translation)
-                session.add(t)
-
-            # связываем с пользователем через UserAnswer
-            existing_link = (
-                session.query(UserAnswer)
-                .filter_by(user_id=user_id, word=word)
-                .first()
-            )
-            if not existing_link:
-                link = UserAnswer(user_id=user_id, word=word, is_correct=False)
-                session.add(link)
-
+            row = session.execute(_ADD_WORD_SQL, {
+                "user_id": user_id,
+                "original": original,
+                "translation": translation,
+                "example": example,
+            }).first()
             session.commit()
-            return True
+
+        return _word_added(row, user_id, original, translation)
 
     except SQLAlchemyError as e:
         print(f"[ERROR] Ошибка при добавлении слова: {e}")
         return False
 
 
+def _delete_word_statement(user_id, original_word):
+    return (
+        Word.__table__.delete()
+        .where(func.lower(Word.original_word) == original_word.lower())
+        .where(Word.user_id == user_id)  # Только пользовательское слово
+        .returning(Word.id)
+    )
+
+
+def _words_deleted(word_ids, user_id):
+    if not word_ids:
+        return False
+
+    replica.wrote(user_id)
+    for word_id in word_ids:
+        vocab.remove_user_word(user_id, word_id)
+    questions.invalidate_user(user_id)
+    return True
+
+
+@timed()
 def delete_word(user_id, original_word):
     """
     Удаляет пользовательское слово по оригинальному слову.
+    Переводы удаляются каскадно на стороне БД, поэтому хватает одного запроса.
 
     :param user_id: ID пользователя
     :param original_word: слово на родном языке
@@ -162,35 +464,29 @@ def delete_word(user_id, original_word):
     """
     try:
         with SessionLocal() as session:
-            word = (
-                session.query(Word)
-                .filter(func.lower(Word.original_word) == original_word.lower())
-                .filter(Word.user_id == user_id)  # Только пользовательское слово
-                .first()
-            )
-
-            if not word:
-                return False
-
-            session.delete(word)
+            word_ids = session.execute(_delete_word_statement(user_id, original_word)).scalars().all()
             session.commit()
-            return True
+
+        return _words_deleted(word_ids, user_id)
 
     except SQLAlchemyError as e:
         print(f"[ERROR] Ошибка при удалении слова: {e}")
         return False
 
 
-def get_wrong_translations(word_id, user_id):
-    with SessionLocal() as session:
-        wrongs = (
-            session.query(Translation)
-            .join(Word, Translation.word_id == Word.id)
-            .filter(Translation.word_id != word_id)
-            .filter((Word.user_id == None) | (Word.user_id == user_id))
-            .order_by(func.random())
-            .limit(3)
-            .all()
-        )
-        return [t.translation for t in wrongs]
+@timed()
+def record_answer(user_id, word_id, translation_id, is_correct):
+    """
+    Сохраняет ответ пользователя в квизе. Запись в БД выполняется пачками в фоне.
+    """
+    answer_recorder.record(user_id, word_id, translation_id, is_correct)
+
 
+@timed()
+def get_wrong_translations(word_id, user_id):
+    """
+    Возвращает до 3 случайных переводов других слов, видимых пользователю.
+    """
+    entry = vocab.get(word_id, user_id)
+    own = [text for _, text in entry.translations] if entry else []
+    return [text for _, _, text in vocab.random_pairs(user_id, 3, exclude_word_id=word_id, exclude_texts=own)]
@@ -0,0 +1,59 @@
+"""
+Пулы соединений с замером ожидания соединения и насыщенности пула.
+
+Время ожидания свободного соединения попадает в гистограмму db_pool_checkout_seconds,
+занятость пула — в gauge-метрики db_pool_* (см. metrics.py).
+"""
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+import metrics
+
+checkout_seconds = metrics._register(metrics.Histogram(
+    "db_pool_checkout_seconds", "Ожидание свободного соединения в пуле", ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+))
+checkout_timeouts = metrics._register(metrics.Counter(
+    "db_pool_timeouts_total", "Не дождались соединения за DB_POOL_TIMEOUT", ["pool"],
+))
+
+
+class _Timed:
+    # имя пула берётся из pool_logging_name движка и переживает engine.dispose()
+    @property
+    def pool_name(self):
+        return self._orig_logging_name or "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            checkout_timeouts.inc(self.pool_name)
+            raise
+        finally:
+            checkout_seconds.observe(time.perf_counter() - started, self.pool_name)
+
+
+class TimedQueuePool(_Timed, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_Timed, AsyncAdaptedQueuePool):
+    pass
+
+
+def saturation(pool):
+    """Доля занятых соединений от максимума (pool_size + max_overflow)."""
+    limit = pool.size() + max(pool._max_overflow, 0)
+    return round(pool.checkedout() / limit, 3) if limit else 0.0
+
+
+def register_pool_metrics(engine, name):
+    """Gauge-метрики занятости пула; engine.pool читается при каждом запросе метрик."""
+    metrics.gauge(f"db_pool_{name}_checked_out", "Соединений выдано из пула", lambda: engine.pool.checkedout())
+    metrics.gauge(f"db_pool_{name}_size", "Постоянных соединений в пуле", lambda: engine.pool.size())
+    metrics.gauge(f"db_pool_{name}_overflow", "Соединений сверх pool_size", lambda: engine.pool.overflow())
+    metrics.gauge(f"db_pool_{name}_saturation", "Занятость пула (0..1)", lambda: saturation(engine.pool))
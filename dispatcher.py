@@ -0,0 +1,130 @@
+"""
+Диспетчер обновлений: разные чаты обрабатываются параллельно в пуле потоков,
+обновления одного чата — строго по очереди.
+
+Так два обновления одного чата (например, ответ в квизе и нажатие кнопки меню)
+не гоняются за одно состояние, а медленный чат не задерживает остальных.
+Ограничены и очередь каждого чата, и общее число ожидающих обновлений.
+Webhook при переполнении любой из них отвечает Telegram 503 (см. webhook.py),
+и обновление доставляется повторно. Polling ждёт, пока освободится место
+в общей очереди, а обновления чата, чья очередь переполнена, отбрасывает —
+иначе один чат, засыпающий бота сообщениями, остановил бы все остальные.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ChatDispatcher:
+    # сколько обновлений чата обработать подряд, прежде чем уступить поток другим чатам
+    BATCH = 10
+
+    def __init__(self, handle, workers=8, max_backlog=20, max_total=1000):
+        self.handle = handle
+        self.max_backlog = max_backlog
+        self.max_total = max_total
+        self.dropped = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-worker")
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._chats = {}  # chat_id -> deque обновлений; есть ключ — чат уже обрабатывается
+        self._pending = 0  # обновлений во всех очередях (включая обрабатываемые)
+
+    def backlog(self):
+        """Число обновлений, ожидающих обработки."""
+        with self._lock:
+            return self._pending
+
+    def _chat_full(self, chat_id):
+        q = self._chats.get(chat_id)
+        return q is not None and len(q) >= self.max_backlog
+
+    def submit(self, chat_id, item, timeout=0):
+        """
+        Ставит обновление в очередь чата. Ждёт только места в общей очереди:
+        если переполнена очередь самого чата, обновление сразу не принимается.
+        :param timeout: сколько ждать места в общей очереди, с (0 — не ждать, None — без ограничения)
+        :return: False, если очередь переполнена и обновление не принято
+        """
+        with self._space:
+            if self._pending >= self.max_total and timeout != 0:
+                self._space.wait_for(lambda: self._pending < self.max_total, timeout)
+            if self._pending >= self.max_total or self._chat_full(chat_id):
+                self.dropped += 1
+                return False
+            self._pending += 1
+            q = self._chats.get(chat_id)
+            if q is None:
+                self._chats[chat_id] = deque([item])
+                self._pool.submit(self._drain, chat_id)
+            else:
+                q.append(item)
+            return True
+
+    def _drain(self, chat_id):
+        for _ in range(self.BATCH):
+            with self._lock:
+                q = self._chats[chat_id]
+                if not q:
+                    del self._chats[chat_id]
+                    return
+                item = q[0]
+            try:
+                self.handle(item)
+            except Exception as e:
+                print(f"[ERROR] Ошибка при обработке обновления чата {chat_id}: {e}")
+            with self._space:
+                q.popleft()
+                self._pending -= 1
+                self._space.notify_all()
+        # чат всё ещё занят: продолжаем в новой задаче, чтобы пул успевал за другими чатами
+        self._pool.submit(self._drain, chat_id)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def chat_of(update):
+    """Возвращает id чата, к которому относится обновление (или update_id, если чата нет)."""
+    for name in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+    call = getattr(update, "callback_query", None)
+    if call is not None and call.message is not None:
+        return call.message.chat.id
+    if call is not None:
+        return call.from_user.id
+    return update.update_id
+
+
+def install_dispatcher(bot, workers=None, max_backlog=None, max_total=None):
+    """
+    Подменяет bot.process_new_updates: обновления раздаются по чатам в ChatDispatcher,
+    обработчики выполняются в его потоках. При переполнении общей очереди polling ждёт места,
+    обновления чата с переполненной очередью отбрасывает; webhook передаёт обновления
+    в dispatcher.submit сам и отвечает 503 (run_webhook).
+    Настройки: DISPATCH_WORKERS, DISPATCH_CHAT_BACKLOG, DISPATCH_BACKLOG.
+    """
+    if workers is None:
+        workers = int(os.getenv("DISPATCH_WORKERS", "8"))
+    if max_backlog is None:
+        max_backlog = int(os.getenv("DISPATCH_CHAT_BACKLOG", "20"))
+    if max_total is None:
+        max_total = int(os.getenv("DISPATCH_BACKLOG", "1000"))
+
+    process = bot.process_new_updates
+    # обработчики выполняются в потоках диспетчера, а не в пуле TeleBot
+    bot.threaded = False
+    dispatcher = ChatDispatcher(lambda update: process([update]), workers, max_backlog, max_total)
+
+    def process_new_updates(updates):
+        # polling: Telegram хранит необработанные обновления, поэтому ждём места в общей очереди
+        for update in updates:
+            chat_id = chat_of(update)
+            if not dispatcher.submit(chat_id, update, timeout=None):
+                print(f"[WARN] Очередь чата {chat_id} переполнена, обновление {update.update_id} отброшено")
+
+    bot.process_new_updates = process_new_updates
+    return dispatcher
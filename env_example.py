@@ -3,4 +3,95 @@
 # DB_USER=
 # DB_PASSWORD=
 # DB_HOST=
-# DB_PORT=
\ No newline at end of file
+# DB_PORT=
+# 1 — применять миграции и заполнять общий словарь при запуске бота
+# AUTO_MIGRATE=
+# Режим работы: polling (по умолчанию) или webhook
+# BOT_MODE=
+# WEBHOOK_URL=
+# WEBHOOK_HOST=
+# WEBHOOK_PATH=
+# WEBHOOK_PORT=
+# WEBHOOK_SECRET=
+# WEBHOOK_WORKERS=
+# WEBHOOK_QUEUE=
+
+# Хранилище состояний диалога: memory (по умолчанию) или sqlite (переживает перезапуск);
+# размер хранилища в памяти, время жизни состояния (с), файл SQLite
+# STATE_BACKEND=
+# STATE_MAX_ENTRIES=
+# STATE_TTL=
+# STATE_SQLITE_PATH=
+
+# Кэш telegram_id -> users.id (записей)
+# USER_CACHE_SIZE=
+
+# Параллельная обработка чатов: число потоков, длина очереди одного чата и всех чатов вместе
+# (при переполнении webhook отвечает 503, polling ждёт)
+# DISPATCH_WORKERS=
+# DISPATCH_CHAT_BACKLOG=
+# DISPATCH_BACKLOG=
+
+# Пакетная запись ответов квиза: размер пачки и интервал записи (секунды)
+# ANSWERS_BATCH_SIZE=
+# ANSWERS_FLUSH_INTERVAL=
+# Партиции user_answers: на сколько месяцев вперёд создавать и сколько месяцев хранить ответы
+# (старшие сворачиваются в дневные итоги, python partitions.py compact)
+# ANSWERS_PARTITIONS_AHEAD=
+# ANSWERS_KEEP_MONTHS=
+
+# Метрики Prometheus (/metrics) в режиме polling и порог трассировки медленных обновлений, мс
+# METRICS_PORT=
+# SLOW_UPDATE_MS=
+
+# Пул соединений с БД: размер, переполнение, ожидание (с), пересоздание соединений (с),
+# проверка соединения перед выдачей (0/1), statement_timeout (мс)
+# DB_POOL_SIZE=
+# DB_MAX_OVERFLOW=
+# DB_POOL_TIMEOUT=
+# DB_POOL_RECYCLE=
+# DB_PRE_PING=
+# DB_STATEMENT_TIMEOUT=
+# 1 — база за PgBouncer (transaction pooling): кэш prepared statements asyncpg выключается,
+# имена запросов уникальны, statement_timeout задаётся на стороне сервера
+# (ALTER ROLE ... SET statement_timeout). В pgbouncer.ini нужны server_reset_query = DISCARD ALL
+# и server_reset_query_always = 1 — иначе подготовленные запросы переживают смену клиента
+# и пул SQLAlchemy придётся заменить на NullPool.
+# PGBOUNCER=
+# Кэш prepared statements asyncpg на соединение
+# DB_STATEMENT_CACHE_SIZE=
+
+# Реплика для чтения (база и пользователь — как у основной) и сколько секунд после изменения
+# своих слов пользователь читает с основной БД
+# REPLICA_DB_HOST=
+# REPLICA_DB_PORT=
+# READ_YOUR_WRITES_SECONDS=
+
+# 0 — не держать словарь в памяти, собирать вопрос запросом к БД
+# VOCAB_INDEX=
+# Индекс словаря: через сколько секунд перечитывать слова из БД (импорт, другие процессы бота;
+# 0 — никогда) и сколько пользователей держать в памяти
+# VOCAB_TTL=
+# VOCAB_USER_POOLS=
+
+# Снимок общего словаря для процессов бота (python snapshot.py build) и период проверки новой версии, с
+# VOCAB_SNAPSHOT=
+# VOCAB_SNAPSHOT_CHECK=
+
+# Очередь заранее собранных вопросов квиза на чат (0 — собирать в момент ответа),
+# потоков дозаполнения, сколько чатов помнить
+# PREFETCH_DEPTH=
+# PREFETCH_WORKERS=
+# PREFETCH_MAX_CHATS=
+
+# Сколько секунд кэшировать список категорий в меню (новые категории из импорта в другом процессе)
+# CATEGORY_CACHE_TTL=
+
+# Очередь исходящих сообщений (0 — отправлять напрямую): общий лимит и лимит на чат (сообщений/с),
+# запас на всплеск в чате, задержка для склейки соседних сообщений (мс), потоков отправки
+# OUTBOX=
+# OUTBOX_GLOBAL_RATE=
+# OUTBOX_CHAT_RATE=
+# OUTBOX_CHAT_BURST=
+# OUTBOX_LINGER_MS=
+# OUTBOX_WORKERS=
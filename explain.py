@@ -0,0 +1,126 @@
+"""
+Проверка планов частых запросов: EXPLAIN для каждого запроса database.py
+на локальной БД. Проверка падает, если запрос читает горячую таблицу
+последовательным сканированием (Seq Scan), то есть ему не хватает индекса.
+
+Чтобы результат не зависел от объёма данных, планировщику запрещается
+Seq Scan там, где есть альтернатива (enable_seqscan = off): если подходящего
+индекса нет, Seq Scan всё равно останется в плане.
+
+Запуск (настройки БД из .env):
+
+    python explain.py [--seed 20000]
+
+--seed добавляет синтетические слова перед проверкой; всё выполняется
+в одной транзакции, которая откатывается.
+
+Та же проверка входит в pytest (tests/test_explain.py; без настроенной БД
+тест пропускается).
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, insert, text
+
+from config import get_engine
+from models import Word, Translation, UserAnswer, ReviewState, UserCategoryStats, word_categories
+import database
+import exporter
+import srs
+import stats
+from vocab_index import VocabularyIndex
+
+# Таблицы, которые растут вместе с пользователями и словарём
+HOT_TABLES = {"words", "translations", "user_answers", "word_categories", "review_states", "user_category_stats"}
+
+USER_ID, WORD_ID, CATEGORY_ID = 1, 1, 1
+
+# Партиции user_answers (user_answers_p202610) проверяются как сама таблица
+_PARTITION = re.compile(r"_p\d{6}$")
+
+
+def hot_queries():
+    """:return: список (название, SQL-выражение)"""
+    return [
+        ("add_word", database._ADD_WORD_SQL.bindparams(
+            user_id=USER_ID, original="red", translation="красный", example="")),
+        ("delete_word", database._delete_word_statement(USER_ID, "red")),
+        ("_select_question (категория)", database._question_statement(USER_ID, CATEGORY_ID)),
+        ("индекс словаря: слова пользователя", VocabularyIndex._statement(USER_ID)),
+        ("индекс словаря: переводы слов", select(Translation).where(Translation.word_id.in_([1, 2, 3]))),
+        ("индекс словаря: категории слов",
+         select(word_categories).where(word_categories.c.word_id.in_([1, 2, 3]))),
+        ("слова категории", select(word_categories.c.word_id).where(word_categories.c.category_id == CATEGORY_ID)),
+        ("srs.next_due_words", srs._due_statement(USER_ID, 10)),
+        ("srs.new_words", srs._new_words_statement(USER_ID, WORD_ID, 10)),
+        ("stats: выученные слова", select(func.count()).select_from(ReviewState)
+         .where(ReviewState.user_id == USER_ID)
+         .where(ReviewState.box >= stats.LEARNED_BOX)),
+        ("stats: категории пользователя", select(UserCategoryStats)
+         .where(UserCategoryStats.user_id == USER_ID)),
+        # граница по answered_at отсекает старые партиции ещё при планировании
+        ("история ответов пользователя", select(UserAnswer)
+         .where(UserAnswer.user_id == USER_ID)
+         .where(UserAnswer.answered_at >= datetime.utcnow() - timedelta(days=30))
+         .order_by(UserAnswer.answered_at.desc()).limit(20)),
+        ("каскад удаления слова: user_answers", select(UserAnswer.id).where(UserAnswer.word_id == WORD_ID)),
+        ("экспорт: слова пользователя", exporter._statement(USER_ID)),
+        ("импорт: поиск существующих слов", select(func.lower(Word.original_word), Word.id)
+         .where(Word.user_id.is_(None))
+         .where(func.lower(Word.original_word).in_(["red", "blue"]))),
+    ]
+
+
+def seq_scans(plan):
+    """Находит в JSON-плане узлы Seq Scan по горячим таблицам."""
+    found = []
+    relation = _PARTITION.sub("", plan.get("Relation Name", ""))
+    if plan.get("Node Type") == "Seq Scan" and relation in HOT_TABLES:
+        found.append(relation)
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def _seed(conn, count):
+    words = conn.execute(
+        insert(Word).returning(Word.id),
+        [{"original_word": f"seed-word-{i}", "example": None, "user_id": None} for i in range(count)],
+    ).scalars().all()
+    conn.execute(insert(Translation), [{"word_id": w, "translation": f"перевод-{w}"} for w in words])
+    conn.execute(text("ANALYZE words"))
+    conn.execute(text("ANALYZE translations"))
+
+
+def check(seed=0):
+    """:return: число запросов с Seq Scan по горячим таблицам"""
+    failures = 0
+    with get_engine().connect() as conn:
+        trans = conn.begin()
+        try:
+            if seed:
+                _seed(conn, seed)
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for name, stmt in hot_queries():
+                sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+                raw = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+                plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+                scans = seq_scans(plan)
+                if scans:
+                    failures += 1
+                    print(f"[FAIL] {name}: Seq Scan по {', '.join(sorted(set(scans)))}")
+                else:
+                    print(f"[ok] {name}")
+        finally:
+            trans.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка планов частых запросов")
+    parser.add_argument("--seed", type=int, default=0, help="сколько синтетических слов добавить")
+    args = parser.parse_args()
+    sys.exit(1 if check(args.seed) else 0)
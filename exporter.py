@@ -0,0 +1,130 @@
+"""
+Потоковая выгрузка словаря в CSV или JSONL — в том же формате, что читает importer.py.
+
+Слова читаются серверным курсором (yield_per): в памяти только одна порция строк,
+а переводы и категории собираются в массивы самой БД (array_agg по индексам
+translations.word_id и word_categories), без загрузки ORM-объектов.
+Строки сразу пишутся в файл, поэтому память не зависит от размера словаря.
+
+Запуск:
+
+    python exporter.py words.csv [--user TELEGRAM_ID] [--batch 1000]
+"""
+import argparse
+import csv
+import io
+import json
+import tempfile
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import array_agg, aggregate_order_by
+
+from models import User, Word, Translation, Category, word_categories
+
+BATCH_SIZE = 1000
+FIELDS = ["word", "example", "translations", "categories"]
+
+
+def _statement(user_id=None):
+    translations = (
+        select(array_agg(aggregate_order_by(Translation.translation, Translation.id)))
+        .where(Translation.word_id == Word.id)
+        .scalar_subquery()
+    )
+    categories = (
+        select(array_agg(aggregate_order_by(Category.name, Category.name)))
+        .join(word_categories, word_categories.c.category_id == Category.id)
+        .where(word_categories.c.word_id == Word.id)
+        .scalar_subquery()
+    )
+    owner = Word.user_id.is_(None) if user_id is None else Word.user_id == user_id
+    return (
+        select(Word.original_word, Word.example, translations, categories)
+        .where(owner)
+        .order_by(Word.id)
+    )
+
+
+def iter_words(session, user_id=None, batch_size=BATCH_SIZE):
+    """
+    Слова владельца (None — общий словарь) порциями по batch_size строк.
+    :return: генератор словарей {word, example, translations, categories}
+    """
+    result = session.execute(_statement(user_id).execution_options(yield_per=batch_size))
+    for word, example, translations, categories in result:
+        yield {
+            "word": word,
+            "example": example,
+            "translations": translations or [],
+            "categories": categories or [],
+        }
+
+
+def write_rows(rows, f, fmt="csv"):
+    """
+    Пишет строки в текстовый файл f.
+    :return: число строк
+    """
+    count = 0
+    if fmt == "jsonl":
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    writer = csv.DictWriter(f, FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            "word": row["word"],
+            "example": row["example"] or "",
+            "translations": "|".join(row["translations"]),
+            "categories": "|".join(row["categories"]),
+        })
+        count += 1
+    return count
+
+
+def export_to_tempfile(session, user_id=None, fmt="csv", batch_size=BATCH_SIZE):
+    """
+    Выгружает словарь во временный файл на диске (для отправки документом).
+    :return: (бинарный файл, открытый на начале, число слов); файл закрывает вызывающий
+    """
+    f = tempfile.TemporaryFile()
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    try:
+        count = write_rows(iter_words(session, user_id, batch_size), text, fmt)
+        text.flush()
+    except BaseException:
+        f.close()
+        raise
+    text.detach()  # закрывать будет вызывающий — через бинарный файл
+    f.seek(0)
+    return f, count
+
+
+def main():
+    from config import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Выгрузка словаря в CSV/JSONL")
+    parser.add_argument("path", help="файл .csv или .jsonl")
+    parser.add_argument("--user", type=int, help="telegram_id владельца (по умолчанию — общий словарь)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = "jsonl" if args.path.endswith(".jsonl") or args.path.endswith(".json") else "csv"
+
+    started = time.perf_counter()
+    with SessionLocal() as session:
+        user_id = None
+        if args.user:
+            user_id = session.scalar(select(User.id).where(User.telegram_id == args.user))
+            if user_id is None:
+                parser.error(f"пользователь {args.user} не найден (он должен хотя бы раз нажать /start)")
+        with open(args.path, "w", encoding="utf-8", newline="") as f:
+            count = write_rows(iter_words(session, user_id, args.batch), f, fmt)
+    print(f"[INFO] Выгружено слов: {count} за {round(time.perf_counter() - started, 3)} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Кэш соответствия telegram_id -> users.id.
+
+После первого обращения пользователя его внутренний id берётся из памяти,
+без запроса к БД. Размер кэша ограничен (вытесняются давно не использованные записи).
+"""
+import threading
+from collections import OrderedDict
+
+
+class UserIdCache:
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, telegram_id):
+        with self._lock:
+            user_id = self._data.get(telegram_id)
+            if user_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(telegram_id)
+            return user_id
+
+    def put(self, telegram_id, user_id):
+        with self._lock:
+            self._data[telegram_id] = user_id
+            self._data.move_to_end(telegram_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, telegram_id):
+        with self._lock:
+            self._data.pop(telegram_id, None)
+
+    def stats(self):
+        """:return: словарь с размером кэша и счётчиками попаданий/промахов"""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,219 @@
+"""
+Пакетный импорт словаря из CSV или JSONL.
+
+CSV (с заголовком):  word,example,translations,categories
+    несколько переводов и категорий разделяются символом "|"
+JSONL (по объекту на строку):
+    {"word": "Red", "example": "...", "translations": ["Красный"], "categories": ["Цвета"]}
+
+Файл читается потоково и пишется пачками многострочных INSERT, поэтому память
+не зависит от размера файла. Слова, которые уже есть в словаре (без учёта регистра),
+не дублируются — к ним добавляются только новые переводы и категории.
+
+Запуск:
+
+    python importer.py words.csv [--user TELEGRAM_ID] [--batch 1000]
+"""
+import argparse
+import csv
+import json
+import time
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from models import User, Word, Translation, Category, word_categories
+import keyboards
+
+BATCH_SIZE = 1000
+
+
+def read_rows(path):
+    """
+    Потоково читает файл словаря.
+    :return: генератор словарей {word, example, translations, categories}
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl") or path.endswith(".json"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                yield {
+                    "word": row["word"],
+                    "example": row.get("example") or None,
+                    "translations": _split(row.get("translations")),
+                    "categories": _split(row.get("categories")),
+                }
+
+
+def _split(value):
+    return [v.strip() for v in (value or "").split("|") if v.strip()]
+
+
+def import_rows(session, rows, user_id=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Импортирует слова пачками по batch_size; каждая пачка — отдельная транзакция.
+
+    :param session: сессия SQLAlchemy
+    :param rows: итерируемые словари {word, example, translations, categories}
+    :param user_id: владелец слов (None — общий словарь)
+    :param progress: функция, вызываемая со статистикой после каждой пачки
+    :return: статистика импорта
+    """
+    stats = {"rows": 0, "words": 0, "translations": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    categories = {}  # имя категории -> id, общий для всех пачек
+    started = time.perf_counter()
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _import_batch(session, batch, user_id, categories, stats)
+            batch = []
+            _tick(stats, started, progress)
+    if batch:
+        _import_batch(session, batch, user_id, categories, stats)
+    _tick(stats, started, progress)
+    return stats
+
+
+def _tick(stats, started, progress):
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_sec"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    if progress:
+        progress(stats)
+
+
+def _import_batch(session, batch, user_id, categories, stats):
+    stats["rows"] += len(batch)
+
+    # объединяем повторы внутри пачки (ключ — слово в нижнем регистре)
+    entries = {}
+    for row in batch:
+        word = (row.get("word") or "").strip()
+        if not word:
+            continue
+        entry = entries.setdefault(word.lower(), {
+            "word": word, "example": row.get("example"), "translations": [], "categories": [],
+        })
+        for t in row.get("translations") or []:
+            if t not in entry["translations"]:
+                entry["translations"].append(t)
+        for c in row.get("categories") or []:
+            if c not in entry["categories"]:
+                entry["categories"].append(c)
+    if not entries:
+        return
+
+    new_categories = _resolve_categories(session, {c for e in entries.values() for c in e["categories"]}, categories)
+
+    # слова, которые уже есть в словаре этого владельца
+    owner = Word.user_id.is_(None) if user_id is None else Word.user_id == user_id
+    word_ids = dict(session.execute(
+        select(func.lower(Word.original_word), Word.id)
+        .where(owner)
+        .where(func.lower(Word.original_word).in_(list(entries)))
+    ).all())
+    existing = set(word_ids.values())
+
+    new_words = [
+        {"original_word": e["word"], "example": e["example"], "user_id": user_id}
+        for key, e in entries.items() if key not in word_ids
+    ]
+    if new_words:
+        stmt = insert(Word).values(new_words)
+        if user_id is None:
+            # NULL в uq_user_word не конфликтуют: общие слова защищает частичный индекс
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[func.lower(Word.original_word)], index_where=Word.user_id.is_(None))
+        else:
+            stmt = stmt.on_conflict_do_nothing(constraint="uq_user_word")
+        inserted = session.execute(stmt.returning(Word.id, Word.original_word)).all()
+        stats["words"] += len(inserted)
+        for word_id, original in inserted:
+            word_ids[original.lower()] = word_id
+        # слова, которые параллельный импорт успел вставить раньше
+        missing = [key for key in entries if key not in word_ids]
+        if missing:
+            word_ids.update(session.execute(
+                select(func.lower(Word.original_word), Word.id)
+                .where(owner)
+                .where(func.lower(Word.original_word).in_(missing))
+            ).all())
+
+    # переводы, которые уже есть у существующих слов
+    known = set()
+    if existing:
+        known = set(session.execute(
+            select(Translation.word_id, Translation.translation)
+            .where(Translation.word_id.in_(existing))
+        ).all())
+
+    translations = [
+        {"word_id": word_ids[key], "translation": t}
+        for key, e in entries.items() if key in word_ids
+        for t in e["translations"] if (word_ids[key], t) not in known
+    ]
+    if translations:
+        session.execute(insert(Translation).values(translations))
+        stats["translations"] += len(translations)
+
+    links = [
+        {"word_id": word_ids[key], "category_id": categories[c]}
+        for key, e in entries.items() if key in word_ids
+        for c in e["categories"]
+    ]
+    if links:
+        session.execute(insert(word_categories).values(links).on_conflict_do_nothing())
+
+    session.commit()
+    if new_categories:
+        # список категорий в меню бота этого процесса устарел
+        keyboards.categories.invalidate()
+
+
+def _resolve_categories(session, names, categories):
+    """
+    Дополняет кэш categories id категорий из names, создавая недостающие.
+    :return: True, если созданы новые категории
+    """
+    missing = [n for n in names if n not in categories]
+    if not missing:
+        return False
+    created = session.execute(
+        insert(Category).values([{"name": n} for n in missing])
+        .on_conflict_do_nothing().returning(Category.id)
+    ).all()
+    categories.update(session.execute(
+        select(Category.name, Category.id).where(Category.name.in_(missing))
+    ).all())
+    return bool(created)
+
+
+def main():
+    from config import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Импорт словаря из CSV/JSONL")
+    parser.add_argument("path")
+    parser.add_argument("--user", type=int, help="telegram_id владельца (по умолчанию — общий словарь)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    def report(stats):
+        print(f"[INFO] строк: {stats['rows']}, новых слов: {stats['words']}, "
+              f"переводов: {stats['translations']}, {stats['rows_per_sec']} строк/с")
+
+    with SessionLocal() as session:
+        user_id = None
+        if args.user:
+            user_id = session.scalar(select(User.id).where(User.telegram_id == args.user))
+            if user_id is None:
+                parser.error(f"пользователь {args.user} не найден (он должен хотя бы раз нажать /start)")
+        stats = import_rows(session, read_rows(args.path), user_id, args.batch, progress=report)
+    print(f"[INFO] Импорт завершён за {stats['seconds']} с")
+
+
+if __name__ == "__main__":
+    main()
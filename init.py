@@ -1,10 +1,19 @@
+"""
+Начальное заполнение общего словаря.
+
+Запуск (после python migrations.py):
+
+    python init.py
+"""
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from models import Word, Translation, Category
-from datetime import datetime
+from importer import import_rows
+
+# Версия начальных данных; при изменении словаря ниже увеличьте её, чтобы init.py применил их снова
+SEED_VERSION = 1
 
 def words(db: Session):
-    if db.query(Word).first(): # если есть слова, то ничего не делаем
-        return
+    # импорт идемпотентен: существующие слова, переводы и категории не дублируются
 
     color_words = {
         "Red": {
@@ -81,21 +90,32 @@ def words(db: Session):
     }
 
 
-    colors_category = Category(name="Цвета")
-    pronouns_category = Category(name="Местоимения")
-    db.add_all([colors_category, pronouns_category])
-    db.flush()  # получаем Idшки категорий
-
-    def add_words(words_dict, category_obj):
+    def rows(words_dict, category_name):
         for word, data in words_dict.items():
-            new_word = Word(original_word=word, example=data["example"], created_at=datetime.utcnow())
-            new_word.categories.append(category_obj)
-            db.add(new_word)
-            db.flush() # получаем Id для new_word
-            for tr in data["translations"]:
-                db.add(Translation(word_id=new_word.id, translation=tr))
+            yield {
+                "word": word,
+                "example": data["example"],
+                "translations": data["translations"],
+                "categories": [category_name],
+            }
+
+    import_rows(db, rows(color_words, "Цвета"))
+    import_rows(db, rows(pronoun_words, "Местоимения"))
+
+
+def seed():
+    """Заполняет общий словарь и записывает версию данных в seed_version."""
+    from config import SessionLocal
+
+    with SessionLocal() as db:
+        words(db)
+        db.execute(
+            text("INSERT INTO seed_version (version) VALUES (:v) ON CONFLICT DO NOTHING"),
+            {"v": SEED_VERSION},
+        )
+        db.commit()
 
-    add_words(color_words, colors_category)
-    add_words(pronoun_words, pronouns_category)
 
-    db.commit()
+if __name__ == "__main__":
+    seed()
+    print(f"[INFO] Общий словарь заполнен, версия данных: {SEED_VERSION}")
@@ -0,0 +1,73 @@
+"""
+Кэш клавиатур бота.
+
+Telegram принимает reply_markup готовой JSON-строкой, поэтому статические
+клавиатуры сериализуются один раз при импорте, а список категорий вместе
+с inline-клавиатурой хранится до изменения категорий (или до истечения
+CATEGORY_CACHE_TTL секунд — категории может добавить импорт из другого процесса).
+"""
+import json
+import os
+import threading
+import time
+
+BACK_BUTTON = "⬅ Назад"
+MENU_BUTTONS = ['🧠 Учить слова', '📑 Выбрать категорию', '📝 Добавить слово', '🗑 Удалить слово', '🔁 Повторение', '⌨️ Ввод перевода', '📊 Статистика']
+
+CATEGORY_CACHE_TTL = float(os.getenv("CATEGORY_CACHE_TTL", "300"))
+
+
+def reply_keyboard(labels, row_width=2):
+    """JSON reply-клавиатуры (как ReplyKeyboardMarkup(row_width, resize_keyboard=True).to_json())."""
+    rows = [[{"text": label} for label in labels[i:i + row_width]] for i in range(0, len(labels), row_width)]
+    return json.dumps({"keyboard": rows, "resize_keyboard": True})
+
+
+def inline_keyboard(buttons):
+    """JSON inline-клавиатуры по одной кнопке в строке; buttons — пары (текст, callback_data)."""
+    rows = [[{"text": text, "callback_data": data}] for text, data in buttons]
+    return json.dumps({"inline_keyboard": rows})
+
+
+def quiz_keyboard(options):
+    """Варианты ответа и кнопка «Назад»."""
+    return reply_keyboard(list(options) + [BACK_BUTTON])
+
+
+MAIN_MENU = reply_keyboard(MENU_BUTTONS)
+# Ответ вводится текстом — на клавиатуре только «Назад»
+BACK_KEYBOARD = reply_keyboard([BACK_BUTTON])
+
+
+class CategoryCache:
+    """Список категорий и его inline-клавиатура."""
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        self.ttl = ttl
+        self._value = None  # (категории, клавиатура или None, время загрузки)
+        self._lock = threading.Lock()
+
+    def cached(self):
+        """:return: (категории, клавиатура) или None, если кэш пуст или устарел"""
+        value = self._value
+        if value is None or time.monotonic() - value[2] > self.ttl:
+            return None
+        return value[0], value[1]
+
+    def store(self, categories):
+        """Кэширует список [(id, name)] и возвращает (категории, клавиатура)."""
+        keyboard = inline_keyboard((name, f"category_{id}") for id, name in categories) if categories else None
+        with self._lock:
+            self._value = (categories, keyboard, time.monotonic())
+        return categories, keyboard
+
+    def get(self, load):
+        """:param load: функция без аргументов, возвращающая [(id, name)] из БД"""
+        return self.cached() or self.store(load())
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+categories = CategoryCache()
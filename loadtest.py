@@ -0,0 +1,293 @@
+"""
+Нагрузочный тест обработчиков бота без сети.
+
+- Локальная заглушка Telegram Bot API записывает вызовы (sendMessage и др.)
+  и отвечает как настоящий API.
+- Синтетические пользователи проходят /start, выбор категории, ответы в квизе,
+  добавление и удаление слова — через обработчики main.py и локальную БД.
+- Итог: p50/p95/p99 задержки обработки обновления (по типам), пропускная
+  способность, SQL-запросы и вызовы API на одно обновление. Время обработки
+  меряется без досылки очереди исходящих сообщений (outbox.py): она ограничена
+  лимитами Telegram и считается отдельно; если очередь не опустела, код выхода — 1.
+
+Запуск (БД из .env; TOKEN может быть любым токеном правильного формата,
+например 123:fake; синтетические пользователи удаляются после теста):
+
+    python loadtest.py --users 1000 --threads 8
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from telebot import apihelper, types
+
+# id синтетических пользователей начинаются отсюда, чтобы не пересекаться с настоящими
+USER_ID_BASE = 9_000_000_000
+
+
+class FakeTelegramAPI:
+    """Заглушка Bot API: считает вызовы методов и возвращает правдоподобные ответы."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                path, _, query = self.path.partition("?")
+                method = path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length", 0))
+                # telebot передаёт параметры в строке запроса
+                params = dict(parse_qsl(query))
+                params.update(_parse_params(self.rfile.read(length), self.headers.get("Content-Type", "")))
+                with api._lock:
+                    api.calls[method] = api.calls.get(method, 0) + 1
+                    api._message_id += 1
+                    message_id = api._message_id
+                result = True
+                if method.startswith("send"):
+                    result = {
+                        "message_id": message_id,
+                        "date": int(time.time()),
+                        "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                        "text": params.get("text", ""),
+                    }
+                body = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        apihelper.API_URL = self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def _parse_params(body, content_type):
+    if "json" in content_type:
+        return json.loads(body or b"{}")
+    if "x-www-form-urlencoded" in content_type:
+        return dict(parse_qsl(body.decode("utf-8")))
+    return {}
+
+
+class SyntheticUser:
+    """Генерирует обновления Telegram от имени одного пользователя."""
+
+    _update_id = 0
+    _lock = threading.Lock()
+
+    def __init__(self, n):
+        self.id = USER_ID_BASE + n
+        self.user = {"id": self.id, "is_bot": False, "first_name": f"Load{n}", "username": f"load{n}"}
+        self.chat = {"id": self.id, "type": "private"}
+
+    @classmethod
+    def _next_id(cls):
+        with cls._lock:
+            cls._update_id += 1
+            return cls._update_id
+
+    def message(self, text):
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else None
+        msg = {"message_id": 1, "date": int(time.time()), "chat": self.chat, "from": self.user, "text": text}
+        if entities:
+            msg["entities"] = entities
+        return types.Update.de_json({"update_id": self._next_id(), "message": msg})
+
+    def callback(self, data):
+        msg = {"message_id": 1, "date": int(time.time()), "chat": self.chat, "text": "Выберите категорию:"}
+        return types.Update.de_json({
+            "update_id": self._next_id(),
+            "callback_query": {"id": str(self._next_id()), "from": self.user, "message": msg,
+                               "chat_instance": "load", "data": data},
+        })
+
+
+def scenario(user, categories, state_of, answers=5):
+    """
+    Сценарий одного пользователя: список пар (тип обновления, функция -> Update).
+    state_of(chat_id) возвращает текущее состояние чата, чтобы отвечать на квиз.
+    """
+    def answer():
+        state = state_of(user.id)
+        correct = state.get("correct")
+        if correct is None or random.random() < 0.3:
+            return user.message("неправильный ответ")
+        return user.message(correct)
+
+    steps = [("start", lambda: user.message("/start"))]
+    steps.append(("learn", lambda: user.message("🧠 Учить слова")))
+    steps += [("answer", answer)] * answers
+    if categories:
+        category_id = random.choice(categories)
+        steps.append(("choose_category", lambda: user.message("📑 Выбрать категорию")))
+        steps.append(("category", lambda: user.callback(f"category_{category_id}")))
+        steps += [("answer", answer)] * answers
+    word = f"loadword{user.id}"
+    steps += [
+        ("add", lambda: user.message("📝 Добавить слово")),
+        ("add_stage", lambda: user.message(word)),
+        ("add_stage", lambda: user.message("нагрузка")),
+        ("add_stage", lambda: user.message("load test example")),
+        ("delete", lambda: user.message("🗑 Удалить слово")),
+        ("delete_stage", lambda: user.message(word)),
+    ]
+    return steps
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(users=200, threads=8, answers=5):
+    import main
+    from database import get_categories, answer_recorder
+    from querycount import count_statements
+
+    api = FakeTelegramAPI()
+    api.start()
+    # обработчики выполняются в потоке, который передал обновление
+    main.bot.threaded = False
+
+    categories = [c for c, _ in get_categories()]
+    latencies = {}
+    errors = []
+    lock = threading.Lock()
+
+    def play(n):
+        user = SyntheticUser(n)
+        for kind, make in scenario(user, categories, main.user_states.get, answers):
+            update = make()
+            started = time.perf_counter()
+            try:
+                main.bot.process_new_updates([update])
+            except Exception as e:
+                with lock:
+                    errors.append(f"{kind}: {e}")
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.setdefault(kind, []).append(elapsed)
+
+    with count_statements() as statements:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(play, range(users)))
+        # пропускная способность — обработчиков, а не лимита отправки очереди сообщений
+        wall = time.perf_counter() - started
+
+    outbox_seconds, unsent = 0.0, 0
+    if main.outbox is not None:
+        # ответы уходят с лимитом на чат: ждём, пока очередь опустеет, чтобы посчитать вызовы API
+        flush_started = time.perf_counter()
+        if not main.outbox.flush(timeout=600):
+            unsent = main.outbox.depth()
+            print(f"[WARN] Очередь сообщений не опустела за 600 с, не отправлено: {unsent}")
+        outbox_seconds = time.perf_counter() - flush_started
+
+    answer_recorder.flush()
+    api.stop()
+    _cleanup(users)
+
+    total = sum(len(v) for v in latencies.values())
+    report = {
+        "updates": total,
+        "errors": len(errors),
+        "seconds": round(wall, 2),
+        "updates_per_sec": round(total / wall, 1) if wall else 0.0,
+        "sql_per_update": round(len(statements) / total, 2) if total else 0.0,
+        "api_calls_per_update": round(api.total_calls() / total, 2) if total else 0.0,
+        "api_calls": dict(api.calls),
+        "outbox_flush_seconds": round(outbox_seconds, 2),
+        "outbox_unsent": unsent,
+        "latency_ms": {},
+    }
+    for kind, values in sorted(latencies.items()) + [("all", [v for vs in latencies.values() for v in vs])]:
+        report["latency_ms"][kind] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+        }
+    return report
+
+
+def _cleanup(users):
+    """Удаляет синтетических пользователей (их слова и ответы удаляются каскадно)."""
+    from config import SessionLocal
+    from models import User
+
+    with SessionLocal() as session:
+        session.query(User).filter(
+            User.telegram_id >= USER_ID_BASE, User.telegram_id < USER_ID_BASE + users
+        ).delete(synchronize_session=False)
+        session.commit()
+
+
+def print_report(report):
+    print(f"Обновлений: {report['updates']} за {report['seconds']} с "
+          f"({report['updates_per_sec']} обновл./с)")
+    if report["errors"]:
+        print(f"Ошибок в обработчиках: {report['errors']}")
+    print(f"SQL-запросов на обновление: {report['sql_per_update']}, "
+          f"вызовов API на обновление: {report['api_calls_per_update']} {report['api_calls']}")
+    if report["outbox_flush_seconds"]:
+        print(f"Досылка очереди сообщений после теста: {report['outbox_flush_seconds']} с")
+    if report["outbox_unsent"]:
+        print(f"Не отправлено из очереди сообщений: {report['outbox_unsent']}")
+    print(f"{'тип':<16}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for kind, row in report["latency_ms"].items():
+        print(f"{kind:<16}{row['count']:>8}{row['p50']:>10}{row['p95']:>10}{row['p99']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--answers", type=int, default=5, help="ответов в квизе на пользователя")
+    parser.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+    args = parser.parse_args()
+
+    result = run(args.users, args.threads, args.answers)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+    if result["outbox_unsent"]:
+        sys.exit(1)
@@ -1,6 +1,5 @@
 # Импортируем библиотеку для Tg-бота
 import telebot
-from telebot import types
 
 from config import init_bd
 
@@ -8,29 +7,45 @@ from config import init_bd
 from database import (
     new_user,
     get_categories,
-    get_words_by_category,
-    get_word_and_vars,
+    next_question,
+    end_quiz,
+    get_review_question,
+    record_review,
     add_word,
     delete_word,
-    get_wrong_translations
+    record_answer,
+    get_stats,
+    check_answer,
+    export_words,
 )
 
 # Импорт стандартных библиотек
 import os
-import random
 from dotenv import load_dotenv
 
+from state_store import make_state_store
+from outbox import install_outbox
+from router import Router, QUIZ
+import keyboards
+import metrics
+
 # Загружаем переменные из .env файла
 load_dotenv()
 
 # Получаем токен из переменной окружения
 bot = telebot.TeleBot(os.getenv("TOKEN"))
+# Исходящие сообщения — через очередь с лимитами Telegram и склейкой соседних сообщений
+outbox = install_outbox(bot)
+
+# Хранилище состояний пользователя (что он делает), ключ — chat_id
+user_states = make_state_store()
+metrics.gauge("bot_state_store_size", "Состояний диалога в хранилище", lambda: len(user_states))
 
-# Словарь для хранения состояний пользователя (что он делает)
-user_states = {}
+# Команды, кнопки меню и этапы диалога
+router = Router()
 
 # Обработчик команды /start
-@bot.message_handler(commands=['start'])
+@router.command('/start')
 def welcome(message):
     user = message.from_user  # Получаем информацию о пользователе
 
@@ -54,31 +69,19 @@ def welcome(message):
 
 
 def menu(chat):
-    # Создаём клавиатуру
-    keyb = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    press_learn = types.KeyboardButton('🧠 Учить слова')
-    press_category = types.KeyboardButton('📑 Выбрать категорию')
-    press_add = types.KeyboardButton('📝 Добавить слово')
-    press_delete = types.KeyboardButton('🗑 Удалить слово')
-    keyb.add(press_learn, press_category, press_add, press_delete)
-
-    # Отправляем сообщение с меню
-    bot.send_message(chat, "Выбери действие:", reply_markup=keyb)
+    # Клавиатура меню сериализована заранее (keyboards.MAIN_MENU)
+    bot.send_message(chat, "Выбери действие:", reply_markup=keyboards.MAIN_MENU)
 
 
 # Обработчик выбора категории
-@bot.message_handler(func=lambda m: m.text == '📑 Выбрать категорию')
+@router.command('📑 Выбрать категорию', aliases=['выбрать категорию'])
 def choose_category(message):
-    categories = get_categories()  # Получаем категории из БД
+    # Категории и inline-кнопки из кэша; к БД — только когда кэш пуст или устарел
+    categories, inline_keyb = keyboards.categories.get(get_categories)
     if not categories:
         bot.send_message(message.chat.id, "Категории пока не добавлены.")
         return
 
-    # Создаём inline-кнопки
-    inline_keyb = types.InlineKeyboardMarkup(row_width=1)
-    for id, name in categories:
-        inline_keyb.add(types.InlineKeyboardButton(name, callback_data=f"category_{id}"))
-
     # Отправляем список категорий
     bot.send_message(message.chat.id, "Выберите категорию:", reply_markup=inline_keyb)
 
@@ -87,165 +90,228 @@ def choose_category(message):
 @bot.callback_query_handler(func=lambda call: call.data.startswith("category_"))
 def category(call):
     category_id = int(call.data.split("_")[1])  # Получаем ID категории из текста
-    user_states[call.from_user.id] = {'category_id': category_id, 'attempts': 0}  # Сохраняем состояние
-    send_next_word(call.message.chat.id, call.from_user.id, category_id)  # Отправляем слово из категории
+    user_states.set(call.message.chat.id, {'category_id': category_id, 'attempts': 0})  # Сохраняем состояние
+    send_next_word(call.message.chat.id, new_user(call.from_user), category_id)  # Отправляем слово из категории
 
 
 # Отправка следующего слова
-def send_next_word(chat_id, user_id, category_id=None):
-    if category_id:
-        word_data = get_words_by_category(category_id, user_id)  # Получаем слово по категории
-        if not word_data:
-            bot.send_message(chat_id, "Нет больше слов в этой категории.")
-            menu(chat_id)
-            return
-
-        word_id, original, correct_translation = word_data
-        wrong_translations = get_wrong_translations(word_id, user_id)  # Получаем 3 неверных перевода
-        options = [correct_translation] + wrong_translations
-        random.shuffle(options)  # Перемешиваем варианты
-
-        user_states[chat_id] = {
-            'correct': correct_translation,
-            'category_id': category_id,
-            'attempts': 0
-        }
-
+def send_next_word(chat_id, user_id, category_id=None, mode=None):
+    if mode == 'review':
+        question = get_review_question(user_id)  # Карточка, которой пора повториться
     else:
-        result = get_word_and_vars(user_id)  # Получаем случайное слово и варианты
-        if not result:
+        question = next_question(chat_id, user_id, category_id)  # Слово, правильный перевод и варианты (заранее собранные)
+    if not question:
+        # иначе следующий ответ засчитался бы к прошлому вопросу
+        user_states.delete(chat_id)
+        if mode == 'review':
+            bot.send_message(chat_id, "Сейчас нечего повторять. Загляните позже!")
+        elif category_id:
+            bot.send_message(chat_id, "Нет больше слов в этой категории.")
+        else:
             bot.send_message(chat_id, "Нет доступных слов.")
-            menu(chat_id)
-            return
-
-        original, options, correct_translation = result
-
-        user_states[chat_id] = {
-            'correct': correct_translation,
-            'category_id': None,
-            'attempts': 0
-        }
+        menu(chat_id)
+        return
 
-    # Создаём кнопки для вариантов перевода
-    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-    buttons = [types.KeyboardButton(option) for option in options]
-    buttons.append(types.KeyboardButton("⬅ Назад"))
-    markup.add(*buttons)
+    original, options = question.original, question.options
+    user_states.set(chat_id, {
+        'correct': question.correct,
+        'word_id': question.word_id,
+        'translation_id': question.translation_id,
+        'category_id': category_id,
+        'mode': mode,
+        'attempts': 0
+    })
+
+    if mode == 'typed':
+        # Перевод вводится текстом, засчитывается любой перевод слова
+        prompt, markup = f"Напиши перевод слова: *{original}*", keyboards.BACK_KEYBOARD
+    else:
+        # Кнопки для вариантов перевода
+        prompt, markup = f"Переведи слово: *{original}*", keyboards.quiz_keyboard(options)
 
     # Отправляем вопрос пользователю
     bot.send_message(
         chat_id,
-        f"Переведи слово: *{original}*",
+        prompt,
         parse_mode="Markdown",
         reply_markup=markup
     )
 
 
 # Обработка кнопки "Учить слова"
-@bot.message_handler(func=lambda m: m.text == '🧠 Учить слова')
+@router.command('🧠 Учить слова', aliases=['учить слова'])
 def learn_words(message):
-    send_next_word(message.chat.id, message.from_user.id)
+    send_next_word(message.chat.id, new_user(message.from_user))
+
+# Обработка кнопки "Повторение" — интервальное повторение
+@router.command('🔁 Повторение', aliases=['повторение'])
+def review_words(message):
+    send_next_word(message.chat.id, new_user(message.from_user), mode='review')
+
+# Обработка кнопки "Ввод перевода" — перевод набирается вручную
+@router.command('⌨️ Ввод перевода', aliases=['ввод перевода'])
+def typed_words(message):
+    send_next_word(message.chat.id, new_user(message.from_user), mode='typed')
+
+# Статистика прогресса
+@router.command('/stats', '📊 Статистика', aliases=['статистика'])
+def show_stats(message):
+    stats = get_stats(new_user(message.from_user))
+    if stats is None:
+        bot.send_message(message.chat.id, "❌ Не удалось получить статистику. Попробуйте позже.")
+        return
+
+    accuracy = round(100 * stats.correct / stats.answers) if stats.answers else 0
+    lines = [
+        "📊 Ваша статистика",
+        f"Ответов: {stats.answers}, правильных: {stats.correct} ({accuracy}%)",
+        f"Выучено слов: {stats.learned}",
+        f"Серия: {stats.streak} дн. подряд (рекорд — {stats.best_streak})",
+    ]
+    if stats.categories:
+        lines.append("")
+        lines.append("По категориям:")
+        for name, answers, correct in stats.categories:
+            lines.append(f"• {name}: {answers} отв., {round(100 * correct / answers) if answers else 0}%")
+    # без разметки: названия категорий могут содержать символы Markdown
+    bot.send_message(message.chat.id, "\n".join(lines))
+
+# Выгрузка своих слов файлом: /export (CSV) или /export jsonl
+@router.command('/export')
+def export(message):
+    fmt = "jsonl" if "jsonl" in message.text.casefold() else "csv"
+    exported = export_words(new_user(message.from_user), fmt)
+    if exported is None:
+        bot.send_message(message.chat.id, "❌ Не удалось выгрузить слова. Попробуйте позже.")
+        return
+
+    f, count = exported
+    with f:
+        if not count:
+            bot.send_message(message.chat.id, "У вас пока нет своих слов. Добавьте их через «📝 Добавить слово».")
+            return
+        bot.send_document(message.chat.id, f, visible_file_name=f"words.{fmt}", caption=f"Ваши слова: {count}")
 
 # Обработка добавления слова
-@bot.message_handler(func=lambda m: m.text == '📝 Добавить слово')
+@router.command('📝 Добавить слово', aliases=['добавить слово'])
 def handle_add_word(message):
     bot.send_message(message.chat.id, 'Введите слово, которое хотите добавить (на английском):')
-    user_states[message.chat.id] = {'stage': 'original'}
+    user_states.set(message.chat.id, {'stage': 'original'})
 
 # Обработка удаления слова
-@bot.message_handler(func=lambda m: m.text == '🗑 Удалить слово')
+@router.command('🗑 Удалить слово', aliases=['удалить слово'])
 def handle_delete_word(message):
     bot.send_message(message.chat.id, 'Введите слово, которое хотите удалить:')
-    user_states[message.chat.id] = {'stage': 'delete'}
-
-# Обработка всех остальных сообщений
-@bot.message_handler(func=lambda message: True)
-def handle_input(message):
-    chat_id = message.chat.id
-    text = message.text.strip()
-    state = user_states.get(chat_id, {})
+    user_states.set(message.chat.id, {'stage': 'delete'})
 
-    if text == "⬅ Назад":
-        menu(chat_id)
-        return
+# Выход в меню
+@router.command(keyboards.BACK_BUTTON, aliases=['назад'])
+def handle_back(message):
+    user_states.delete(message.chat.id)
+    end_quiz(message.chat.id)
+    menu(message.chat.id)
 
-    # Проверка ответа
-    if state.get('correct') is not None:
-        if text == state['correct']:
+# Проверка ответа
+@router.stage(QUIZ)
+def handle_answer(message, state, text):
+    chat_id = message.chat.id
+    user_id = new_user(message.from_user)
+    if text == state['correct']:
+        matched = (state.get('translation_id'), text, True)  # нажата кнопка с верным вариантом
+    else:
+        # любой перевод слова; опечатки прощаются только при вводе вручную
+        matched = check_answer(user_id, state.get('word_id'), text, typos=state.get('mode') == 'typed')
+    is_correct = matched is not None
+    translation_id = matched[0] if is_correct else state.get('translation_id')
+    record_answer(user_id, state.get('word_id'), translation_id, is_correct)
+    # в повторении учитываем только первую попытку: ошибка возвращает карточку в начало
+    if state.get('mode') == 'review' and state.get('attempts', 0) == 0:
+        record_review(user_id, state['word_id'], is_correct)
+    if is_correct:
+        if matched[2]:
             bot.send_message(chat_id, "✅ Правильно!")
-            if state.get('category_id') is not None:
-                send_next_word(chat_id, message.from_user.id, state['category_id'])
-            else:
-                send_next_word(chat_id, message.from_user.id)
-        else:
-            attempts = state.get('attempts', 0) + 1
-            if attempts < 2:
-                bot.send_message(chat_id, f"❌ Неправильно. Попробуйте снова ({attempts}/2):")
-                user_states[chat_id]['attempts'] = attempts
-            else:
-                bot.send_message(chat_id, f"❌ Правильный ответ: *{state['correct']}*", parse_mode="Markdown")
-                menu(chat_id)
-        return
-
-    # Этап 1: Добавление слова — оригинал(на англ)
-    if state.get('stage') == 'original':
-        user_states[chat_id]['original'] = text
-        user_states[chat_id]['stage'] = 'translation'
-        bot.send_message(chat_id, "Введите перевод на русский:")
-
-    # Этап 2: перевод
-    elif state.get('stage') == 'translation':
-        user_states[chat_id]['translation'] = text
-        user_states[chat_id]['stage'] = 'example'
-        bot.send_message(chat_id, "Введите пример использования:")
-
-    # Этап 3: пример
-    elif state.get('stage') == 'example':
-        example = text
-        success = add_word(
-            user_id=new_user(message.from_user),
-            original=user_states[chat_id]['original'],
-            translation=user_states[chat_id]['translation'],
-            example=example
-        )
-        if success:
-            bot.send_message(chat_id, "✅ Слово успешно добавлено!")
         else:
-            bot.send_message(chat_id, "❌ Ошибка при добавлении слова.")
-        menu(chat_id)
-
-    # Удаление слова
-    elif state.get('stage') == 'delete':
-        deleted = delete_word(new_user(message.from_user), text)
-        if deleted:
-            bot.send_message(chat_id, "✅ Слово удалено.")
+            bot.send_message(chat_id, f"✅ Правильно! Пишется так: «{matched[1]}»")
+        send_next_word(chat_id, user_id, state.get('category_id'), state.get('mode'))
+    else:
+        attempts = state.get('attempts', 0) + 1
+        if attempts < 2:
+            bot.send_message(chat_id, f"❌ Неправильно. Попробуйте снова ({attempts}/2):")
+            user_states.update(chat_id, attempts=attempts)
         else:
-            bot.send_message(chat_id, "❌ Такого слова нет в вашем списке.")
-        menu(chat_id)
-
-# Поддержка ввода через текст 
-@bot.message_handler(func=lambda message: message.text.lower() in ['учить слова', '🧠 учить слова'])
-def handle_learn_words_text(message):
-    learn_words(message)
+            bot.send_message(chat_id, f"❌ Правильный ответ: *{state['correct']}*", parse_mode="Markdown")
+            user_states.delete(chat_id)
+            menu(chat_id)
 
+# Этап 1: Добавление слова — оригинал(на англ)
+@router.stage('original')
+def handle_original(message, state, text):
+    user_states.update(message.chat.id, original=text, stage='translation')
+    bot.send_message(message.chat.id, "Введите перевод на русский:")
+
+# Этап 2: перевод
+@router.stage('translation')
+def handle_translation(message, state, text):
+    user_states.update(message.chat.id, translation=text, stage='example')
+    bot.send_message(message.chat.id, "Введите пример использования:")
+
+# Этап 3: пример
+@router.stage('example')
+def handle_example(message, state, text):
+    chat_id = message.chat.id
+    success = add_word(
+        user_id=new_user(message.from_user),
+        original=state['original'],
+        translation=state['translation'],
+        example=text
+    )
+    if success:
+        bot.send_message(chat_id, "✅ Слово успешно добавлено!")
+    else:
+        bot.send_message(chat_id, "❌ Ошибка при добавлении слова.")
+    user_states.delete(chat_id)
+    menu(chat_id)
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['выбрать категорию', '📑 выбрать категорию'])
-def handle_choose_category_text(message):
-    choose_category(message)
+# Удаление слова
+@router.stage('delete')
+def handle_delete(message, state, text):
+    chat_id = message.chat.id
+    deleted = delete_word(new_user(message.from_user), text)
+    if deleted:
+        bot.send_message(chat_id, "✅ Слово удалено.")
+    else:
+        bot.send_message(chat_id, "❌ Такого слова нет в вашем списке.")
+    user_states.delete(chat_id)
+    menu(chat_id)
 
+# Все текстовые сообщения — через маршрутизатор: команда по тексту или этап диалога по состоянию
+@bot.message_handler(content_types=['text'])
+def route(message):
+    router.dispatch(message, user_states.get)
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['добавить слово', '📝 добавить слово'])
-def handle_add_word_text(message):
-    handle_add_word(message)
+# время считается по обработчикам маршрутизатора (metrics.instrument_router)
+route.instrumented = True
 
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['удалить слово', '🗑 удалить слово'])
-def handle_delete_word_text(message):
-    handle_delete_word(message)
+# Метрики обработчиков и вызовов Telegram API
+metrics.instrument_router(router)
+metrics.instrument_bot(bot)
 
 
 if __name__ == '__main__':
     init_bd()
     print('База данных инициализирована')
     print('Бот запущен, кусь')
-    bot.polling(none_stop=True)
+    # обновления разных чатов — параллельно, одного чата — по порядку
+    from dispatcher import install_dispatcher
+    dispatcher = install_dispatcher(bot)
+    metrics.gauge("bot_dispatch_backlog", "Обновлений в очередях чатов", dispatcher.backlog)
+    metrics.counter("bot_dispatch_dropped_total", "Обновлений не принято из-за переполнения очереди",
+                    lambda: dispatcher.dropped)
+    if os.getenv("BOT_MODE") == "webhook":
+        from webhook import run_webhook
+        run_webhook(bot, dispatcher)
+    else:
+        if os.getenv("METRICS_PORT"):
+            metrics.start_metrics_server(int(os.getenv("METRICS_PORT")))
+        bot.polling(none_stop=True)
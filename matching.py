@@ -0,0 +1,79 @@
+"""
+Проверка введённого перевода.
+
+Ответ и переводы слова приводятся к одному виду (normalize_answer): регистр,
+ё → е, знаки препинания и лишние пробелы не важны. Нормализованные переводы
+хранятся в индексе словаря (WordEntry.answers), поэтому проверка ответа —
+поиск в множестве и, если точного совпадения нет, сравнение с несколькими
+переводами одного слова с ограниченным расстоянием Левенштейна.
+"""
+import unicodedata
+
+# Допустимое число опечаток в зависимости от длины ответа
+_TYPO_LIMITS = ((3, 0), (7, 1))
+_MAX_TYPOS = 2
+
+
+def normalize_answer(text):
+    """'  Жёлтый! ' → 'желтый'"""
+    text = text.casefold().replace("ё", "е")
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split())
+
+
+def typo_limit(text):
+    """Сколько опечаток прощать в ответе такой длины: короткие слова — только точно."""
+    for length, limit in _TYPO_LIMITS:
+        if len(text) <= length:
+            return limit
+    return _MAX_TYPOS
+
+
+def within_distance(a, b, limit):
+    """
+    Расстояние Левенштейна между a и b не больше limit.
+    Считается только полоса шириной 2*limit+1 вокруг диагонали, с выходом,
+    как только вся строка полосы превысила limit: O(len * limit).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if limit == 0:
+        return a == b
+    inf = limit + 1
+    previous = {j: j for j in range(0, min(len(b), limit) + 1)}
+    for i in range(1, len(a) + 1):
+        current = {}
+        low, high = max(0, i - limit), min(len(b), i + limit)
+        if low == 0:
+            current[0] = i
+        for j in range(max(1, low), high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous.get(j - 1, inf) + cost,  # замена
+                previous.get(j, inf) + 1,         # удаление
+                current.get(j - 1, inf) + 1,      # вставка
+            )
+        if min(current.values()) > limit:
+            return False
+        previous = current
+    return previous.get(len(b), inf) <= limit
+
+
+def match(text, answers, typos=True):
+    """
+    :param answers: {нормализованный перевод: (translation_id, перевод)} одного слова
+    :param typos: прощать ли опечатки (для ответа, набранного вручную)
+    :return: (translation_id, перевод, точно ли) или None
+    """
+    key = normalize_answer(text)
+    found = answers.get(key)
+    if found is not None:
+        return found[0], found[1], True
+    if not typos or not key:
+        return None
+    limit = typo_limit(key)
+    if limit:
+        for normalized, (tid, translation) in answers.items():
+            if within_distance(key, normalized, limit):
+                return tid, translation, False
+    return None
@@ -0,0 +1,289 @@
+"""
+Метрики бота в формате Prometheus и трассировка медленных обновлений.
+
+- Гистограммы задержки обработчиков (bot_handler_seconds) и функций database.py (db_call_seconds).
+- Счётчик и время SQL-запросов через события движка SQLAlchemy.
+- Счётчик вызовов Telegram Bot API по методам.
+- Gauge-метрики, значения которых читаются в момент запроса /metrics
+  (размер хранилища состояний, очередь записи ответов и т.п.), и так же читаемые
+  счётчики — монотонные счётчики модулей (записано ответов, отправлено сообщений).
+
+/metrics отдаёт webhook-сервер, а в режиме polling — отдельный HTTP-сервер на METRICS_PORT.
+
+Трассировка медленных обновлений включается переменной SLOW_UPDATE_MS: для обработчика,
+работавшего дольше порога, печатаются выполненные SQL-запросы и сводка cProfile.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Порог медленного обновления в миллисекундах (0 — трассировка выключена)
+SLOW_UPDATE_MS = float(os.getenv("SLOW_UPDATE_MS", "0"))
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Значение вычисляется функцией в момент чтения метрик."""
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class CounterFunc(Gauge):
+    """Монотонный счётчик, значение которого читается функцией в момент чтения метрик."""
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {value}"]
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [счётчики по корзинам..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    row[i] += 1
+            row[-2] += seconds
+            row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, row in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, row):
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {row[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {row[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {row[-1]}")
+        return lines
+
+
+_registry = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name, help, read):
+    """Регистрирует gauge-метрику с функцией чтения значения."""
+    return _register(Gauge(name, help, read))
+
+
+def counter(name, help, read):
+    """Регистрирует счётчик с функцией чтения значения (значение только растёт)."""
+    return _register(CounterFunc(name, help, read))
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+handler_seconds = _register(Histogram("bot_handler_seconds", "Время работы обработчика обновления", ["handler"]))
+handler_errors = _register(Counter("bot_handler_errors_total", "Исключения в обработчиках", ["handler"]))
+db_call_seconds = _register(Histogram("db_call_seconds", "Время работы функции database.py", ["function"]))
+sql_statements = _register(Counter("sql_statements_total", "Выполненные SQL-запросы"))
+sql_seconds = _register(Histogram("sql_statement_seconds", "Время выполнения SQL-запроса"))
+api_calls = _register(Counter("telegram_api_calls_total", "Вызовы Telegram Bot API", ["method"]))
+
+
+# Трассировка: SQL-запросы текущего обновления (только когда включена трассировка)
+_trace = threading.local()
+
+
+def timed(function_name=None):
+    """Декоратор: время вызова функции database.py попадает в db_call_seconds."""
+    def decorator(func):
+        name = function_name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                db_call_seconds.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Считает SQL-запросы и их время через события движка."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        sql_statements.inc()
+        sql_seconds.observe(elapsed)
+        statements = getattr(_trace, "statements", None)
+        if statements is not None:
+            statements.append((elapsed, statement))
+
+
+def instrument_api():
+    """Считает вызовы Telegram Bot API по методам."""
+    from telebot import apihelper
+
+    make_request = apihelper._make_request
+    if getattr(make_request, "instrumented", False):
+        return
+
+    @functools.wraps(make_request)
+    def counted(token, method_name, *args, **kwargs):
+        api_calls.inc(method_name)
+        return make_request(token, method_name, *args, **kwargs)
+
+    counted.instrumented = True
+    apihelper._make_request = counted
+
+
+def _wrap_handler(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = None
+        if SLOW_UPDATE_MS:
+            _trace.statements = []
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            handler_seconds.observe(elapsed, name)
+            if profiler is not None:
+                profiler.disable()
+                statements, _trace.statements = _trace.statements, None
+                if elapsed * 1000 >= SLOW_UPDATE_MS:
+                    _report_slow(name, elapsed, statements, profiler)
+    return wrapper
+
+
+def _report_slow(name, elapsed, statements, profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+    lines = [f"[SLOW] {name}: {elapsed * 1000:.1f} мс, SQL-запросов: {len(statements)}"]
+    for seconds, statement in statements:
+        lines.append(f"    {seconds * 1000:.1f} мс  {' '.join(statement.split())[:300]}")
+    lines.append(out.getvalue())
+    print("\n".join(lines))
+
+
+def instrument_bot(bot):
+    """
+    Оборачивает все зарегистрированные обработчики бота: время работы,
+    ошибки и (если включено) трассировка медленных обновлений.
+    Вызывать после регистрации обработчиков.
+    """
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            if not getattr(handler["function"], "instrumented", False):
+                handler["function"] = _wrap_handler(handler["function"])
+                handler["function"].instrumented = True
+    instrument_api()
+
+
+def instrument_router(router):
+    """Оборачивает обработчики маршрутизатора (router.py) так же, как обработчики бота."""
+    router.wrap(_wrap_handler)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        write_metrics(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics(request_handler):
+    """Отвечает на HTTP-запрос текстом метрик (для встраивания в другие серверы)."""
+    body = render().encode("utf-8")
+    request_handler.send_response(200)
+    request_handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+    request_handler.send_header("Content-Length", str(len(body)))
+    request_handler.end_headers()
+    request_handler.wfile.write(body)
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Запускает в фоне HTTP-сервер с эндпоинтом /metrics."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
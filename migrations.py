@@ -0,0 +1,371 @@
+"""
+Версионные миграции схемы БД.
+
+Применённые версии записываются в таблицу schema_version. Каждая миграция —
+номер, описание и список SQL-команд. Выпущенная миграция не меняется: DDL в ней
+записан явно, а не строится по текущим моделям (models.py), поэтому новая
+и старая базы после миграций получают одну и ту же схему. Изменения схемы —
+только новыми версиями. Индексы создаются через
+CREATE INDEX CONCURRENTLY (вне транзакции), чтобы не блокировать запись
+в рабочую базу.
+
+Запуск (бот при старте только проверяет версию, см. config.init_bd):
+
+    python migrations.py
+"""
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+import partitions
+
+# Базовая схема (models.py на момент миграции 1). IF NOT EXISTS: базы, созданные
+# до миграций через create_all, уже содержат эти таблицы
+_SCHEMA_V1 = [
+    """CREATE TABLE IF NOT EXISTS categories (
+        id SERIAL NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id SERIAL NOT NULL,
+        telegram_id INTEGER NOT NULL,
+        username VARCHAR(100),
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (telegram_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS words (
+        id SERIAL NOT NULL,
+        original_word VARCHAR(100) NOT NULL,
+        example TEXT,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        user_id INTEGER,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_user_word UNIQUE (original_word, user_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_words_lower_original ON words (lower(original_word))",
+    "CREATE INDEX IF NOT EXISTS ix_words_user_id ON words (user_id)",
+    """CREATE TABLE IF NOT EXISTS review_states (
+        user_id INTEGER NOT NULL,
+        word_id INTEGER NOT NULL,
+        box INTEGER NOT NULL,
+        due_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        reviews INTEGER NOT NULL,
+        lapses INTEGER NOT NULL,
+        last_reviewed_at TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (user_id, word_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_review_states_user_due ON review_states (user_id, due_at)",
+    "CREATE INDEX IF NOT EXISTS ix_review_states_word_id ON review_states (word_id)",
+    """CREATE TABLE IF NOT EXISTS translations (
+        id SERIAL NOT NULL,
+        word_id INTEGER NOT NULL,
+        translation VARCHAR(100) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_translations_word_id ON translations (word_id)",
+    """CREATE TABLE IF NOT EXISTS word_categories (
+        word_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        PRIMARY KEY (word_id, category_id),
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE CASCADE,
+        FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_word_categories_category_id ON word_categories (category_id)",
+    """CREATE TABLE IF NOT EXISTS user_answers (
+        id SERIAL NOT NULL,
+        user_id INTEGER NOT NULL,
+        word_id INTEGER,
+        translation_id INTEGER,
+        is_correct BOOLEAN NOT NULL,
+        answered_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE SET NULL,
+        FOREIGN KEY (translation_id) REFERENCES translations (id) ON DELETE SET NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_user_answers_translation_id ON user_answers (translation_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_answers_user_id ON user_answers (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_answers_word_id ON user_answers (word_id)",
+]
+
+# Таблицы счётчиков /stats (миграция 4)
+_STATS_TABLES_V4 = [
+    """CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER NOT NULL,
+        answers INTEGER NOT NULL,
+        correct INTEGER NOT NULL,
+        last_answer_on DATE,
+        streak_days INTEGER NOT NULL,
+        best_streak INTEGER NOT NULL,
+        PRIMARY KEY (user_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_category_stats (
+        user_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        answers INTEGER NOT NULL,
+        correct INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category_id),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE
+    )""",
+]
+
+# Пересчёт счётчиков для миграции 4 — копия stats._REBUILD_SQL до секционирования:
+# answer_daily появляется только в миграции 5.
+# Выпущенные миграции не меняются вместе с кодом, поэтому stats.rebuild здесь не вызывается.
+_STATS_V4_SQL = [
+    "LOCK TABLE user_stats, user_category_stats IN EXCLUSIVE MODE",
+    "DELETE FROM user_stats",
+    "DELETE FROM user_category_stats",
+    # серии дней: дни подряд дают одинаковую разность «день − номер дня»
+    """
+    WITH days AS (
+        SELECT DISTINCT user_id, answered_at::date AS day FROM user_answers
+    ), runs AS (
+        SELECT user_id, count(*) AS length, max(day) AS last_day
+        FROM (SELECT user_id, day,
+                     day - (row_number() OVER (PARTITION BY user_id ORDER BY day))::int AS run
+              FROM days) d
+        GROUP BY user_id, run
+    ), totals AS (
+        SELECT user_id, count(*) AS answers, count(*) FILTER (WHERE is_correct) AS correct
+        FROM user_answers GROUP BY user_id
+    )
+    INSERT INTO user_stats (user_id, answers, correct, last_answer_on, streak_days, best_streak)
+    SELECT t.user_id, t.answers, t.correct, r.last_day, r.length,
+           (SELECT max(length) FROM runs WHERE runs.user_id = t.user_id)
+    FROM totals t
+    JOIN LATERAL (
+        SELECT last_day, length FROM runs WHERE runs.user_id = t.user_id ORDER BY last_day DESC LIMIT 1
+    ) r ON true
+    """,
+    """
+    INSERT INTO user_category_stats (user_id, category_id, answers, correct)
+    SELECT a.user_id, wc.category_id, count(*), count(*) FILTER (WHERE a.is_correct)
+    FROM user_answers a
+    JOIN word_categories wc ON wc.word_id = a.word_id
+    GROUP BY a.user_id, wc.category_id
+    """,
+]
+
+# Заглушки старого add_word: строка user_answers без перевода и с is_correct = false
+# на каждое добавленное слово. Их писал только код до появления миграций, поэтому
+# граница — первая применённая миграция: позже translation_id бывает NULL только
+# у настоящих ответов, перевод которых удалён (ON DELETE SET NULL).
+_LEGACY_PLACEHOLDERS_V6 = """
+    DELETE FROM user_answers
+    WHERE translation_id IS NULL AND NOT is_correct
+      AND answered_at < (SELECT min(applied_at) FROM schema_version)
+"""
+
+# Пересчёт счётчиков без заглушек — копия stats._REBUILD_SQL на момент миграции 6
+_ANSWERS_V6 = """
+    answers AS (
+        SELECT user_id, word_id, answered_at::date AS day, 1 AS answers, is_correct::int AS correct
+        FROM user_answers
+        UNION ALL
+        SELECT user_id, word_id, day, answers, correct FROM answer_daily
+    )
+"""
+_STATS_V6_SQL = [
+    "LOCK TABLE user_stats, user_category_stats IN EXCLUSIVE MODE",
+    "DELETE FROM user_stats",
+    "DELETE FROM user_category_stats",
+    # серии дней: дни подряд дают одинаковую разность «день − номер дня»
+    f"""
+    WITH {_ANSWERS_V6}, days AS (
+        SELECT DISTINCT user_id, day FROM answers
+    ), runs AS (
+        SELECT user_id, count(*) AS length, max(day) AS last_day
+        FROM (SELECT user_id, day,
+                     day - (row_number() OVER (PARTITION BY user_id ORDER BY day))::int AS run
+              FROM days) d
+        GROUP BY user_id, run
+    ), totals AS (
+        SELECT user_id, sum(answers) AS answers, sum(correct) AS correct
+        FROM answers GROUP BY user_id
+    )
+    INSERT INTO user_stats (user_id, answers, correct, last_answer_on, streak_days, best_streak)
+    SELECT t.user_id, t.answers, t.correct, r.last_day, r.length,
+           (SELECT max(length) FROM runs WHERE runs.user_id = t.user_id)
+    FROM totals t
+    JOIN LATERAL (
+        SELECT last_day, length FROM runs WHERE runs.user_id = t.user_id ORDER BY last_day DESC LIMIT 1
+    ) r ON true
+    """,
+    f"""
+    WITH {_ANSWERS_V6}
+    INSERT INTO user_category_stats (user_id, category_id, answers, correct)
+    SELECT a.user_id, wc.category_id, sum(a.answers), sum(a.correct)
+    FROM answers a
+    JOIN word_categories wc ON wc.word_id = a.word_id
+    GROUP BY a.user_id, wc.category_id
+    """,
+]
+
+# Повторы общих слов (uq_user_word их не ловит: NULL в user_id не конфликтуют).
+# Остаётся слово с меньшим id; ссылки на повторы переносятся на него, затем повторы
+# удаляются и создаётся частичный уникальный индекс.
+_SHARED_WORDS_V7 = [
+    """CREATE TEMP TABLE shared_word_dups ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, min(id) OVER (PARTITION BY lower(original_word)) AS keep_id
+        FROM words WHERE user_id IS NULL
+    ) w WHERE id <> keep_id""",
+    # переводы с тем же текстом, что у оставшегося слова, заменяются его переводами
+    """CREATE TEMP TABLE shared_translation_dups ON COMMIT DROP AS
+    SELECT DISTINCT ON (t.id) t.id, k.id AS keep_id
+    FROM translations t
+    JOIN shared_word_dups d ON d.id = t.word_id
+    JOIN translations k ON k.word_id = d.keep_id AND k.translation = t.translation
+    ORDER BY t.id, k.id""",
+    """UPDATE user_answers a SET translation_id = m.keep_id
+    FROM shared_translation_dups m WHERE a.translation_id = m.id""",
+    "DELETE FROM translations WHERE id IN (SELECT id FROM shared_translation_dups)",
+    "UPDATE translations t SET word_id = d.keep_id FROM shared_word_dups d WHERE t.word_id = d.id",
+    "UPDATE user_answers a SET word_id = d.keep_id FROM shared_word_dups d WHERE a.word_id = d.id",
+    """INSERT INTO word_categories (word_id, category_id)
+    SELECT d.keep_id, wc.category_id FROM word_categories wc JOIN shared_word_dups d ON d.id = wc.word_id
+    ON CONFLICT DO NOTHING""",
+    # карточка уже оставшегося слова важнее: повторы переносятся, только если её нет
+    """INSERT INTO review_states (user_id, word_id, box, due_at, reviews, lapses, last_reviewed_at)
+    SELECT DISTINCT ON (r.user_id, d.keep_id)
+           r.user_id, d.keep_id, r.box, r.due_at, r.reviews, r.lapses, r.last_reviewed_at
+    FROM review_states r JOIN shared_word_dups d ON d.id = r.word_id
+    ORDER BY r.user_id, d.keep_id, r.reviews DESC
+    ON CONFLICT DO NOTHING""",
+    """INSERT INTO answer_daily (user_id, word_id, day, answers, correct)
+    SELECT a.user_id, d.keep_id, a.day, sum(a.answers), sum(a.correct)
+    FROM answer_daily a JOIN shared_word_dups d ON d.id = a.word_id
+    GROUP BY a.user_id, d.keep_id, a.day
+    ON CONFLICT (user_id, word_id, day) DO UPDATE SET
+        answers = answer_daily.answers + excluded.answers,
+        correct = answer_daily.correct + excluded.correct""",
+    "DELETE FROM answer_daily WHERE word_id IN (SELECT id FROM shared_word_dups)",
+    "DELETE FROM words WHERE id IN (SELECT id FROM shared_word_dups)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_shared_word_lower ON words (lower(original_word)) WHERE user_id IS NULL",
+]
+
+# (версия, описание, команды, выполнять в транзакции)
+MIGRATIONS = [
+    (1, "базовая схема", _SCHEMA_V1, True),
+    (2, "индексы для частых запросов", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_words_lower_original ON words (lower(original_word))",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_words_user_id ON words (user_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_translations_word_id ON translations (word_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_answers_user_id ON user_answers (user_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_answers_word_id ON user_answers (word_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_answers_translation_id ON user_answers (translation_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_word_categories_category_id ON word_categories (category_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_review_states_word_id ON review_states (word_id)",
+        "ANALYZE words, translations, user_answers, word_categories, review_states",
+    ], False),
+    (3, "версия начальных данных", [
+        "CREATE TABLE IF NOT EXISTS seed_version ("
+        " version INTEGER PRIMARY KEY,"
+        " applied_at TIMESTAMP NOT NULL DEFAULT now())",
+    ], True),
+    (4, "счётчики статистики пользователей", [
+        *_STATS_TABLES_V4,
+        *_STATS_V4_SQL,
+    ], True),
+    # индексы секционированной user_answers создаются вместе с ней (partitions.convert)
+    (5, "секционирование user_answers по месяцам", [partitions.convert], True),
+    (6, "удаление заглушек старого add_word из user_answers", [
+        _LEGACY_PLACEHOLDERS_V6,
+        *_STATS_V6_SQL,
+    ], True),
+    (7, "уникальность общих слов без учёта регистра", _SHARED_WORDS_V7, True),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            " version INTEGER PRIMARY KEY,"
+            " description TEXT NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL DEFAULT now())"
+        ))
+
+
+def current_version(engine):
+    """Последняя применённая версия схемы (0 — миграций ещё не было)."""
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_version")).scalar()
+
+
+def stored_versions(engine):
+    """
+    Версии схемы и начальных данных одним запросом (для проверки при запуске).
+    :return: (версия схемы, версия данных); (0, 0), если миграций ещё не было
+    """
+    try:
+        with engine.connect() as conn:
+            return tuple(conn.execute(text(
+                "SELECT (SELECT coalesce(max(version), 0) FROM schema_version),"
+                " (SELECT coalesce(max(version), 0) FROM seed_version)"
+            )).one())
+    except ProgrammingError:
+        # таблиц версий нет — база новая или старше миграции 3
+        return 0, 0
+
+
+def _run(conn, command):
+    if callable(command):
+        command(bind=conn)
+    else:
+        conn.execute(text(command))
+
+
+def migrate(engine):
+    """
+    Применяет все миграции новее текущей версии.
+    :return: список применённых версий
+    """
+    _ensure_version_table(engine)
+    version = current_version(engine)
+    applied = []
+
+    for number, description, commands, transactional in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"[INFO] Миграция {number}: {description}")
+        if transactional:
+            with engine.begin() as conn:
+                for command in commands:
+                    _run(conn, command)
+        else:
+            # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                for command in commands:
+                    _run(conn, command)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                {"v": number, "d": description},
+            )
+        applied.append(number)
+
+    return applied
+
+
+if __name__ == "__main__":
+    from config import get_engine
+
+    engine = get_engine()
+    applied = migrate(engine)
+    print(f"[INFO] Применено миграций: {len(applied)}, версия схемы: {current_version(engine)}")
@@ -1,17 +1,20 @@
 from typing import Optional
 
-from datetime import datetime
+from datetime import datetime, date
 from sqlalchemy import (
     Column,
     String,
     Text,
     Integer,
+    BigInteger,
     Boolean,
     DateTime,
+    Date,
     ForeignKey,
     func,
     Table,
-    UniqueConstraint
+    UniqueConstraint,
+    Index
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -38,7 +41,7 @@ class Word(Base):
     original_word: Mapped[str] = mapped_column(String(100), nullable=False)
     example: Mapped[str | None] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
-    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
 
     owner: Mapped["User"] = relationship(back_populates="words")
     translations: Mapped[list["Translation"]] = relationship(back_populates="word", cascade="all, delete-orphan")
@@ -47,11 +50,17 @@ class Word(Base):
 
     __table_args__ = (UniqueConstraint("original_word", "user_id", name="uq_user_word"),)
 
+# поиск слова без учёта регистра (add_word, delete_word, импорт)
+Index("ix_words_lower_original", func.lower(Word.original_word))
+# общее слово — одно на написание без учёта регистра (в uq_user_word NULL не конфликтуют)
+Index("uq_shared_word_lower", func.lower(Word.original_word), unique=True,
+      postgresql_where=Word.user_id.is_(None))
+
 class Translation(Base):
     __tablename__ = "translations"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    word_id: Mapped[int] = mapped_column(ForeignKey("words.id", ondelete="CASCADE"), nullable=False)
+    word_id: Mapped[int] = mapped_column(ForeignKey("words.id", ondelete="CASCADE"), nullable=False, index=True)
     translation: Mapped[str] = mapped_column(String(100), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
 
@@ -60,18 +69,28 @@ class Translation(Base):
 
 
 class UserAnswer(Base):
+    """Ответ в квизе. Таблица секционирована по месяцам answered_at (см. partitions.py)."""
     __tablename__ = "user_answers"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    # ключ секционирования должен входить в первичный ключ
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    answered_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=func.now())
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    word_id: Mapped[int | None] = mapped_column(ForeignKey("words.id", ondelete="SET NULL"))
-    translation_id: Mapped[int | None] = mapped_column(ForeignKey("translations.id", ondelete="SET NULL"))
+    word_id: Mapped[int | None] = mapped_column(ForeignKey("words.id", ondelete="SET NULL"), index=True)
+    translation_id: Mapped[int | None] = mapped_column(ForeignKey("translations.id", ondelete="SET NULL"), index=True)
     is_correct: Mapped[bool] = mapped_column(Boolean, nullable=False)
-    answered_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
 
     user: Mapped["User"] = relationship(back_populates="answers")
     word: Mapped[Optional["Word"]] = relationship(back_populates="answers")
     translation: Mapped[Optional["Translation"]] = relationship(back_populates="user_answers")
+
+    # недавняя история пользователя — в пределах новых партиций
+    __table_args__ = (
+        Index("ix_user_answers_user_answered", "user_id", "answered_at"),
+        {"postgresql_partition_by": "RANGE (answered_at)"},
+    )
+
+
 # Optional 2x
 class Category(Base):
     __tablename__ = "categories"
@@ -87,5 +106,54 @@ word_categories = Table(
     "word_categories",
     Base.metadata,
     Column("word_id", Integer, ForeignKey("words.id", ondelete="CASCADE"), primary_key=True),
-    Column("category_id", Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
-)
\ No newline at end of file
+    Column("category_id", Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True, index=True)
+)
+
+
+class ReviewState(Base):
+    """Состояние карточки интервального повторения (Лейтнер) для пары пользователь–слово."""
+    __tablename__ = "review_states"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    word_id: Mapped[int] = mapped_column(ForeignKey("words.id", ondelete="CASCADE"), primary_key=True, index=True)
+    box: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=func.now())
+    reviews: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lapses: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_reviewed_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    # следующая карточка к повторению — первая по due_at в индексе пользователя
+    __table_args__ = (Index("ix_review_states_user_due", "user_id", "due_at"),)
+
+
+class UserStats(Base):
+    """Счётчики ответов пользователя; обновляются при записи ответов (stats.py)."""
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    answers: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    correct: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_answer_on: Mapped[date | None] = mapped_column(Date)  # день последнего ответа (UTC)
+    streak_days: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # дней подряд до last_answer_on
+    best_streak: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class UserCategoryStats(Base):
+    """Счётчики ответов пользователя по категориям слов."""
+    __tablename__ = "user_category_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    answers: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    correct: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class AnswerDaily(Base):
+    """Дневные итоги ответов: в них сворачиваются партиции user_answers старше срока хранения."""
+    __tablename__ = "answer_daily"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    word_id: Mapped[int] = mapped_column(Integer, primary_key=True)  # 0 — слово удалено
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    answers: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    correct: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,265 @@
+"""
+Очередь исходящих сообщений с ограничением частоты отправки.
+
+bot.send_message ставит сообщение в очередь чата, а потоки отправки забирают
+его с учётом лимитов Telegram: общего (около 30 сообщений в секунду на бота)
+и на один чат (около 1 в секунду с небольшим запасом на всплеск). Оба лимита —
+token bucket.
+
+Несколько сообщений одному чату, накопившиеся в очереди, склеиваются в одно,
+если это ничего не меняет для пользователя: у ранних нет клавиатуры,
+разметка совместима, а общий текст не длиннее лимита Telegram. Так
+«✅ Правильно!» и следующий вопрос уходят одним вызовом API. Чтобы такие пары
+успели встретиться в очереди, сообщение ждёт OUTBOX_LINGER_MS перед отправкой.
+
+На ответ 429 очередь чата ставится на паузу на retry_after секунд,
+а сообщение отправляется повторно.
+
+Настройки: OUTBOX (0 — отправлять напрямую), OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE,
+OUTBOX_CHAT_BURST, OUTBOX_LINGER_MS, OUTBOX_WORKERS.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+
+MAX_MESSAGE_LENGTH = 4096
+
+# символы, которые меняют смысл текста при включённой разметке
+_MARKUP_CHARS = {
+    "markdown": set("*_`["),
+    "markdownv2": set("_*[]()~`>#+-=|{}.!\\"),
+    "html": set("<>&"),
+}
+
+_Message = namedtuple("_Message", "text kwargs queued")
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate, self.burst = rate, burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд появится токен (0 — уже есть)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Chat:
+    __slots__ = ("messages", "bucket", "busy", "blocked_until")
+
+    def __init__(self, bucket):
+        self.messages = deque()
+        self.bucket = bucket
+        self.busy = False  # сообщение чата сейчас отправляется: порядок сохраняется
+        self.blocked_until = 0.0
+
+
+def _plain(text, parse_mode):
+    """Текст не содержит символов разметки parse_mode."""
+    special = _MARKUP_CHARS.get((parse_mode or "").lower())
+    return special is not None and not special.intersection(text)
+
+
+def _mergeable(first, second):
+    """Можно ли отправить second в одном сообщении с first (first идёт раньше)."""
+    a, b = dict(first.kwargs), dict(second.kwargs)
+    if a.pop("reply_markup", None) is not None:
+        return False  # клавиатура раннего сообщения потерялась бы
+    b.pop("reply_markup", None)
+    mode_a, mode_b = a.pop("parse_mode", None), b.pop("parse_mode", None)
+    if a or b:
+        return False  # reply_to, disable_notification и т.п. — отправляем как есть
+    if len(first.text) + 2 + len(second.text) > MAX_MESSAGE_LENGTH:
+        return False
+    if mode_a == mode_b:
+        return True
+    if mode_a is None:
+        return _plain(first.text, mode_b)
+    if mode_b is None:
+        return _plain(second.text, mode_a)
+    return False
+
+
+def _merge(first, second):
+    kwargs = dict(second.kwargs)
+    if kwargs.get("parse_mode") is None and first.kwargs.get("parse_mode") is not None:
+        kwargs["parse_mode"] = first.kwargs["parse_mode"]
+    return _Message(first.text + "\n\n" + second.text, kwargs, first.queued)
+
+
+class Outbox:
+    def __init__(self, send, global_rate=30, chat_rate=1, chat_burst=3, linger=0.05, workers=4):
+        """:param send: функция отправки (chat_id, text, **kwargs), обычно исходный bot.send_message"""
+        self._send = send
+        self.chat_rate, self.chat_burst = chat_rate, chat_burst
+        self.linger = linger
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = OrderedDict()  # chat_id -> _Chat
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._flushing = 0
+        self._stopped = False
+        self.sent = self.merged = self.retried = self.failed = 0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"outbox-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Ставит сообщение в очередь (вместо bot.send_message; ничего не возвращает)."""
+        with self._cond:
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst))
+            chat.messages.append(_Message(text, kwargs, time.monotonic()))
+            self._pending += 1
+            self._cond.notify()
+
+    def depth(self):
+        """Сообщений, ожидающих отправки."""
+        return self._pending
+
+    def _next(self):
+        """
+        Выбирает чат, сообщение которого можно отправить сейчас (вызывать под блокировкой).
+        :return: (chat_id, chat, сообщение, сколько сообщений склеено) или (None, через сколько секунд проверить снова)
+        """
+        now = time.monotonic()
+        linger = 0.0 if self._flushing else self.linger
+        wait = None
+        idle = []
+        for chat_id, chat in self._chats.items():
+            if chat.busy:
+                continue
+            if not chat.messages:
+                if chat.bucket.full(now):
+                    idle.append(chat_id)
+                continue
+            ready = max(chat.messages[0].queued + linger, chat.blocked_until)
+            delay = max(ready - now, chat.bucket.delay(now))
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            delay = self._global.delay(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                break
+            self._global.take()
+            chat.bucket.take()
+            chat.busy = True
+            message, count = chat.messages.popleft(), 1
+            while chat.messages and _mergeable(message, chat.messages[0]):
+                message, count = _merge(message, chat.messages.popleft()), count + 1
+            for chat_id_ in idle:
+                del self._chats[chat_id_]
+            self._chats.move_to_end(chat_id)  # остальные чаты проверяются первыми
+            return chat_id, chat, message, count
+        for chat_id_ in idle:
+            del self._chats[chat_id_]
+        return None, wait
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped and not self._pending:
+                        return
+                    picked = self._next()
+                    if picked[0] is not None:
+                        break
+                    self._cond.wait(picked[1])
+            chat_id, chat, message, count = picked
+            retry_after = self._deliver(chat_id, message)
+            with self._cond:
+                chat.busy = False
+                if retry_after:
+                    chat.messages.appendleft(message)
+                    chat.blocked_until = time.monotonic() + retry_after
+                    self._pending -= count - 1
+                else:
+                    self._pending -= count
+                    self.merged += count - 1
+                self._cond.notify_all()
+
+    def _deliver(self, chat_id, message):
+        """Отправляет сообщение. :return: пауза в секундах, если Telegram ответил 429"""
+        try:
+            self._send(chat_id, message.text, **message.kwargs)
+            self.sent += 1
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                self.retried += 1
+                retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                print(f"[WARN] Telegram ограничил отправку в чат {chat_id}, пауза {retry_after} с")
+                return retry_after
+            self.failed += 1
+            print(f"[ERROR] Не удалось отправить сообщение в чат {chat_id}: {e}")
+        except Exception as e:
+            self.failed += 1
+            print(f"[ERROR] Не удалось отправить сообщение в чат {chat_id}: {e}")
+        return 0
+
+    def flush(self, timeout=30):
+        """Отправляет всё, что накопилось, не дожидаясь OUTBOX_LINGER_MS."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._pending and time.monotonic() < deadline:
+                    self._cond.wait(min(0.1, deadline - time.monotonic()))
+            finally:
+                self._flushing -= 1
+        return self._pending == 0
+
+    def stop(self, timeout=30):
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+def install_outbox(bot):
+    """
+    Подменяет bot.send_message очередью Outbox (bot.reply_to тоже идёт через неё).
+    :return: Outbox или None, если очередь выключена (OUTBOX=0)
+    """
+    if os.getenv("OUTBOX", "1") == "0":
+        return None
+    outbox = Outbox(
+        bot.send_message,
+        global_rate=float(os.getenv("OUTBOX_GLOBAL_RATE", "30")),
+        chat_rate=float(os.getenv("OUTBOX_CHAT_RATE", "1")),
+        chat_burst=float(os.getenv("OUTBOX_CHAT_BURST", "3")),
+        linger=float(os.getenv("OUTBOX_LINGER_MS", "50")) / 1000,
+        workers=int(os.getenv("OUTBOX_WORKERS", "4")),
+    )
+    bot.send_message = outbox.send_message
+    atexit.register(outbox.stop)
+
+    metrics.gauge("outbox_queue_depth", "Сообщений в очереди на отправку", outbox.depth)
+    metrics.counter("outbox_sent_total", "Отправлено сообщений (вызовов API)", lambda: outbox.sent)
+    metrics.counter("outbox_merged_total", "Сообщений, склеенных с соседними", lambda: outbox.merged)
+    metrics.counter("outbox_retry_total", "Ответов 429 от Telegram", lambda: outbox.retried)
+    metrics.counter("outbox_failed_total", "Сообщений, которые не удалось отправить", lambda: outbox.failed)
+    return outbox
@@ -0,0 +1,233 @@
+"""
+Помесячные партиции user_answers и сжатие старой истории.
+
+user_answers секционирована по answered_at (RANGE, партиция на месяц:
+user_answers_p202610 и т.п.). Партиции создаются заранее на ANSWERS_PARTITIONS_AHEAD
+месяцев вперёд (миграция и команда ensure), а запись ответов дополнительно
+проверяет, что партиция месяца существует (один раз на месяц в процессе).
+
+Сжатие: партиции старше ANSWERS_KEEP_MONTHS месяцев сворачиваются в дневные
+итоги answer_daily (пользователь, слово, день), после чего отсоединяются
+и удаляются — в одной транзакции на партицию.
+
+Запуск (например, ежедневно из cron):
+
+    python partitions.py ensure
+    python partitions.py compact [--keep-months 6] [--detach-only]
+"""
+import argparse
+import os
+import re
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+
+PARENT = "user_answers"
+AHEAD_MONTHS = int(os.getenv("ANSWERS_PARTITIONS_AHEAD", "2"))
+KEEP_MONTHS = int(os.getenv("ANSWERS_KEEP_MONTHS", "6"))
+
+_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+# Месяцы, партиции которых точно существуют (проверено этим процессом)
+_known = set()
+_known_lock = threading.Lock()
+
+
+def month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def partitions(bind):
+    """:return: {месяц: имя партиции} для партиций с именами по соглашению"""
+    names = bind.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        f" WHERE i.inhparent = '{PARENT}'::regclass"
+    )).scalars()
+    result = {}
+    for name in names:
+        m = _NAME.match(name)
+        if m:
+            result[date(int(m.group(1)), int(m.group(2)), 1)] = name
+    return result
+
+
+def create_partition(bind, month):
+    bind.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT}"
+        f" FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+    ))
+
+
+def ensure_partitions(engine, months):
+    """Создаёт недостающие партиции для месяцев months (в отдельной транзакции)."""
+    with _known_lock:
+        missing = sorted(set(months) - _known)
+        if not missing:
+            return
+        with engine.begin() as conn:
+            existing = partitions(conn)
+            for month in missing:
+                if month not in existing:
+                    create_partition(conn, month)
+        _known.update(missing)
+
+
+def ensure_ahead(engine, ahead=AHEAD_MONTHS):
+    """Партиции текущего месяца и ahead месяцев вперёд."""
+    current = month_of(datetime.utcnow())
+    ensure_partitions(engine, [add_months(current, i) for i in range(ahead + 1)])
+
+
+def ensure_for_rows(session, rows):
+    """Для AnswerRecorder: партиции месяцев ответов пачки, до их записи."""
+    months = {month_of(row["answered_at"]) for row in rows}
+    if months - _known:
+        ensure_partitions(session.get_bind(), months)
+
+
+_ROLLUP_SQL = """
+    INSERT INTO answer_daily (user_id, word_id, day, answers, correct)
+    SELECT user_id, coalesce(word_id, 0), answered_at::date, count(*), count(*) FILTER (WHERE is_correct)
+    FROM {partition}
+    GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, word_id, day) DO UPDATE SET
+        answers = answer_daily.answers + excluded.answers,
+        correct = answer_daily.correct + excluded.correct
+"""
+
+
+def compact(engine, keep_months=KEEP_MONTHS, detach_only=False):
+    """
+    Сворачивает партиции старше keep_months месяцев в answer_daily и удаляет их
+    (detach_only — только отсоединяет, таблица остаётся для архивации).
+    :return: список обработанных партиций
+    """
+    cutoff = add_months(month_of(datetime.utcnow()), -keep_months)
+    with engine.connect() as conn:
+        expired = sorted((m, n) for m, n in partitions(conn).items() if add_months(m, 1) <= cutoff)
+
+    done = []
+    for month, name in expired:
+        with engine.begin() as conn:
+            conn.execute(text(_ROLLUP_SQL.format(partition=name)))
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            if not detach_only:
+                conn.execute(text(f"DROP TABLE {name}"))
+        with _known_lock:
+            _known.discard(month)
+        print(f"[INFO] Партиция {name} свёрнута в answer_daily и {'отсоединена' if detach_only else 'удалена'}")
+        done.append(name)
+    return done
+
+
+_OLD_NAMES = [
+    "ALTER TABLE user_answers RENAME TO user_answers_old",
+    "ALTER INDEX IF EXISTS user_answers_pkey RENAME TO user_answers_old_pkey",
+    "ALTER INDEX IF EXISTS ix_user_answers_user_id RENAME TO ix_user_answers_old_user_id",
+    "ALTER INDEX IF EXISTS ix_user_answers_word_id RENAME TO ix_user_answers_old_word_id",
+    "ALTER INDEX IF EXISTS ix_user_answers_translation_id RENAME TO ix_user_answers_old_translation_id",
+    "ALTER SEQUENCE IF EXISTS user_answers_id_seq RENAME TO user_answers_old_id_seq",
+]
+
+
+# DDL миграции 5 (models.UserAnswer и models.AnswerDaily на момент секционирования);
+# записан явно, чтобы миграция не менялась вместе с моделями
+_PARTITIONED_DDL = [
+    f"""CREATE TABLE {PARENT} (
+        id BIGSERIAL NOT NULL,
+        answered_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        user_id INTEGER NOT NULL,
+        word_id INTEGER,
+        translation_id INTEGER,
+        is_correct BOOLEAN NOT NULL,
+        PRIMARY KEY (id, answered_at),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (word_id) REFERENCES words (id) ON DELETE SET NULL,
+        FOREIGN KEY (translation_id) REFERENCES translations (id) ON DELETE SET NULL
+    ) PARTITION BY RANGE (answered_at)""",
+    f"CREATE INDEX ix_user_answers_translation_id ON {PARENT} (translation_id)",
+    f"CREATE INDEX ix_user_answers_user_answered ON {PARENT} (user_id, answered_at)",
+    f"CREATE INDEX ix_user_answers_word_id ON {PARENT} (word_id)",
+]
+_ANSWER_DAILY_DDL = """CREATE TABLE IF NOT EXISTS answer_daily (
+    user_id INTEGER NOT NULL,
+    word_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    answers INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (user_id, word_id, day),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+)"""
+
+
+def convert(bind):
+    """
+    Миграция: обычная таблица user_answers → секционированная по месяцам.
+    Данные переносятся в партиции; если таблица уже секционирована,
+    создаются только недостающие партиции и answer_daily.
+    """
+    kind = bind.execute(text(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{PARENT}')")).scalar()
+    old = kind is not None and kind != "p"
+    if old:
+        for sql in _OLD_NAMES:
+            bind.execute(text(sql))
+    if kind != "p":
+        for sql in _PARTITIONED_DDL:
+            bind.execute(text(sql))
+    bind.execute(text(_ANSWER_DAILY_DDL))
+
+    current = month_of(datetime.utcnow())
+    first = current
+    if old:
+        oldest = bind.execute(text("SELECT min(answered_at) FROM user_answers_old")).scalar()
+        if oldest is not None:
+            first = min(first, month_of(oldest))
+    month = first
+    while month <= add_months(current, AHEAD_MONTHS):
+        create_partition(bind, month)
+        month = add_months(month, 1)
+
+    if old:
+        bind.execute(text(
+            "INSERT INTO user_answers (id, user_id, word_id, translation_id, is_correct, answered_at)"
+            " SELECT id, user_id, word_id, translation_id, is_correct, coalesce(answered_at, now())"
+            " FROM user_answers_old"
+        ))
+        bind.execute(text(
+            "SELECT setval(pg_get_serial_sequence('user_answers', 'id'), max(id)) FROM user_answers"
+        ))
+        bind.execute(text("DROP TABLE user_answers_old"))
+    bind.execute(text("ANALYZE user_answers"))
+
+
+if __name__ == "__main__":
+    from config import get_engine
+
+    parser = argparse.ArgumentParser(description="Партиции user_answers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure = sub.add_parser("ensure", help="создать партиции на месяцы вперёд")
+    ensure.add_argument("--ahead", type=int, default=AHEAD_MONTHS)
+    compact_cmd = sub.add_parser("compact", help="свернуть и удалить старые партиции")
+    compact_cmd.add_argument("--keep-months", type=int, default=KEEP_MONTHS)
+    compact_cmd.add_argument("--detach-only", action="store_true", help="не удалять отсоединённые партиции")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "ensure":
+        ensure_ahead(engine, args.ahead)
+        print(f"[INFO] Партиции созданы на {args.ahead} мес. вперёд")
+    else:
+        ensure_ahead(engine)
+        done = compact(engine, args.keep_months, args.detach_only)
+        print(f"[INFO] Обработано партиций: {len(done)}")
@@ -0,0 +1,192 @@
+"""
+Заранее собранные вопросы квиза для активных чатов.
+
+Для каждого чата в квизе держится небольшая очередь следующих вопросов
+(слово, варианты, правильный ответ). Следующий вопрос берётся из очереди,
+а фоновые потоки дособирают её до PREFETCH_DEPTH, пока пользователь думает
+над текущим. Если очередь пуста (первый вопрос, смена категории), вопрос
+собирается сразу, как раньше.
+
+Очередь привязана к пользователю и категории: другая категория — новая
+очередь. При изменении словаря пользователя (добавил или удалил слово)
+его очереди сбрасываются (invalidate_user), а вопросы, собранные до этого
+фоновыми потоками, отбрасываются.
+
+Настройки: PREFETCH_DEPTH (0 — без очереди), PREFETCH_WORKERS, PREFETCH_MAX_CHATS.
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+
+
+class _ChatQueue:
+    __slots__ = ("user_id", "category_id", "questions", "generation", "refilling")
+
+    def __init__(self, user_id, category_id):
+        self.user_id = user_id
+        self.category_id = category_id
+        self.questions = deque()
+        self.generation = 0  # растёт при сбросе: вопросы прошлых поколений не попадают в очередь
+        self.refilling = False
+
+
+class QuestionPrefetcher:
+    def __init__(self, load, depth=3, workers=2, max_chats=10000):
+        """
+        :param load: функция (user_id, category_id) -> вопрос или None
+        :param depth: сколько вопросов держать наготове для чата
+        :param max_chats: сколько чатов помнить (давно неактивные вытесняются)
+        """
+        self.load = load
+        self.depth = depth
+        self.workers = workers
+        self.max_chats = max_chats
+
+        self._chats = OrderedDict()  # chat_id -> _ChatQueue, в порядке последнего обращения
+        self._by_user = {}           # user_id -> {chat_id}
+        self._lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._threads = []
+
+        # счётчики
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.discarded = 0
+        self.failures = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    def get(self, chat_id, user_id, category_id=None):
+        """Следующий вопрос для чата: из очереди или, если она пуста, собранный сразу."""
+        if self.depth <= 0:
+            return self.load(user_id, category_id)
+
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.user_id != user_id or chat.category_id != category_id:
+                chat = self._replace(chat_id, _ChatQueue(user_id, category_id))
+            else:
+                self._chats.move_to_end(chat_id)
+            question = chat.questions.popleft() if chat.questions else None
+            if question is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._schedule(chat_id, chat)
+
+        if question is None:
+            question = self.load(user_id, category_id)
+        return question
+
+    def invalidate_user(self, user_id):
+        """Словарь пользователя изменился: собранные для него вопросы устарели."""
+        with self._lock:
+            for chat_id in self._by_user.get(user_id, ()):
+                chat = self._chats[chat_id]
+                self.discarded += len(chat.questions)
+                chat.questions.clear()
+                chat.generation += 1
+
+    def discard(self, chat_id):
+        """Чат вышел из квиза."""
+        with self._lock:
+            self._replace(chat_id, None)
+
+    def _replace(self, chat_id, chat):
+        old = self._chats.pop(chat_id, None)
+        if old is not None:
+            self.discarded += len(old.questions)
+            old.generation += 1
+            self._unlink(old.user_id, chat_id)
+        if chat is None:
+            return None
+        self._chats[chat_id] = chat
+        self._by_user.setdefault(chat.user_id, set()).add(chat_id)
+        while len(self._chats) > self.max_chats:
+            evicted_id, evicted = self._chats.popitem(last=False)
+            evicted.generation += 1
+            self._unlink(evicted.user_id, evicted_id)
+        return chat
+
+    def _unlink(self, user_id, chat_id):
+        chats = self._by_user.get(user_id)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self._by_user[user_id]
+
+    def _schedule(self, chat_id, chat):
+        if chat.refilling or len(chat.questions) >= self.depth:
+            return
+        chat.refilling = True
+        self._ensure_started()
+        self._tasks.put((chat_id, chat, chat.generation))
+
+    def _current(self, chat_id, chat, generation):
+        return self._chats.get(chat_id) is chat and chat.generation == generation
+
+    def _refill(self, chat_id, chat, generation):
+        try:
+            while True:
+                with self._lock:
+                    if not self._current(chat_id, chat, generation) or len(chat.questions) >= self.depth:
+                        return
+                question = self.load(chat.user_id, chat.category_id)
+                if question is None:
+                    return  # слов нет — следующий вопрос соберётся сразу и вернёт None
+                with self._lock:
+                    if not self._current(chat_id, chat, generation):
+                        self.discarded += 1
+                        return
+                    # не ставим одно слово дважды подряд
+                    if not chat.questions or chat.questions[-1].word_id != question.word_id:
+                        chat.questions.append(question)
+                        self.prefetched += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"[WARN] Не удалось заранее собрать вопрос для чата {chat_id}: {e}")
+        finally:
+            with self._lock:
+                chat.refilling = False
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            self._refill(*self._tasks.get())
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        """:return: словарь со счётчиками очередей"""
+        return {
+            "chats": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio(), 3),
+            "prefetched": self.prefetched,
+            "discarded": self.discarded,
+            "failures": self.failures,
+        }
+
+
+def make_prefetcher(load):
+    """Очередь вопросов с настройками из окружения."""
+    return QuestionPrefetcher(
+        load,
+        depth=int(os.getenv("PREFETCH_DEPTH", "3")),
+        workers=int(os.getenv("PREFETCH_WORKERS", "2")),
+        max_chats=int(os.getenv("PREFETCH_MAX_CHATS", "10000")),
+    )
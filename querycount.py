@@ -0,0 +1,146 @@
+"""
+Проверка числа SQL-запросов, которые выполняет каждая публичная функция database.py.
+
+Запуск против локальной БД (настройки из .env):
+
+    python querycount.py
+
+Код возврата отличен от нуля, если какая-то функция превысила свой бюджет —
+так новый N+1 запрос валит сборку. Та же проверка входит в pytest
+(tests/test_querycount.py; без настроенной БД тест пропускается). У каждой
+публичной функции database.py должен быть бюджет (missing_budgets).
+"""
+import inspect
+import sys
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+from config import get_engine, get_replica_engine, SessionLocal, VOCAB_INDEX
+from models import User
+
+# Сколько запросов к БД разрешено каждой функции (индекс словаря уже прогрет)
+QUERY_BUDGET = {
+    "new_user": 1,
+    "get_categories": 1,
+    "get_question": 0 if VOCAB_INDEX else 1,
+    "_select_question": 1,
+    "get_words_by_category": 0,
+    "get_word_and_vars": 0,
+    "get_wrong_translations": 0,
+    "add_word": 1,
+    "delete_word": 1,
+    "next_question": 0 if VOCAB_INDEX else 1,
+    "end_quiz": 0,
+    "check_answer": 0,
+    "get_review_question": 2,  # карточка к повторению и, если её нет, новые слова
+    "record_review": 1,
+    "record_answer": 0,  # запись — пачками в фоне
+    "get_stats": 3,
+    "export_words": 1,
+}
+
+
+def missing_budgets():
+    """:return: публичные функции database.py без бюджета в QUERY_BUDGET"""
+    import database
+
+    public = {
+        name for name, func in inspect.getmembers(database, inspect.isfunction)
+        if not name.startswith("_") and func.__module__ == database.__name__
+    }
+    return sorted(public - set(QUERY_BUDGET))
+
+
+@contextmanager
+def count_statements(bind=None):
+    """
+    Считает SQL-запросы, выполненные через bind (по умолчанию — основной движок и реплика) внутри блока with.
+    :return: список текстов запросов (заполняется по ходу выполнения)
+    """
+    # по умолчанию считаются и запросы к реплике (replica.read_session)
+    binds = [bind] if bind is not None else list({get_engine(), get_replica_engine()})
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for b in binds:
+        event.listen(b, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        for b in binds:
+            event.remove(b, "before_cursor_execute", on_execute)
+
+
+def check():
+    """
+    Вызывает каждую функцию из QUERY_BUDGET на тестовом пользователе и сравнивает
+    число запросов с бюджетом. Возвращает количество нарушений.
+    """
+    import database
+
+    tg_user = SimpleNamespace(id=-1, username="querycount", first_name="Query", last_name="Count")
+    user_id = database.new_user(tg_user)
+
+    # прогреваем индекс словаря: его загрузка не относится к вызову функции
+    entry = database.vocab.random_word(user_id)
+    word_id = entry.word_id if entry else 0
+    category_id = next(iter(database.get_categories()), (0, None))[0]
+
+    calls = {
+        "new_user": lambda: database.new_user(tg_user),
+        "get_categories": database.get_categories,
+        "get_question": lambda: database.get_question(user_id),
+        "_select_question": lambda: database._select_question(user_id, category_id),
+        "get_words_by_category": lambda: database.get_words_by_category(category_id, user_id),
+        "get_word_and_vars": lambda: database.get_word_and_vars(user_id),
+        "get_wrong_translations": lambda: database.get_wrong_translations(word_id, user_id),
+        "add_word": lambda: database.add_word(user_id, "querycount", "проверка", "querycount example"),
+        "delete_word": lambda: database.delete_word(user_id, "querycount"),
+        "next_question": lambda: database.next_question(tg_user.id, user_id),
+        "end_quiz": lambda: database.end_quiz(tg_user.id),
+        "check_answer": lambda: database.check_answer(user_id, word_id, "проверка"),
+        "get_review_question": lambda: database.get_review_question(user_id),
+        "record_review": lambda: database.record_review(user_id, word_id, True),
+        "record_answer": lambda: database.record_answer(user_id, word_id, None, True),
+        "get_stats": lambda: database.get_stats(user_id),
+        "export_words": lambda: _close_export(database.export_words(user_id)),
+    }
+
+    # фоновое дозаполнение очереди вопросов считалось бы в счёт других функций
+    database.questions.depth = 0
+
+    failures = 0
+    for name in missing_budgets():
+        failures += 1
+        print(f"[FAIL] {name}: нет бюджета в QUERY_BUDGET")
+    try:
+        for name, budget in QUERY_BUDGET.items():
+            with count_statements() as statements:
+                calls[name]()
+            status = "ok" if len(statements) <= budget else "FAIL"
+            if status == "FAIL":
+                failures += 1
+            print(f"[{status}] {name}: {len(statements)} запрос(ов), бюджет {budget}")
+            if status == "FAIL":
+                for s in statements:
+                    print("    " + " ".join(s.split())[:200])
+    finally:
+        database.answer_recorder.flush()  # ответ тестового пользователя — до его удаления
+        with SessionLocal() as session:
+            session.query(User).filter_by(telegram_id=tg_user.id).delete()
+            session.commit()
+
+    return failures
+
+
+def _close_export(exported):
+    if exported is not None:
+        exported[0].close()
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check() else 0)
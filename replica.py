@@ -0,0 +1,85 @@
+"""
+Маршрутизация чтения на реплику.
+
+Запросы только на чтение (список категорий, загрузка слов в индекс словаря,
+вопрос квиза без индекса, выгрузка) идут на реплику (REPLICA_DB_HOST), запись
+и всё остальное — на основную БД. Реплика отстаёт на время репликации,
+поэтому пользователь, который только что добавил или удалил слово, ещё
+READ_YOUR_WRITES_SECONDS секунд читает свои слова с основной БД.
+
+Без REPLICA_DB_HOST все сессии — основной БД.
+"""
+import threading
+import time
+
+from config import SessionLocal, ReadSessionLocal, READ_YOUR_WRITES_SECONDS, REPLICA_DATABASE_URL
+import metrics
+
+enabled = REPLICA_DATABASE_URL is not None
+
+_writes = {}  # user_id -> до какого момента (monotonic) читать с основной БД
+_lock = threading.Lock()  # _writes и счётчики
+
+# счётчики
+replica_reads = 0
+primary_reads = 0
+
+
+def wrote(user_id, window=READ_YOUR_WRITES_SECONDS):
+    """Пользователь изменил свои данные: следующие window секунд его чтения — с основной БД."""
+    if not enabled or user_id is None:
+        return
+    now = time.monotonic()
+    with _lock:
+        _writes[user_id] = now + window
+        # устаревшие отметки убираем заодно, чтобы словарь не рос
+        if len(_writes) > 1000:
+            for key in [k for k, until in _writes.items() if until <= now]:
+                del _writes[key]
+
+
+def sticky(user_id):
+    """Читать ли данные пользователя с основной БД."""
+    until = _writes.get(user_id)
+    return until is not None and until > time.monotonic()
+
+
+def read_session(user_id=None):
+    """
+    Сессия для запросов только на чтение.
+    :param user_id: чьи данные читаются (None — только общие)
+    """
+    global replica_reads, primary_reads
+    if not enabled:
+        return SessionLocal()
+    # читают из нескольких потоков (диспетчер, очередь вопросов): счётчики — под блокировкой
+    if user_id is not None and sticky(user_id):
+        with _lock:
+            primary_reads += 1
+        return SessionLocal()
+    with _lock:
+        replica_reads += 1
+    return ReadSessionLocal()
+
+
+metrics.counter("replica_reads_total", "Чтений, отправленных на реплику", lambda: replica_reads)
+metrics.counter("replica_sticky_reads_total", "Чтений с основной БД после изменений пользователя", lambda: primary_reads)
+
+
+if __name__ == "__main__":
+    # проверка маршрутизации: какой сервер отвечает на чтение и на запись
+    from sqlalchemy import text
+
+    def server(session):
+        port, standby = session.execute(text("SELECT inet_server_port(), pg_is_in_recovery()")).one()
+        return f"порт {port}, {'реплика' if standby else 'основная'}"
+
+    if not enabled:
+        print("[WARN] REPLICA_DB_HOST не задан: все запросы идут на основную БД")
+    with SessionLocal() as session:
+        print(f"[INFO] Запись: {server(session)}")
+    with read_session() as session:
+        print(f"[INFO] Чтение: {server(session)}")
+    wrote(0)
+    with read_session(0) as session:
+        print(f"[INFO] Чтение сразу после изменений пользователя: {server(session)}")
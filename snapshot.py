@@ -0,0 +1,252 @@
+"""
+Снимок общего словаря (слова с user_id IS NULL) в бинарном файле для mmap.
+
+Несколько процессов бота отображают один и тот же файл в память (mmap):
+страницы общие для всех процессов, а загрузка при старте — открытие файла
+вместо запросов к БД. Индекс словаря (vocab_index.py) читает общие слова
+прямо из снимка; слова пользователей по-прежнему загружаются из БД.
+
+Формат (порядок байт — как у машины, на которой собран снимок):
+заголовок (_HEADER), затем секции, выровненные по 8 байт:
+
+    word_ids   int32[слов]           id слов по возрастанию (поиск — бинарный)
+    word_str   uint32[слов + 1]      смещения оригиналов в word_text
+    word_tr    uint32[слов + 1]      диапазоны переводов слова в tr_*
+    word_cat   uint32[слов + 1]      диапазоны категорий слова в word_cats
+    word_cats  int32[связей]         id категорий слов
+    tr_ids     int32[переводов]
+    tr_str     uint32[переводов + 1] смещения переводов в tr_text
+    tr_word    uint32[переводов]     номер слова перевода
+    ids        uint32[...]           номера слов, у которых есть переводы
+    cat_ids    int32[категорий]      id категорий по возрастанию
+    cat_off    uint32[категорий + 1] диапазоны категорий в cat_words
+    cat_words  uint32[...]           номера слов (с переводами) по категориям
+    word_text  UTF-8
+    tr_text    UTF-8
+
+Версия снимка — время сборки в миллисекундах. Файл заменяется атомарно
+(os.replace), поэтому процессы, которые ещё читают старый снимок, продолжают
+работать с ним, а новую версию подхватывают без перезапуска
+(проверка не чаще раза в VOCAB_SNAPSHOT_CHECK секунд, см. vocab_index.py).
+
+Сборка (например, после импорта словаря или из cron):
+
+    python snapshot.py build [--output vocab.snap]
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+from sqlalchemy import select
+
+from models import Word, Translation, word_categories
+
+MAGIC = b"VOCSNAP1"
+_BYTE_ORDER = 0x01020304
+
+_COUNTS = ["words", "translations", "ids", "categories", "word_cats", "cat_words", "word_text", "tr_text"]
+# magic, порядок байт, версия и счётчики _COUNTS
+_HEADER = struct.Struct("=8sI4xQ" + "Q" * len(_COUNTS))
+_SECTIONS = [
+    # (имя, тип, длина по счётчикам заголовка)
+    ("word_ids", "i", lambda c: c["words"]),
+    ("word_str", "I", lambda c: c["words"] + 1),
+    ("word_tr", "I", lambda c: c["words"] + 1),
+    ("word_cat", "I", lambda c: c["words"] + 1),
+    ("word_cats", "i", lambda c: c["word_cats"]),
+    ("tr_ids", "i", lambda c: c["translations"]),
+    ("tr_str", "I", lambda c: c["translations"] + 1),
+    ("tr_word", "I", lambda c: c["translations"]),
+    ("ids", "I", lambda c: c["ids"]),
+    ("cat_ids", "i", lambda c: c["categories"]),
+    ("cat_off", "I", lambda c: c["categories"] + 1),
+    ("cat_words", "I", lambda c: c["cat_words"]),
+    ("word_text", "B", lambda c: c["word_text"]),
+    ("tr_text", "B", lambda c: c["tr_text"]),
+]
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class Snapshot:
+    """Снимок, отображённый в память (только чтение)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _HEADER.size:
+            raise ValueError(f"{path}: файл слишком короткий для снимка словаря")
+        magic, order, self.version, *counts = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: не снимок словаря")
+        if order != _BYTE_ORDER:
+            raise ValueError(f"{path}: снимок собран на машине с другим порядком байт")
+        counts = dict(zip(_COUNTS, counts))
+
+        view = memoryview(self._mm)
+        offset = _HEADER.size
+        for name, code, length in _SECTIONS:
+            offset = _align(offset)
+            size = length(counts) * array(code).itemsize
+            if offset + size > len(self._mm):
+                raise ValueError(f"{path}: снимок обрезан")
+            section = view[offset:offset + size]
+            setattr(self, name, section if code == "B" else section.cast(code))
+            offset += size
+        self.path = path
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def find(self, word_id):
+        """:return: номер слова или None"""
+        i = bisect_left(self.word_ids, word_id)
+        if i < len(self.word_ids) and self.word_ids[i] == word_id:
+            return i
+        return None
+
+    def word(self, index):
+        """:return: (word_id, оригинал, [(translation_id, перевод)], (category_id, ...))"""
+        original = str(self.word_text[self.word_str[index]:self.word_str[index + 1]], "utf-8")
+        translations = [
+            (self.tr_ids[t], self._translation_text(t))
+            for t in range(self.word_tr[index], self.word_tr[index + 1])
+        ]
+        categories = tuple(self.word_cats[self.word_cat[index]:self.word_cat[index + 1]])
+        return self.word_ids[index], original, translations, categories
+
+    def _translation_text(self, t):
+        return str(self.tr_text[self.tr_str[t]:self.tr_str[t + 1]], "utf-8")
+
+    def translation(self, t):
+        """:return: (word_id, translation_id, перевод)"""
+        return self.word_ids[self.tr_word[t]], self.tr_ids[t], self._translation_text(t)
+
+    def category(self, category_id):
+        """:return: номера слов категории (memoryview, возможно пустой)"""
+        i = bisect_left(self.cat_ids, category_id)
+        if i < len(self.cat_ids) and self.cat_ids[i] == category_id:
+            return self.cat_words[self.cat_off[i]:self.cat_off[i + 1]]
+        return self.cat_words[0:0]
+
+
+# Сборка
+
+def build(session, path, batch_size=5000):
+    """
+    Собирает снимок общего словаря и атомарно заменяет им файл path.
+    Слова, переводы и категории читаются тремя потоковыми запросами в порядке word_id.
+    :return: (версия, число слов)
+    """
+    shared = Word.user_id.is_(None)
+    s = {name: array(code) for name, code, _ in _SECTIONS if code != "B"}
+    word_text, tr_text = bytearray(), bytearray()
+    for name in ("word_str", "word_tr", "word_cat", "tr_str"):
+        s[name].append(0)
+
+    translations = iter(session.execute(
+        select(Translation.word_id, Translation.id, Translation.translation)
+        .join(Word, Word.id == Translation.word_id).where(shared)
+        .order_by(Translation.word_id, Translation.id)
+        .execution_options(yield_per=batch_size)
+    ))
+    links = iter(session.execute(
+        select(word_categories.c.word_id, word_categories.c.category_id)
+        .join(Word, Word.id == word_categories.c.word_id).where(shared)
+        .order_by(word_categories.c.word_id, word_categories.c.category_id)
+        .execution_options(yield_per=batch_size)
+    ))
+    words = session.execute(
+        select(Word.id, Word.original_word).where(shared).order_by(Word.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    tr, link = next(translations, None), next(links, None)
+    by_category = {}
+    for index, (word_id, original) in enumerate(words):
+        s["word_ids"].append(word_id)
+        word_text.extend(original.encode("utf-8"))
+        s["word_str"].append(len(word_text))
+
+        # строки слов, удалённых между запросами, пропускаются
+        while tr is not None and tr[0] <= word_id:
+            if tr[0] == word_id:
+                s["tr_ids"].append(tr[1])
+                s["tr_word"].append(index)
+                tr_text.extend(tr[2].encode("utf-8"))
+                s["tr_str"].append(len(tr_text))
+            tr = next(translations, None)
+        categories = []
+        while link is not None and link[0] <= word_id:
+            if link[0] == word_id:
+                categories.append(link[1])
+            link = next(links, None)
+
+        has_translations = len(s["tr_ids"]) > s["word_tr"][-1]
+        s["word_tr"].append(len(s["tr_ids"]))
+        s["word_cats"].extend(categories)
+        s["word_cat"].append(len(s["word_cats"]))
+        # как в vocab_index._Pool: слова без переводов не выбираются для квиза
+        if has_translations:
+            s["ids"].append(index)
+            for category_id in categories:
+                by_category.setdefault(category_id, []).append(index)
+
+    s["cat_off"].append(0)
+    for category_id in sorted(by_category):
+        s["cat_ids"].append(category_id)
+        s["cat_words"].extend(by_category[category_id])
+        s["cat_off"].append(len(s["cat_words"]))
+
+    version = int(time.time() * 1000)
+    counts = {
+        "words": len(s["word_ids"]), "translations": len(s["tr_ids"]), "ids": len(s["ids"]),
+        "categories": len(s["cat_ids"]), "word_cats": len(s["word_cats"]),
+        "cat_words": len(s["cat_words"]), "word_text": len(word_text), "tr_text": len(tr_text),
+    }
+    s["word_text"], s["tr_text"] = word_text, tr_text
+    _write(path, version, counts, s)
+    return version, counts["words"]
+
+
+def _write(path, version, counts, sections):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, _BYTE_ORDER, version, *(counts[name] for name in _COUNTS)))
+        for name, _, _ in _SECTIONS:
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    # атомарная замена: открытые старые снимки остаются целыми
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    from config import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Снимок общего словаря для mmap")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="собрать снимок из БД")
+    build_cmd.add_argument("--output", default=os.getenv("VOCAB_SNAPSHOT") or "vocab.snap")
+    build_cmd.add_argument("--batch", type=int, default=5000)
+    info = sub.add_parser("info", help="показать версию и размер снимка")
+    info.add_argument("path", nargs="?", default=os.getenv("VOCAB_SNAPSHOT") or "vocab.snap")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            version, count = build(session, args.output, args.batch)
+        print(f"[INFO] Снимок {args.output}: версия {version}, слов: {count}, "
+              f"{round(time.perf_counter() - started, 3)} с")
+    else:
+        snap = Snapshot(args.path)
+        print(f"[INFO] Снимок {args.path}: версия {snap.version}, слов: {len(snap)}, "
+              f"переводов: {len(snap.tr_ids)}, категорий: {len(snap.cat_ids)}")
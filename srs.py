@@ -0,0 +1,120 @@
+"""
+Интервальное повторение по системе Лейтнера.
+
+Для каждой пары пользователь–слово хранится номер коробки (box) и время
+следующего повторения (due_at). Правильный ответ переносит карточку в следующую
+коробку с большим интервалом, ошибка возвращает её в коробку 0.
+
+Следующая карточка выбирается по индексу (user_id, due_at) — O(log n)
+независимо от размера словаря и истории ответов.
+"""
+from datetime import timedelta
+
+from sqlalchemy import select, func, exists, literal, literal_column, union_all
+from sqlalchemy.dialects.postgresql import insert, array
+
+from config import SessionLocal
+from models import ReviewState, Word, Translation
+
+# Интервал до следующего повторения для каждой коробки
+BOX_INTERVALS = [
+    timedelta(minutes=10),  # 0 — новая карточка или ошибка
+    timedelta(days=1),
+    timedelta(days=3),
+    timedelta(days=7),
+    timedelta(days=16),
+    timedelta(days=35),
+]
+MAX_BOX = len(BOX_INTERVALS) - 1
+
+_SECOND = literal_column("interval '1 second'")
+
+
+def _due_after(box):
+    """SQL-выражение: now() + интервал коробки box."""
+    seconds = array([int(i.total_seconds()) for i in BOX_INTERVALS])
+    return func.now() + seconds[box + 1] * _SECOND
+
+
+def next_due_words(user_id, limit=10):
+    """
+    Возвращает word_id карточек, которые пора повторить, от самой просроченной.
+    """
+    with SessionLocal() as session:
+        return session.execute(_due_statement(user_id, limit)).scalars().all()
+
+
+def _due_statement(user_id, limit):
+    return (
+        select(ReviewState.word_id)
+        .where(ReviewState.user_id == user_id)
+        .where(ReviewState.due_at <= func.now())
+        .order_by(ReviewState.due_at)
+        .limit(limit)
+    )
+
+
+def new_words(user_id, start=0, limit=10):
+    """
+    Возвращает word_id слов с переводами, которых ещё нет в повторении у пользователя:
+    по возрастанию id начиная со start, затем с начала словаря.
+    """
+    with SessionLocal() as session:
+        return session.execute(_new_words_statement(user_id, start, limit)).scalars().all()
+
+
+def _new_words_statement(user_id, start, limit):
+    # Два диапазона по первичному ключу words — id >= start и, по кругу, id < start:
+    # каждый читается по индексу в порядке id и останавливается на limit строк.
+    # NOT EXISTS проверяется по первичному ключу review_states (user_id, word_id).
+    scheduled = exists().where(ReviewState.user_id == user_id, ReviewState.word_id == Word.id)
+    translated = exists().where(Translation.word_id == Word.id)
+
+    def part(number, in_range):
+        return (
+            select(literal(number).label("part"), Word.id)
+            .where((Word.user_id == None) | (Word.user_id == user_id))
+            .where(in_range)
+            .where(translated)
+            .where(~scheduled)
+            .order_by(Word.id)
+            .limit(limit)
+            .subquery()
+        )
+
+    after, before = part(0, Word.id >= start), part(1, Word.id < start)
+    both = union_all(select(after.c.part, after.c.id), select(before.c.part, before.c.id)).subquery()
+    return select(both.c.id).order_by(both.c.part, both.c.id).limit(limit)
+
+
+def record_review(user_id, word_id, is_correct):
+    """
+    Обновляет карточку после ответа одним upsert.
+    :return: новый номер коробки
+    """
+    first_box = 1 if is_correct else 0
+    stmt = insert(ReviewState).values(
+        user_id=user_id,
+        word_id=word_id,
+        box=first_box,
+        due_at=_due_after(first_box),
+        reviews=1,
+        lapses=0 if is_correct else 1,
+        last_reviewed_at=func.now(),
+    )
+    new_box = func.least(ReviewState.box + 1, MAX_BOX) if is_correct else 0
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReviewState.user_id, ReviewState.word_id],
+        set_={
+            "box": new_box,
+            "due_at": _due_after(new_box),
+            "reviews": ReviewState.reviews + 1,
+            "lapses": ReviewState.lapses + (0 if is_correct else 1),
+            "last_reviewed_at": func.now(),
+        },
+    ).returning(ReviewState.box)
+
+    with SessionLocal() as session:
+        box = session.execute(stmt).scalar_one()
+        session.commit()
+        return box
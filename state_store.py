@@ -0,0 +1,131 @@
+"""
+Хранилища состояний диалога (что сейчас делает пользователь в чате).
+
+MemoryStateStore — в памяти процесса, с ограничением по числу записей (LRU) и TTL.
+SQLiteStateStore — в локальном файле SQLite: состояние переживает перезапуск
+и доступно нескольким процессам бота на одной машине.
+
+Оба хранилища ключуются по chat_id и хранят состояние как словарь.
+get() возвращает копию: изменения сохраняются только через set()/update().
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStateStore:
+    def __init__(self, max_entries=10000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # chat_id -> (expires_at, state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, chat_id):
+        with self._lock:
+            item = self._data.get(chat_id)
+            if item is None:
+                return {}
+            expires_at, state = item
+            if expires_at < time.monotonic():
+                del self._data[chat_id]
+                return {}
+            self._data.move_to_end(chat_id)
+            return dict(state)
+
+    def set(self, chat_id, state):
+        with self._lock:
+            self._data[chat_id] = (time.monotonic() + self.ttl, dict(state))
+            self._data.move_to_end(chat_id)
+            # вытесняем давно не использованные состояния
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def update(self, chat_id, **fields):
+        state = self.get(chat_id)
+        state.update(fields)
+        self.set(chat_id, state)
+        return state
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+
+class SQLiteStateStore:
+    # раз в столько записей удаляем просроченные состояния
+    PURGE_EVERY = 1000
+
+    def __init__(self, path="states.sqlite3", ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()  # соединение sqlite3 нельзя делить между потоками
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_states ("
+                " chat_id INTEGER PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            # WAL: читатели не блокируют писателя, несколько процессов работают с одним файлом
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        row = self._conn().execute(
+            "SELECT count(*) FROM chat_states WHERE expires_at >= ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+    def get(self, chat_id):
+        row = self._conn().execute(
+            "SELECT state FROM chat_states WHERE chat_id = ? AND expires_at >= ?",
+            (chat_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set(self, chat_id, state):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO chat_states (chat_id, state, expires_at) VALUES (?, ?, ?)",
+            (chat_id, json.dumps(state, ensure_ascii=False), time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM chat_states WHERE expires_at < ?", (time.time(),))
+
+    def update(self, chat_id, **fields):
+        state = self.get(chat_id)
+        state.update(fields)
+        self.set(chat_id, state)
+        return state
+
+    def delete(self, chat_id):
+        self._conn().execute("DELETE FROM chat_states WHERE chat_id = ?", (chat_id,))
+
+
+def make_state_store():
+    """
+    Создаёт хранилище по переменным окружения:
+    STATE_BACKEND (memory | sqlite), STATE_MAX_ENTRIES, STATE_TTL, STATE_SQLITE_PATH.
+    """
+    backend = os.getenv("STATE_BACKEND", "memory")
+    ttl = int(os.getenv("STATE_TTL", "86400"))
+    if backend == "sqlite":
+        return SQLiteStateStore(os.getenv("STATE_SQLITE_PATH", "states.sqlite3"), ttl=ttl)
+    if backend == "memory":
+        return MemoryStateStore(int(os.getenv("STATE_MAX_ENTRIES", "10000")), ttl=ttl)
+    raise ValueError(f"Неизвестный STATE_BACKEND: {backend}")
@@ -0,0 +1,197 @@
+"""
+Статистика прогресса пользователя (/stats).
+
+Счётчики хранятся в user_stats и user_category_stats и увеличиваются при записи
+каждой пачки ответов (AnswerRecorder вызывает record_answers в той же транзакции),
+поэтому чтение статистики — поиск по первичному ключу, а не GROUP BY по user_answers.
+
+Пересчёт счётчиков из user_answers и answer_daily (после переноса истории или при расхождении):
+
+    python stats.py --rebuild
+"""
+import argparse
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, case, values, column, Integer, text
+from sqlalchemy.dialects.postgresql import insert
+
+from config import SessionLocal
+from models import UserStats, UserCategoryStats, Category, ReviewState, word_categories
+
+# Слово выучено, когда его карточка дошла до коробки Лейтнера с интервалом в неделю
+LEARNED_BOX = 3
+
+Stats = namedtuple("Stats", "answers correct learned streak best_streak categories")
+
+
+def _user_stats_upsert(items):
+    """:param items: [(user_id, день, ответов, правильных)] — не больше одной строки на пользователя"""
+    stmt = insert(UserStats).values([
+        {"user_id": u, "answers": a, "correct": c, "last_answer_on": d, "streak_days": 1, "best_streak": 1}
+        for u, d, a, c in items
+    ])
+    last, day = UserStats.last_answer_on, stmt.excluded.last_answer_on
+    streak = case(
+        (last >= day, UserStats.streak_days),  # тот же день (или запоздавшие ответы)
+        (last == day - 1, UserStats.streak_days + 1),
+        else_=1,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            "answers": UserStats.answers + stmt.excluded.answers,
+            "correct": UserStats.correct + stmt.excluded.correct,
+            "last_answer_on": func.greatest(last, day),
+            "streak_days": streak,
+            "best_streak": func.greatest(UserStats.best_streak, streak),
+        },
+    )
+
+
+def _category_stats_upsert(per_word):
+    """:param per_word: {(user_id, word_id): [ответов, правильных]}"""
+    batch = values(
+        column("user_id", Integer), column("word_id", Integer),
+        column("answers", Integer), column("correct", Integer),
+        name="batch",
+    ).data([(u, w, a, c) for (u, w), (a, c) in per_word.items()])
+    per_category = (
+        select(batch.c.user_id, word_categories.c.category_id,
+               func.sum(batch.c.answers), func.sum(batch.c.correct))
+        .select_from(batch)
+        .join(word_categories, word_categories.c.word_id == batch.c.word_id)
+        .group_by(batch.c.user_id, word_categories.c.category_id)
+    )
+    stmt = insert(UserCategoryStats).from_select(["user_id", "category_id", "answers", "correct"], per_category)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserCategoryStats.user_id, UserCategoryStats.category_id],
+        set_={
+            "answers": UserCategoryStats.answers + stmt.excluded.answers,
+            "correct": UserCategoryStats.correct + stmt.excluded.correct,
+        },
+    )
+
+
+def record_answers(session, rows):
+    """
+    Увеличивает счётчики по пачке ответов (строки AnswerRecorder).
+    Вызывается в транзакции, которая записывает эти ответы.
+    """
+    per_day = defaultdict(lambda: [0, 0])   # (день, user_id) -> [ответов, правильных]
+    per_word = defaultdict(lambda: [0, 0])  # (user_id, word_id) -> [ответов, правильных]
+    for row in rows:
+        correct = 1 if row["is_correct"] else 0
+        counters = per_day[(row["answered_at"].date(), row["user_id"])]
+        counters[0] += 1
+        counters[1] += correct
+        if row["word_id"] is not None:
+            counters = per_word[(row["user_id"], row["word_id"])]
+            counters[0] += 1
+            counters[1] += correct
+
+    # дни по порядку (пачка может захватить полночь): серия считается день за днём
+    for day in sorted({d for d, _ in per_day}):
+        session.execute(_user_stats_upsert(
+            [(u, d, a, c) for (d, u), (a, c) in per_day.items() if d == day]
+        ))
+    if per_word:
+        session.execute(_category_stats_upsert(per_word))
+
+
+def user_stats(user_id):
+    """
+    Статистика пользователя: несколько поисков по первичным ключам.
+    :return: Stats; categories — список (название, ответов, правильных)
+    """
+    with SessionLocal() as session:
+        row = session.get(UserStats, user_id)
+        learned = session.scalar(
+            select(func.count())
+            .select_from(ReviewState)
+            .where(ReviewState.user_id == user_id)
+            .where(ReviewState.box >= LEARNED_BOX)
+        )
+        categories = session.execute(
+            select(Category.name, UserCategoryStats.answers, UserCategoryStats.correct)
+            .join(Category, Category.id == UserCategoryStats.category_id)
+            .where(UserCategoryStats.user_id == user_id)
+            .order_by(UserCategoryStats.answers.desc())
+        ).all()
+
+    if row is None:
+        return Stats(0, 0, learned, 0, 0, categories)
+    # серия прервана, если вчера и сегодня ответов не было
+    today = datetime.utcnow().date()
+    streak = row.streak_days if row.last_answer_on and row.last_answer_on >= today - timedelta(days=1) else 0
+    return Stats(row.answers, row.correct, learned, streak, row.best_streak, categories)
+
+
+# Ответы: сырые из user_answers и свёрнутые по дням из answer_daily (см. partitions.py)
+_ANSWERS_CTE = """
+    answers AS (
+        SELECT user_id, word_id, answered_at::date AS day, 1 AS answers, is_correct::int AS correct
+        FROM user_answers
+        UNION ALL
+        SELECT user_id, word_id, day, answers, correct FROM answer_daily
+    )
+"""
+
+_REBUILD_SQL = [
+    "LOCK TABLE user_stats, user_category_stats IN EXCLUSIVE MODE",
+    "DELETE FROM user_stats",
+    "DELETE FROM user_category_stats",
+    # серии дней: дни подряд дают одинаковую разность «день − номер дня»
+    f"""
+    WITH {_ANSWERS_CTE}, days AS (
+        SELECT DISTINCT user_id, day FROM answers
+    ), runs AS (
+        SELECT user_id, count(*) AS length, max(day) AS last_day
+        FROM (SELECT user_id, day,
+                     day - (row_number() OVER (PARTITION BY user_id ORDER BY day))::int AS run
+              FROM days) d
+        GROUP BY user_id, run
+    ), totals AS (
+        SELECT user_id, sum(answers) AS answers, sum(correct) AS correct
+        FROM answers GROUP BY user_id
+    )
+    INSERT INTO user_stats (user_id, answers, correct, last_answer_on, streak_days, best_streak)
+    SELECT t.user_id, t.answers, t.correct, r.last_day, r.length,
+           (SELECT max(length) FROM runs WHERE runs.user_id = t.user_id)
+    FROM totals t
+    JOIN LATERAL (
+        SELECT last_day, length FROM runs WHERE runs.user_id = t.user_id ORDER BY last_day DESC LIMIT 1
+    ) r ON true
+    """,
+    f"""
+    WITH {_ANSWERS_CTE}
+    INSERT INTO user_category_stats (user_id, category_id, answers, correct)
+    SELECT a.user_id, wc.category_id, sum(a.answers), sum(a.correct)
+    FROM answers a
+    JOIN word_categories wc ON wc.word_id = a.word_id
+    GROUP BY a.user_id, wc.category_id
+    """,
+]
+
+
+def rebuild(bind):
+    """
+    Пересчитывает все счётчики из user_answers и answer_daily (в транзакции вызывающего).
+    Запись ответов на время пересчёта ждёт блокировку, поэтому ответы не теряются и не считаются дважды.
+    """
+    for sql in _REBUILD_SQL:
+        bind.execute(text(sql))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Счётчики статистики пользователей")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать из user_answers и answer_daily")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.error("укажите --rebuild")
+
+    with SessionLocal() as session:
+        rebuild(session)
+        session.commit()
+        users = session.scalar(select(func.count()).select_from(UserStats))
+    print(f"[INFO] Статистика пересчитана, пользователей: {users}")
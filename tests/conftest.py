@@ -0,0 +1,18 @@
+"""Общие фикстуры: тесты с БД идут против базы из .env и пропускаются, если она не настроена."""
+import pytest
+
+from config import DB_CONFIG
+
+
+@pytest.fixture(scope="session")
+def database_engine():
+    if not DB_CONFIG["host"] or not DB_CONFIG["dbname"]:
+        pytest.skip("БД не настроена (DB_HOST, DB_NAME)")
+    from config import get_engine
+    from migrations import LATEST_VERSION, stored_versions
+
+    engine = get_engine()
+    schema, _ = stored_versions(engine)
+    if schema < LATEST_VERSION:
+        pytest.fail(f"Схема БД устарела (версия {schema}, нужна {LATEST_VERSION}): выполните python migrations.py")
+    return engine
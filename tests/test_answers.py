@@ -0,0 +1,70 @@
+"""Отложенная запись ответов: висячие ссылки и ограничение повторов (SQLite в памяти)."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DataError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from answers import AnswerRecorder
+from models import Base, User, Word, Translation
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine, tables=[User.__table__, Word.__table__, Translation.__table__])
+    with engine.begin() as connection:
+        # в PostgreSQL таблица секционирована; здесь достаточно тех же столбцов и ключей
+        connection.execute(text(
+            "CREATE TABLE user_answers (id INTEGER PRIMARY KEY, answered_at DATETIME NOT NULL,"
+            " user_id INTEGER REFERENCES users(id), word_id INTEGER REFERENCES words(id),"
+            " translation_id INTEGER REFERENCES translations(id), is_correct BOOLEAN NOT NULL)"
+        ))
+        connection.execute(text("INSERT INTO users (id, telegram_id, created_at) VALUES (1, 100, :now)"),
+                           {"now": datetime.utcnow()})
+        connection.execute(text("INSERT INTO words (id, original_word, created_at) VALUES (1, 'cat', :now)"),
+                           {"now": datetime.utcnow()})
+        connection.execute(text("INSERT INTO translations (id, word_id, translation, created_at)"
+                                " VALUES (1, 1, 'кошка', :now)"), {"now": datetime.utcnow()})
+    return sessionmaker(engine)
+
+
+def answers(session_factory):
+    with session_factory() as session:
+        return session.execute(text(
+            "SELECT user_id, word_id, translation_id FROM user_answers ORDER BY id"
+        )).all()
+
+
+def test_dangling_references_are_cleared(session_factory):
+    recorder = AnswerRecorder(session_factory)
+    recorder.record(1, 1, 1, True)
+    recorder.record(1, 2, 5, False)  # слово и перевод удалены, пока ответ ждал записи
+    recorder.record(7, 1, 1, True)  # пользователь удалён
+
+    assert recorder.flush() == 2
+    assert answers(session_factory) == [(1, 1, 1), (1, None, None)]
+    assert recorder.backlog() == 0
+    assert recorder.dropped == 1
+
+
+def test_batch_dropped_after_max_retries(session_factory):
+    def broken(session, rows):
+        raise DataError("INSERT", {}, Exception("bad row"))
+
+    recorder = AnswerRecorder(session_factory, prepare=broken, max_retries=3)
+    recorder.record(1, 1, 1, True)
+
+    for _ in range(2):
+        assert recorder.flush() == 0
+        assert recorder.backlog() == 1
+    assert recorder.flush() == 0
+    assert recorder.backlog() == 0
+    assert recorder.dropped == 1
@@ -0,0 +1,42 @@
+"""Диспетчер чатов: ограничения очередей и порядок обновлений внутри чата."""
+import threading
+import time
+
+from dispatcher import ChatDispatcher
+
+
+def test_full_chat_does_not_block_other_chats():
+    release = threading.Event()
+    handled = []
+
+    def handle(item):
+        chat_id, n = item
+        if chat_id == 1:
+            release.wait(5)  # чат 1 завален сообщениями и обрабатывается медленно
+        handled.append(item)
+
+    d = ChatDispatcher(handle, workers=2, max_backlog=3, max_total=100)
+    accepted = [d.submit(1, (1, n), timeout=None) for n in range(10)]
+    assert accepted == [True] * 3 + [False] * 7
+    assert d.dropped == 7
+
+    started = time.monotonic()
+    assert d.submit(2, (2, 0), timeout=None)
+    while (2, 0) not in handled and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    assert (2, 0) in handled
+
+    release.set()
+    d.shutdown(wait=True)
+    assert [n for chat_id, n in handled if chat_id == 1] == [0, 1, 2]
+
+
+def test_waits_for_space_in_total_backlog():
+    release = threading.Event()
+    d = ChatDispatcher(lambda item: release.wait(5), workers=1, max_backlog=10, max_total=2)
+    assert d.submit(1, "a") and d.submit(2, "b")
+    assert not d.submit(3, "c")  # без ожидания — сразу отказ (webhook ответит 503)
+    threading.Timer(0.1, release.set).start()
+    assert d.submit(3, "c", timeout=5)
+    d.shutdown(wait=True)
+    assert d.backlog() == 0
@@ -0,0 +1,7 @@
+"""Планы частых запросов без Seq Scan по горячим таблицам (на БД из .env, иначе тест пропускается)."""
+import explain
+
+
+def test_hot_queries_use_indexes(database_engine):
+    # синтетические слова — в откатываемой транзакции, чтобы план не зависел от объёма данных
+    assert explain.check(seed=2000) == 0, "запросы с Seq Scan (подробности — в выводе выше)"
@@ -0,0 +1,46 @@
+"""Проверка введённого перевода: нормализация и ограниченное расстояние Левенштейна."""
+import itertools
+import random
+
+import pytest
+
+from matching import normalize_answer, within_distance, typo_limit, match
+
+
+def levenshtein(a, b):
+    """Полная таблица — эталон для полосы within_distance."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (ca != cb), previous[j] + 1, current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+
+def test_normalize_answer():
+    assert normalize_answer("  Жёлтый! ") == "желтый"
+    assert normalize_answer("Ice-cream,  please") == "ice cream please"
+    assert normalize_answer("...") == ""
+
+
+@pytest.mark.parametrize("limit", [0, 1, 2, 3])
+def test_within_distance_matches_full_levenshtein(limit):
+    rng = random.Random(limit)
+    words = ["", "a", "ab", "abc", "кот", "кошка", "собака", "sobaka"]
+    words += ["".join(rng.choice("abc") for _ in range(rng.randint(0, 8))) for _ in range(60)]
+    for a, b in itertools.product(words, repeat=2):
+        assert within_distance(a, b, limit) == (levenshtein(a, b) <= limit), (a, b, limit)
+
+
+def test_typo_limit_grows_with_length():
+    assert [typo_limit("x" * n) for n in (1, 3, 4, 7, 8, 20)] == [0, 0, 1, 1, 2, 2]
+
+
+def test_match():
+    answers = {normalize_answer(t): (i, t) for i, t in enumerate(["Кошка", "Кот"], 1)}
+    assert match("кошка!", answers) == (1, "Кошка", True)
+    assert match("кошко", answers) == (1, "Кошка", False)
+    assert match("кошко", answers, typos=False) is None
+    assert match("кит", answers) is None  # в коротких словах опечатки не прощаются
+    assert match("", answers) is None
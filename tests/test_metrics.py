@@ -0,0 +1,15 @@
+"""Формат метрик Prometheus."""
+import metrics
+
+
+def test_counter_func_renders_as_counter():
+    sent = metrics.CounterFunc("test_sent_total", "Отправлено", lambda: 3)
+    assert sent.render() == [
+        "# HELP test_sent_total Отправлено",
+        "# TYPE test_sent_total counter",
+        "test_sent_total 3",
+    ]
+
+
+def test_unreadable_value_is_skipped():
+    assert metrics.CounterFunc("test_broken_total", "Ошибка", lambda: 1 / 0).render() == []
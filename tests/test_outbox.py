@@ -0,0 +1,41 @@
+"""Склейка соседних сообщений одного чата в очереди отправки."""
+from outbox import _Message, _mergeable, _merge, MAX_MESSAGE_LENGTH
+
+
+def message(text, **kwargs):
+    return _Message(text, kwargs, 0.0)
+
+
+def test_plain_messages_merge():
+    merged = _merge(message("✅ Правильно!"), message("Переведи слово: cat", reply_markup="keyboard"))
+    assert merged.text == "✅ Правильно!\n\nПереведи слово: cat"
+    assert merged.kwargs == {"reply_markup": "keyboard"}
+
+
+def test_keyboard_of_earlier_message_is_kept():
+    assert not _mergeable(message("Меню", reply_markup="menu"), message("Вопрос"))
+    assert _mergeable(message("Ответ"), message("Вопрос", reply_markup="quiz"))
+
+
+def test_other_options_are_sent_as_is():
+    assert not _mergeable(message("a", reply_to_message_id=1), message("b"))
+    assert not _mergeable(message("a"), message("b", disable_notification=True))
+
+
+def test_length_limit():
+    assert _mergeable(message("a" * 2000), message("b" * 2000))
+    assert not _mergeable(message("a" * (MAX_MESSAGE_LENGTH - 2)), message("b"))
+
+
+def test_parse_modes():
+    assert _mergeable(message("*a*", parse_mode="Markdown"), message("*b*", parse_mode="Markdown"))
+    assert not _mergeable(message("*a*", parse_mode="Markdown"), message("<b>b</b>", parse_mode="HTML"))
+    # текст без разметки можно отправить с разметкой соседнего сообщения
+    assert _mergeable(message("Правильно"), message("*cat*", parse_mode="Markdown"))
+    assert not _mergeable(message("snake_case"), message("*cat*", parse_mode="Markdown"))
+    assert not _mergeable(message("*a*", parse_mode="Markdown"), message("a_b"))
+
+
+def test_merge_takes_parse_mode_of_earlier_message():
+    merged = _merge(message("*a*", parse_mode="Markdown"), message("b"))
+    assert merged.kwargs == {"parse_mode": "Markdown"}
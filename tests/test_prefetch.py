@@ -0,0 +1,74 @@
+"""Очередь заранее собранных вопросов: сброс при изменении словаря."""
+import itertools
+from collections import namedtuple
+
+from prefetch import QuestionPrefetcher
+
+Question = namedtuple("Question", "word_id user_id category_id")
+
+
+def make(load=None, depth=2):
+    ids = itertools.count(1)
+    load = load or (lambda user_id, category_id: Question(next(ids), user_id, category_id))
+    # без потоков: задачи дозаполнения выполняются в тесте через refill_all
+    return QuestionPrefetcher(load, depth=depth, workers=0)
+
+
+def refill_all(prefetcher):
+    while not prefetcher._tasks.empty():
+        prefetcher._refill(*prefetcher._tasks.get_nowait())
+
+
+def test_questions_come_from_queue():
+    p = make()
+    assert p.get(10, 1).word_id == 1  # очередь пуста — вопрос собран сразу
+    refill_all(p)
+    assert [p.get(10, 1).word_id for _ in range(2)] == [2, 3]
+    assert (p.hits, p.misses) == (2, 1)
+
+
+def test_invalidate_drops_queued_questions():
+    p = make()
+    p.get(10, 1)
+    refill_all(p)
+    p.invalidate_user(1)
+    assert p.discarded == 2
+    assert p.get(10, 1).word_id == 4  # собран заново
+
+
+def test_question_loaded_during_invalidate_is_discarded():
+    p = None
+    ids = itertools.count(1)
+
+    def load(user_id, category_id):
+        question = Question(next(ids), user_id, category_id)
+        if question.word_id == 2:
+            p.invalidate_user(user_id)  # словарь изменился, пока вопрос собирался в фоне
+        return question
+
+    p = make(load)
+    p.get(10, 1)
+    task = p._tasks.get_nowait()
+    p._refill(*task)
+    chat = p._chats[10]
+    assert not chat.questions
+    assert p.discarded == 1
+    assert not chat.refilling  # следующая выдача снова запустит дозаполнение
+
+
+def test_stale_task_is_ignored():
+    p = make()
+    p.get(10, 1)
+    task = p._tasks.get_nowait()
+    p.get(10, 1, category_id=5)  # другая категория — новая очередь
+    p._refill(*task)
+    assert not p._chats[10].questions
+
+
+def test_other_users_keep_their_questions():
+    p = make()
+    p.get(10, 1)
+    p.get(20, 2)
+    refill_all(p)
+    p.invalidate_user(1)
+    assert len(p._chats[20].questions) == 2
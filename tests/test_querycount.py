@@ -0,0 +1,16 @@
+"""Бюджеты запросов: полнота — без БД, сами бюджеты — на БД из .env (иначе тест пропускается)."""
+import querycount
+
+
+def test_every_public_database_function_has_budget():
+    assert querycount.missing_budgets() == []
+
+
+def test_budgets_only_name_existing_functions():
+    import database
+
+    assert [name for name in querycount.QUERY_BUDGET if not hasattr(database, name)] == []
+
+
+def test_query_budgets(database_engine):
+    assert querycount.check() == 0, "функции превысили бюджет запросов (подробности — в выводе выше)"
@@ -0,0 +1,53 @@
+"""Выбор обработчика текста: команды, затем этап диалога, затем псевдонимы."""
+from types import SimpleNamespace
+
+import pytest
+
+from router import Router, QUIZ, normalize
+
+
+def message(text, chat_id=1):
+    return SimpleNamespace(text=text, chat=SimpleNamespace(id=chat_id))
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    router.command("/start", "🧠 Учить слова", aliases=["учить слова"])(lambda m: "learn")
+    router.stage(QUIZ)(lambda m, state, text: ("answer", text))
+    router.stage("original")(lambda m, state, text: ("original", text))
+    return router
+
+
+def test_normalize():
+    assert normalize("  /Start@MyBot  arg ") == "/start"
+    assert normalize("Учить   СЛОВА") == "учить слова"
+
+
+def test_command_wins_over_stage(router):
+    quiz = {"correct": "кошка"}
+    assert router.dispatch(message("🧠 Учить слова"), lambda chat_id: quiz) == "learn"
+    assert router.dispatch(message("/start@bot"), lambda chat_id: quiz) == "learn"
+
+
+def test_stage_wins_over_alias(router):
+    # ответ в квизе, совпавший с псевдонимом, — всё равно ответ
+    assert router.dispatch(message("Учить слова"), lambda chat_id: {"correct": "x"}) == ("answer", "Учить слова")
+    assert router.dispatch(message("учить слова"), lambda chat_id: {"stage": "original"}) == ("original", "учить слова")
+
+
+def test_alias_without_stage(router):
+    assert router.dispatch(message("  Учить слова "), lambda chat_id: {}) == "learn"
+    assert router.dispatch(message("что-то ещё"), lambda chat_id: {}) is None
+
+
+def test_state_is_not_read_for_commands(router):
+    def get_state(chat_id):
+        raise AssertionError("состояние не нужно")
+
+    assert router.dispatch(message("/start"), get_state) == "learn"
+
+
+def test_duplicate_registration_fails(router):
+    with pytest.raises(ValueError):
+        router.command("/START")(lambda m: None)
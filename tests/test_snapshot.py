@@ -0,0 +1,82 @@
+"""Снимок общего словаря: сборка из БД (SQLite в памяти), формат и атомарная замена файла."""
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import snapshot
+from models import Base, User, Word, Translation, Category, word_categories
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, Word.__table__, Translation.__table__, Category.__table__, word_categories,
+    ])
+    with Session(engine) as session:
+        session.add(User(id=1, telegram_id=100))
+        session.add_all([Category(id=1, name="Цвета"), Category(id=2, name="Животные")])
+        session.add_all([
+            Word(id=3, original_word="red"),
+            Word(id=5, original_word="cat"),
+            Word(id=8, original_word="ёж"),             # без переводов
+            Word(id=9, original_word="mine", user_id=1),  # слово пользователя — не в снимке
+        ])
+        session.add_all([
+            Translation(id=10, word_id=3, translation="красный"),
+            Translation(id=11, word_id=5, translation="кошка"),
+            Translation(id=12, word_id=5, translation="кот"),
+            Translation(id=13, word_id=9, translation="моё"),
+        ])
+        session.flush()
+        session.execute(insert(word_categories), [
+            {"word_id": 3, "category_id": 1}, {"word_id": 5, "category_id": 2}, {"word_id": 8, "category_id": 2},
+        ])
+        session.commit()
+        yield session
+
+
+def test_build_and_read(session, tmp_path):
+    path = str(tmp_path / "vocab.snap")
+    version, words = snapshot.build(session, path, batch_size=2)
+    snap = snapshot.Snapshot(path)
+
+    assert words == len(snap) == 3
+    assert snap.version == version
+    assert snap.find(9) is None and snap.find(4) is None
+    assert snap.word(snap.find(5)) == (5, "cat", [(11, "кошка"), (12, "кот")], (2,))
+    assert snap.word(snap.find(8)) == (8, "ёж", [], (2,))
+    assert snap.translation(0) == (3, 10, "красный")
+    # для квиза — только слова с переводами
+    assert list(snap.ids) == [snap.find(3), snap.find(5)]
+    assert list(snap.category(2)) == [snap.find(5)]
+    assert list(snap.category(7)) == []
+
+
+def test_replaced_file_keeps_open_snapshot(session, tmp_path):
+    path = str(tmp_path / "vocab.snap")
+    snapshot.build(session, path)
+    old = snapshot.Snapshot(path)
+
+    session.add(Word(id=20, original_word="dog"))
+    session.add(Translation(id=21, word_id=20, translation="собака"))
+    session.commit()
+    snapshot.build(session, path)
+
+    assert len(old) == 3 and old.find(20) is None
+    new = snapshot.Snapshot(path)
+    assert new.word(new.find(20)) == (20, "dog", [(21, "собака")], ())
+    assert new.version >= old.version
+
+
+def test_rejects_foreign_and_truncated_files(session, tmp_path):
+    path = tmp_path / "vocab.snap"
+    snapshot.build(session, str(path))
+    data = path.read_bytes()
+
+    path.write_bytes(b"NOTASNAP" + data[8:])
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(path))
+    path.write_bytes(data[:len(data) - 8])
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(path))
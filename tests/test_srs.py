@@ -0,0 +1,45 @@
+"""Выбор новых слов для повторения (SQLite в памяти)."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import srs
+from models import Base, User, Word, Translation, ReviewState
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        User.__table__, Word.__table__, Translation.__table__, ReviewState.__table__,
+    ])
+    with Session(engine) as session:
+        session.add_all([User(id=1, telegram_id=100), User(id=2, telegram_id=200)])
+        for word_id in range(1, 9):
+            owner = 2 if word_id == 6 else None  # слово 6 — чужое
+            session.add(Word(id=word_id, original_word=f"w{word_id}", user_id=owner))
+            if word_id != 7:  # у слова 7 нет переводов
+                session.add(Translation(word_id=word_id, translation=f"t{word_id}"))
+        for word_id in (2, 5):
+            session.add(ReviewState(user_id=1, word_id=word_id, due_at=datetime.utcnow()))
+        session.commit()
+        yield session
+
+
+def new_words(session, start, limit):
+    return session.execute(srs._new_words_statement(1, start, limit)).scalars().all()
+
+
+def test_new_words_start_at_pivot_and_wrap_around(session):
+    assert new_words(session, 4, 10) == [4, 8, 1, 3]
+    assert new_words(session, 4, 3) == [4, 8, 1]
+    assert new_words(session, 1, 2) == [1, 3]
+
+
+def test_no_new_words_left(session):
+    for word_id in (1, 3, 4, 8):
+        session.add(ReviewState(user_id=1, word_id=word_id, due_at=datetime.utcnow()))
+    session.commit()
+    assert new_words(session, 4, 10) == []
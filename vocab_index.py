@@ -0,0 +1,513 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from matching import normalize_answer, match
+from models import Word
+from snapshot import Snapshot
+
+# Сколько слов снимка держать разобранными в WordEntry
+SNAPSHOT_ENTRY_CACHE = 4096
+
+
+class WordEntry:
+    """
+    Слово в индексе: id, оригинал, переводы [(translation_id, текст)] и категории.
+    answers — нормализованные переводы для проверки введённого ответа.
+    """
+
+    __slots__ = ("word_id", "original", "translations", "categories", "answers")
+
+    def __init__(self, word_id, original, translations, categories):
+        self.word_id = word_id
+        self.original = original
+        self.translations = translations
+        self.categories = categories
+        self.answers = {}
+        for tid, text in translations:
+            self.answers.setdefault(normalize_answer(text), (tid, text))
+
+
+class _Bag:
+    """
+    Список с удалением за O(1) (swap-remove) и случайным выбором за O(1).
+    """
+
+    __slots__ = ("items", "pos")
+
+    def __init__(self):
+        self.items = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        if item in self.pos:
+            return
+        self.pos[item] = len(self.items)
+        self.items.append(item)
+
+    def remove(self, item):
+        i = self.pos.pop(item, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.pos[last] = i
+
+
+class _Pool:
+    """
+    Набор слов одной области видимости: общие слова или слова одного пользователя.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self.words = {}           # word_id -> WordEntry
+        self.ids = _Bag()         # word_id слов, у которых есть хотя бы один перевод
+        self.by_category = {}     # category_id -> _Bag(word_id)
+        self.pairs = _Bag()       # (word_id, translation_id, текст) — для вариантов ответа
+
+    def put(self, entry):
+        self.drop(entry.word_id)
+        self.words[entry.word_id] = entry
+        if not entry.translations:
+            return
+        self.ids.add(entry.word_id)
+        for category_id in entry.categories:
+            self.by_category.setdefault(category_id, _Bag()).add(entry.word_id)
+        for tid, text in entry.translations:
+            self.pairs.add((entry.word_id, tid, text))
+
+    def drop(self, word_id):
+        entry = self.words.pop(word_id, None)
+        if entry is None:
+            return
+        self.ids.remove(word_id)
+        for category_id in entry.categories:
+            bag = self.by_category.get(category_id)
+            if bag is not None:
+                bag.remove(word_id)
+                if not bag:
+                    del self.by_category[category_id]
+        for tid, text in entry.translations:
+            self.pairs.remove((word_id, tid, text))
+
+    def category(self, category_id):
+        return self.by_category.get(category_id) or _EMPTY
+
+
+_EMPTY = _Bag()
+
+
+class _Items:
+    __slots__ = ("_length", "_get")
+
+    def __init__(self, length, get):
+        self._length = length
+        self._get = get
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        return self._get(i)
+
+
+class _View:
+    """_Bag только для чтения поверх массива снимка (для _pick)."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, length, get):
+        self.items = _Items(length, get)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _SnapshotWords:
+    """pool.words для снимка: word_id -> WordEntry."""
+
+    __slots__ = ("_pool",)
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def get(self, word_id, default=None):
+        entry = self._pool.entry(word_id)
+        return default if entry is None else entry
+
+    def __contains__(self, word_id):
+        return self._pool.entry(word_id) is not None
+
+    def __getitem__(self, word_id):
+        entry = self._pool.entry(word_id)
+        if entry is None:
+            raise KeyError(word_id)
+        return entry
+
+
+class _SnapshotPool:
+    """
+    Общие слова из снимка (snapshot.py) с тем же интерфейсом чтения, что у _Pool.
+    WordEntry собираются по запросу и кэшируются; переводы, добавленные к общим
+    словам после сборки снимка, хранятся поверх него до следующего снимка
+    (в варианты ответа они попадут после пересборки).
+    """
+
+    def __init__(self, snap):
+        self.snapshot = snap
+        self.version = snap.version
+        self._overlay = {}
+        self._entry = lru_cache(maxsize=SNAPSHOT_ENTRY_CACHE)(lambda index: WordEntry(*snap.word(index)))
+        self.words = _SnapshotWords(self)
+        ids = snap.ids
+        self.ids = _View(len(ids), lambda i: snap.word_ids[ids[i]])
+        self.pairs = _View(len(snap.tr_ids), snap.translation)
+
+    def entry(self, word_id):
+        entry = self._overlay.get(word_id)
+        if entry is not None:
+            return entry
+        index = self.snapshot.find(word_id)
+        return None if index is None else self._entry(index)
+
+    def category(self, category_id):
+        snap = self.snapshot
+        words = snap.category(category_id)
+        if not len(words):
+            return _EMPTY
+        return _View(len(words), lambda i: snap.word_ids[words[i]])
+
+    def put(self, entry):
+        self._overlay[entry.word_id] = entry
+
+
+def _pick(bags):
+    """Равновероятно выбирает элемент из объединения нескольких _Bag за O(1)."""
+    total = sum(len(b) for b in bags)
+    if not total:
+        return None
+    i = random.randrange(total)
+    for bag in bags:
+        if i < len(bag):
+            return bag.items[i]
+        i -= len(bag)
+
+
+_SHARED = object()  # ключ загрузки общего пула
+
+
+class _Loading:
+    """Загрузка пула, которая идёт сейчас; stale — пул изменился, результат не сохранять."""
+
+    __slots__ = ("done", "stale")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stale = False
+
+
+class VocabularyIndex:
+    """
+    Индекс словаря в памяти процесса: общие слова (user_id IS NULL) с разбивкой
+    по категориям и отдельно слова каждого пользователя.
+
+    Общие слова загружаются из БД при первом обращении (или читаются из снимка
+    snapshot, общего для процессов через mmap), слова пользователя — при первом
+    обращении этого пользователя. После этого выбор слова и вариантов ответа
+    не обращается к БД.
+
+    Загрузка идёт вне общей блокировки: выбор слов для других чатов её не ждёт.
+    Пулы из БД перечитываются раз в ttl секунд (слова и категории, изменённые
+    импортом или другим процессом бота), пулов пользователей — не больше max_users.
+    """
+
+    def __init__(self, session_factory, snapshot=None, check_interval=30.0, ttl=300.0, max_users=10000):
+        """
+        :param session_factory: session_factory(user_id) — сессия для загрузки слов
+            пользователя (None — общих слов), например replica.read_session
+        :param snapshot: путь к снимку общего словаря (None — общие слова из БД)
+        :param check_interval: как часто (с) проверять, не появился ли новый снимок
+        :param ttl: через сколько секунд перечитывать пулы из БД (0 — никогда)
+        :param max_users: сколько пулов пользователей держать (давно неактивные вытесняются)
+        """
+        self._session_factory = session_factory
+        self._lock = threading.RLock()
+        self._shared = None
+        self._users = OrderedDict()  # user_id -> _Pool, в порядке последнего обращения
+        self._loading = {}           # ключ пула -> _Loading
+        self._ttl = ttl
+        self._max_users = max_users
+        self._snapshot_path = snapshot
+        self._check_interval = check_interval
+        self._checked = 0.0
+        self._snapshot_file = None  # (inode, mtime, размер) загруженного снимка
+
+    # Загрузка
+
+    @staticmethod
+    def _statement(user_id):
+        return (
+            select(Word)
+            .options(selectinload(Word.translations), selectinload(Word.categories))
+            .where(Word.user_id == user_id if user_id is not None else Word.user_id.is_(None))
+        )
+
+    @staticmethod
+    def _pool_from(words):
+        pool = _Pool()
+        for w in words:
+            pool.put(_entry_from_word(w))
+        return pool
+
+    def _load(self, session, user_id):
+        return self._pool_from(session.execute(self._statement(user_id)).scalars().all())
+
+    async def prepare(self, user_id, session_factory):
+        """
+        Загружает общие слова и слова пользователя через асинхронную сессию,
+        чтобы последующие выборки не делали блокирующих запросов к БД.
+        """
+        if self._snapshot_path is not None:
+            self._check_snapshot()
+        if self._shared is None or self._expired(self._shared):
+            async with session_factory() as session:
+                result = await session.execute(self._statement(None))
+                pool = self._pool_from(result.scalars().all())
+            with self._lock:
+                self._install(_SHARED, pool)
+        with self._lock:
+            pool = self._users.get(user_id)
+        if pool is None or self._expired(pool):
+            async with session_factory() as session:
+                result = await session.execute(self._statement(user_id))
+                pool = self._pool_from(result.scalars().all())
+            with self._lock:
+                self._install(user_id, pool)
+
+    def _check_snapshot(self):
+        """Загружает снимок или переключается на новую версию (не чаще check_interval)."""
+        now = time.monotonic()
+        if self._shared is not None and now - self._checked < self._check_interval:
+            return
+        with self._lock:
+            if self._shared is not None and now - self._checked < self._check_interval:
+                return
+            self._checked = now
+            try:
+                stat = os.stat(self._snapshot_path)
+                file = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if file == self._snapshot_file:
+                    return
+                snap = Snapshot(self._snapshot_path)
+            except (OSError, ValueError) as e:
+                if self._shared is None:
+                    print(f"[WARN] Снимок словаря недоступен, общие слова загружаются из БД: {e}")
+                return
+            self._snapshot_file = file
+            current = self._shared
+            if isinstance(current, _SnapshotPool) and current.version == snap.version:
+                return
+            self._shared = _SnapshotPool(snap)
+            print(f"[INFO] Снимок словаря {self._snapshot_path}: версия {snap.version}, слов: {len(snap)}")
+
+    def snapshot_version(self):
+        """Версия используемого снимка (0 — общие слова загружены из БД)."""
+        shared = self._shared
+        return shared.version if isinstance(shared, _SnapshotPool) else 0
+
+    def _expired(self, pool):
+        if isinstance(pool, _SnapshotPool):
+            return False  # новые версии снимка — через _check_snapshot
+        return self._ttl > 0 and time.monotonic() - pool.loaded_at > self._ttl
+
+    def _install(self, key, pool):
+        """Сохраняет загруженный пул (под self._lock)."""
+        if key is _SHARED:
+            if not isinstance(self._shared, _SnapshotPool):
+                self._shared = pool
+            return
+        self._users[key] = pool
+        self._users.move_to_end(key)
+        while len(self._users) > self._max_users:
+            self._users.popitem(last=False)
+
+    def _mark_stale(self, key):
+        """Пул изменился: идущая сейчас загрузка могла прочитать его до изменения."""
+        loading = self._loading.get(key)
+        if loading is not None:
+            loading.stale = True
+
+    def _get_pool(self, key, cached, load):
+        """
+        Пул из памяти, а если его нет или он устарел — загрузка вне общей блокировки.
+        Одновременные запросы того же пула ждут одну загрузку, а если устаревший
+        пул есть — пользуются им, пока он перечитывается.
+        """
+        while True:
+            pool = cached()
+            if pool is not None and not self._expired(pool):
+                return pool
+            with self._lock:
+                loading = self._loading.get(key)
+                owner = loading is None
+                if owner:
+                    loading = self._loading[key] = _Loading()
+            if not owner:
+                if pool is not None:
+                    return pool
+                loading.done.wait()
+                continue
+
+            try:
+                fresh = load()
+            except BaseException:
+                with self._lock:
+                    del self._loading[key]
+                loading.done.set()
+                raise
+            with self._lock:
+                del self._loading[key]
+                if not loading.stale:
+                    self._install(key, fresh)
+            loading.done.set()
+            return fresh
+
+    def _load_pool(self, user_id):
+        with self._session_factory(user_id) as session:
+            return self._load(session, user_id)
+
+    def _shared_pool(self):
+        if self._snapshot_path is not None:
+            self._check_snapshot()
+        return self._get_pool(_SHARED, lambda: self._shared, lambda: self._load_pool(None))
+
+    def _user_pool(self, user_id):
+        def cached():
+            with self._lock:
+                pool = self._users.get(user_id)
+                if pool is not None:
+                    self._users.move_to_end(user_id)
+                return pool
+        return self._get_pool(user_id, cached, lambda: self._load_pool(user_id))
+
+    def _pools(self, user_id):
+        return self._shared_pool(), self._user_pool(user_id)
+
+    def reset(self):
+        """Сбрасывает индекс; данные будут перечитаны из БД при следующем обращении."""
+        with self._lock:
+            self._shared = None
+            self._snapshot_file = None
+            self._users.clear()
+            for loading in self._loading.values():
+                loading.stale = True
+
+    # Чтение
+
+    def get(self, word_id, user_id):
+        """Возвращает WordEntry слова, видимого пользователю, или None."""
+        for pool in self._pools(user_id):
+            entry = pool.words.get(word_id)
+            if entry is not None:
+                return entry
+        return None
+
+    def random_word(self, user_id, category_id=None):
+        """
+        Случайное слово (с переводами) из общего словаря и слов пользователя.
+        :return: WordEntry или None
+        """
+        pools = self._pools(user_id)  # загрузка — до блокировки
+        with self._lock:
+            if category_id is None:
+                word_id = _pick([p.ids for p in pools])
+            else:
+                word_id = _pick([p.category(category_id) for p in pools])
+            if word_id is None:
+                return None
+            for pool in pools:
+                if word_id in pool.words:
+                    return pool.words[word_id]
+
+    def random_pairs(self, user_id, count, exclude_word_id=None, exclude_texts=()):
+        """
+        До count случайных различных переводов [(word_id, translation_id, текст)],
+        не принадлежащих слову exclude_word_id и не совпадающих с exclude_texts.
+        """
+        pools = self._pools(user_id)
+        with self._lock:
+            bags = [p.pairs for p in pools]
+            total = sum(len(b) for b in bags)
+            result = []
+            seen_texts = set(exclude_texts)
+            # выбор с отбрасыванием: ограничиваем число попыток, чтобы не зациклиться на малом словаре
+            for _ in range(count * 8):
+                if len(result) >= count or not total:
+                    break
+                pair = _pick(bags)
+                if pair[0] == exclude_word_id or pair[2] in seen_texts:
+                    continue
+                seen_texts.add(pair[2])
+                result.append(pair)
+            return result
+
+    def match_answer(self, word_id, user_id, text, typos=True):
+        """
+        Сравнивает ответ со всеми переводами слова (см. matching.match).
+        :return: (translation_id, перевод, точно ли) или None
+        """
+        entry = self.get(word_id, user_id)
+        if entry is None:
+            return None
+        return match(text, entry.answers, typos)
+
+    # Изменение
+
+    def put_user_word(self, user_id, entry):
+        """Добавляет или заменяет слово пользователя."""
+        with self._lock:
+            self._mark_stale(user_id)
+            pool = self._users.get(user_id)
+            if pool is not None:
+                pool.put(entry)
+
+    def add_translation(self, word_id, user_id, translation_id, text):
+        """Добавляет перевод к слову (общему или пользовательскому), если оно уже в индексе."""
+        with self._lock:
+            self._mark_stale(_SHARED if user_id is None else user_id)
+            pools = [self._shared] if user_id is None else [self._users.get(user_id), self._shared]
+            for pool in pools:
+                if pool is None or word_id not in pool.words:
+                    continue
+                old = pool.words[word_id]
+                pool.put(WordEntry(old.word_id, old.original,
+                                old.translations + [(translation_id, text)], old.categories))
+                return
+
+    def remove_user_word(self, user_id, word_id):
+        """Удаляет слово пользователя из индекса."""
+        with self._lock:
+            self._mark_stale(user_id)
+            pool = self._users.get(user_id)
+            if pool is not None:
+                pool.drop(word_id)
+
+
+def _entry_from_word(word):
+    return WordEntry(
+        word.id,
+        word.original_word,
+        [(t.id, t.translation) for t in word.translations],
+        tuple(c.id for c in word.categories),
+    )
@@ -0,0 +1,196 @@
+"""
+Режим webhook: встроенный HTTP-сервер принимает обновления Telegram (JSON),
+кладёт их в ограниченную очередь и раздаёт пулу рабочих потоков.
+
+Если очередь заполнена, сервер отвечает 503 с Retry-After — Telegram повторит
+доставку позже, а память процесса не растёт. С диспетчером чатов (dispatcher.py)
+обновление сразу ставится в очередь своего чата, и 503 возвращается, когда
+переполнена она или общая очередь диспетчера.
+
+Настройки (переменные окружения):
+    WEBHOOK_URL      — публичный адрес, который регистрируется в Telegram (пусто — не регистрировать)
+    WEBHOOK_HOST     — адрес для прослушивания (по умолчанию 0.0.0.0)
+    WEBHOOK_PORT     — порт (по умолчанию 8080)
+    WEBHOOK_PATH     — путь, на который приходят обновления (по умолчанию /webhook)
+    WEBHOOK_SECRET   — секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_WORKERS  — число рабочих потоков (по умолчанию 4)
+    WEBHOOK_QUEUE    — размер очереди обновлений (по умолчанию 1000)
+
+GET /metrics на том же порту отдаёт метрики в формате Prometheus.
+
+Локальная проверка — отправить записанные обновления (по одному JSON на строку):
+
+    python webhook.py updates.jsonl http://127.0.0.1:8080/webhook
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from telebot import types
+
+import metrics
+from metrics import write_metrics
+from dispatcher import chat_of
+
+
+class WebhookServer:
+    def __init__(self, bot, host="0.0.0.0", port=8080, path="/webhook",
+                 workers=4, queue_size=1000, secret_token=None, dispatcher=None):
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.dispatcher = dispatcher
+        self.updates = queue.Queue(maxsize=queue_size)
+        # с диспетчером обновления обрабатываются в его потоках
+        self.workers = [] if dispatcher is not None else [
+            threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self.httpd = HTTPServer((host, port), self._handler_class())
+        metrics.gauge("webhook_queue_size", "Обновлений в очереди webhook", self.updates.qsize)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    return write_metrics(self)
+                self._reply(404)
+
+            def do_POST(self):
+                if self.path != server.path:
+                    return self._reply(404)
+                if server.secret_token and \
+                        self.headers.get("X-Telegram-Bot-Api-Secret-Token") != server.secret_token:
+                    return self._reply(403)
+
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not server.accept(body):
+                    # очередь заполнена — просим Telegram повторить позже
+                    return self._reply(503, {"Retry-After": "1"})
+                self._reply(200)
+
+            def _reply(self, code, headers=None):
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def accept(self, body):
+        """:return: False, если обновление не принято (очередь заполнена)"""
+        if self.dispatcher is None:
+            try:
+                self.updates.put_nowait(body)
+            except queue.Full:
+                return False
+            return True
+        try:
+            update = types.Update.de_json(json.loads(body))
+        except Exception as e:
+            # повтор не поможет — подтверждаем, чтобы Telegram не слал его снова
+            print(f"[ERROR] Некорректное обновление: {e}")
+            return True
+        return self.dispatcher.submit(chat_of(update), update)
+
+    def _work(self):
+        while True:
+            body = self.updates.get()
+            if body is None:
+                break
+            try:
+                update = types.Update.de_json(json.loads(body))
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                print(f"[ERROR] Ошибка при обработке обновления: {e}")
+            finally:
+                self.updates.task_done()
+
+    def serve_forever(self):
+        for worker in self.workers:
+            worker.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Останавливает приём запросов и дожидается обработки очереди."""
+        self.httpd.server_close()
+        for _ in self.workers:
+            self.updates.put(None)
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.join()
+        if self.dispatcher is not None:
+            self.dispatcher.shutdown(wait=True)
+
+
+def run_webhook(bot, dispatcher=None):
+    """
+    Запускает бота в режиме webhook по настройкам из переменных окружения.
+    :param dispatcher: ChatDispatcher — обновления идут в очереди чатов, а не в очередь сервера
+    """
+    # обработчики выполняются в потоках сервера, а не в пуле TeleBot
+    bot.threaded = False
+
+    server = WebhookServer(
+        bot,
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        workers=int(os.getenv("WEBHOOK_WORKERS", "4")),
+        queue_size=int(os.getenv("WEBHOOK_QUEUE", "1000")),
+        secret_token=os.getenv("WEBHOOK_SECRET") or None,
+        dispatcher=dispatcher,
+    )
+
+    url = os.getenv("WEBHOOK_URL")
+    if url:
+        bot.remove_webhook()
+        bot.set_webhook(url=url, secret_token=server.secret_token)
+
+    print(f"[INFO] Webhook слушает {server.httpd.server_address}, путь {server.path}")
+    server.serve_forever()
+
+
+def replay(path, url, secret_token=None):
+    """
+    Отправляет записанные обновления из файла (по одному JSON на строку) на webhook.
+    :return: словарь {HTTP-код: количество}
+    """
+    codes = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = urllib.request.Request(url, data=line.encode("utf-8"), method="POST")
+            request.add_header("Content-Type", "application/json")
+            if secret_token:
+                request.add_header("X-Telegram-Bot-Api-Secret-Token", secret_token)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    code = response.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            codes[code] = codes.get(code, 0) + 1
+    return codes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python webhook.py updates.jsonl [url]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else "http://127.0.0.1:8080/webhook"
+    print(replay(sys.argv[1], target, os.getenv("WEBHOOK_SECRET") or None))